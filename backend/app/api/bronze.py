@@ -13,25 +13,24 @@ import traceback
 from app.services.snowflake_service import SnowflakeService
 from app.config import settings
 from app.utils.logging_utils import SnowflakeLogger, log_exception
-from app.utils.auth_utils import get_caller_token
+from app.services.job_service import job_service
+from app.services.metadata_catalog import metadata_catalog
+from app.utils.auth_utils import get_caller_token, get_caller_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.get("/source-fields")
 async def get_source_fields(request: Request, tpa: str):
-    """Get distinct source field names from RAW_DATA_TABLE for a TPA"""
+    """Get distinct source field names for a TPA from the ingestion-time field catalog"""
     try:
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
+        safe_tpa = tpa.replace("'", "''")
         query = f"""
-            SELECT DISTINCT 
-                f.key as field_name
-            FROM {settings.BRONZE_SCHEMA_NAME}.RAW_DATA_TABLE,
-            LATERAL FLATTEN(input => RAW_DATA) f
-            WHERE TPA = '{tpa}'
-              AND RAW_DATA IS NOT NULL
-            ORDER BY f.key
-            LIMIT 1000
+            SELECT DISTINCT FIELD_NAME as field_name
+            FROM {settings.BRONZE_SCHEMA_NAME}.SOURCE_FIELD_CATALOG
+            WHERE TPA = '{safe_tpa}'
+            ORDER BY FIELD_NAME
         """
         result = await sf_service.execute_query_dict(query)
         return [row['FIELD_NAME'] for row in result]
@@ -39,6 +38,65 @@ async def get_source_fields(request: Request, tpa: str):
         logger.error(f"Failed to get source fields: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/layouts")
+async def get_file_layouts(request: Request, tpa: str):
+    """Get the file layouts (schema fingerprints) seen for a TPA
+
+    Each layout lists the mapping sets it was validated against; a layout with
+    no validations yet, or with INCOMPLETE ones, needs its mappings reviewed.
+    """
+    try:
+        sf_service = SnowflakeService(caller_token=get_caller_token(request))
+        safe_tpa = tpa.replace("'", "''")
+        layouts = await sf_service.execute_query_dict(f"""
+            SELECT FINGERPRINT, FIELD_COUNT, FILE_COUNT,
+                   FIRST_SEEN_FILE, FIRST_SEEN_TIMESTAMP,
+                   LAST_SEEN_FILE, LAST_SEEN_TIMESTAMP
+            FROM {settings.BRONZE_SCHEMA_NAME}.SCHEMA_FINGERPRINTS
+            WHERE TPA = '{safe_tpa}'
+            ORDER BY FIRST_SEEN_TIMESTAMP
+        """)
+        validations = await sf_service.execute_query_dict(f"""
+            SELECT fingerprint, target_table, plan_hash, status,
+                   ARRAY_TO_STRING(missing_source_fields, ',') as missing_source_fields,
+                   validated_timestamp
+            FROM {settings.SILVER_SCHEMA_NAME}.layout_mapping_sets
+            WHERE tpa = '{safe_tpa}'
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY fingerprint, target_table ORDER BY validated_timestamp DESC
+            ) = 1
+            ORDER BY target_table
+        """)
+
+        by_fingerprint = {}
+        for row in validations:
+            by_fingerprint.setdefault(row['FINGERPRINT'], []).append({
+                "target_table": row['TARGET_TABLE'],
+                "plan_hash": row['PLAN_HASH'],
+                "status": row['STATUS'],
+                "missing_source_fields": [f for f in (row['MISSING_SOURCE_FIELDS'] or '').split(',') if f],
+                "validated_timestamp": row['VALIDATED_TIMESTAMP']
+            })
+
+        result = []
+        for layout in layouts:
+            mapping_sets = by_fingerprint.get(layout['FINGERPRINT'], [])
+            result.append({
+                "fingerprint": layout['FINGERPRINT'],
+                "field_count": layout['FIELD_COUNT'],
+                "file_count": layout['FILE_COUNT'],
+                "first_seen_file": layout['FIRST_SEEN_FILE'],
+                "first_seen_timestamp": layout['FIRST_SEEN_TIMESTAMP'],
+                "last_seen_file": layout['LAST_SEEN_FILE'],
+                "last_seen_timestamp": layout['LAST_SEEN_TIMESTAMP'],
+                "mapping_sets": mapping_sets,
+                "needs_review": not mapping_sets or any(m['status'] != 'VALID' for m in mapping_sets)
+            })
+        return result
+    except Exception as e:
+        logger.error(f"Failed to get file layouts: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/upload")
 async def upload_file(
     request: Request,
@@ -386,19 +444,21 @@ async def discover_files(request: Request):
             }
         except Exception as task_error:
             # If task execution fails (maybe task doesn't exist or is suspended),
-            # fall back to calling the procedure directly
-            logger.warning(f"Failed to execute task, falling back to direct procedure call: {task_error}")
+            # fall back to running the procedure as a background job
+            logger.warning(f"Failed to execute task, falling back to a discover_files job: {task_error}")
             
             try:
-                # Call the discover_files procedure directly (with timeout)
-                proc_query = f"CALL {settings.BRONZE_SCHEMA_NAME}.discover_files()"
-                result = await sf_service.execute_query(proc_query, timeout=30)
-                result_msg = result[0][0] if result and len(result) > 0 else "Discovery completed"
+                job = await job_service.submit(
+                    "DISCOVER_FILES", f"{settings.BRONZE_SCHEMA_NAME}.discover_files", [],
+                    caller_token=get_caller_token(request),
+                    submitted_by=get_caller_user(request)
+                )
                 
                 return {
-                    "message": result_msg,
-                    "status": "completed",
-                    "note": "Discovery completed synchronously (fallback mode).",
+                    **job_service.to_handle(job),
+                    "message": f"File discovery submitted as job {job['JOB_ID']}",
+                    "status": "discovering",
+                    "note": "Discovery is running as a background job (fallback mode). Poll status_url for the result.",
                     "fallback_mode": True
                 }
             except Exception as proc_error:
@@ -545,20 +605,22 @@ async def process_queue(request: Request):
                 "note": "discover_files_task will find new files, then process_files_task will process all pending files. Check /api/bronze/queue for status updates."
             }
         except Exception as task_error:
-            # If task execution fails, fall back to calling the discover procedure directly
-            logger.warning(f"Failed to execute discover_files_task, falling back to procedure: {task_error}")
+            # If task execution fails, fall back to running the discover procedure as a background job
+            logger.warning(f"Failed to execute discover_files_task, falling back to a discover_files job: {task_error}")
             
             try:
-                # Call discover procedure directly (with timeout)
-                proc_query = f"CALL {settings.BRONZE_SCHEMA_NAME}.discover_files()"
-                result = await sf_service.execute_query(proc_query, timeout=30)
-                result_msg = result[0][0] if result and len(result) > 0 else "Discovery completed"
+                job = await job_service.submit(
+                    "DISCOVER_FILES", f"{settings.BRONZE_SCHEMA_NAME}.discover_files", [],
+                    caller_token=get_caller_token(request),
+                    submitted_by=get_caller_user(request)
+                )
                 
                 return {
-                    "message": f"{result_msg}. Processing will happen via scheduled tasks.",
+                    **job_service.to_handle(job),
+                    "message": f"File discovery submitted as job {job['JOB_ID']}. Processing will happen via scheduled tasks.",
                     "pending_count": pending_count,
-                    "status": "discovered",
-                    "note": "Discovery completed. Scheduled tasks will process files. Check /api/bronze/queue for status.",
+                    "status": "discovering",
+                    "note": "Discovery is running as a background job; scheduled tasks will process files. Check /api/bronze/queue for status.",
                     "fallback_mode": True
                 }
             except Exception as proc_error:
@@ -702,7 +764,7 @@ async def clear_all_data(request: Request):
                 logger.error(error_msg)
         
         # Truncate Bronze tables (preserve structure, delete data)
-        tables = ["RAW_DATA_TABLE", "file_processing_queue"]
+        tables = ["RAW_DATA_TABLE", "SOURCE_FIELD_CATALOG", "SCHEMA_FINGERPRINTS", "file_processing_queue"]
         for table in tables:
             try:
                 truncate_query = f"TRUNCATE TABLE IF EXISTS {settings.BRONZE_SCHEMA_NAME}.{table}"
@@ -725,7 +787,11 @@ async def clear_all_data(request: Request):
                 'TARGET_SCHEMAS', 'FIELD_MAPPINGS', 'TRANSFORMATION_RULES',
                 'DATA_QUALITY_RULES', 'VALIDATION_RESULTS', 'TRANSFORMATION_HISTORY',
                 'CREATED_TABLES', 'LLM_PROMPT_TEMPLATES', 'SILVER_PROCESSING_LOG',
-                'DATA_QUALITY_METRICS', 'QUARANTINE_RECORDS', 'PROCESSING_WATERMARKS'
+                'DATA_QUALITY_METRICS', 'QUARANTINE_RECORDS', 'PROCESSING_WATERMARKS',
+                'CDC_PENDING_RECORDS', 'TPA_DATE_FORMATS', 'MAPPING_EXPRESSION_CACHE',
+                'TRANSFORMATION_RULE_PLANS', 'TRANSFORMATION_PLANS',
+                'COLUMN_QUALITY_PATTERNS', 'COLUMN_PROFILE_AGGREGATES', 'LAYOUT_MAPPING_SETS',
+                'LLM_RESPONSE_CACHE', 'LLM_CANDIDATE_AUDIT', 'PARALLEL_CALL_QUEUE'
             ]
             
             for row in tables_result:
@@ -734,6 +800,7 @@ async def clear_all_data(request: Request):
                     try:
                         drop_query = f"DROP TABLE IF EXISTS {settings.SILVER_SCHEMA_NAME}.{table_name}"
                         await sf_service.execute_query(drop_query)
+                        metadata_catalog.invalidate()
                         results["silver_tables_dropped"].append(table_name)
                         logger.info(f"Dropped Silver table: {table_name}")
                     except Exception as e:
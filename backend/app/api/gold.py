@@ -8,8 +8,10 @@ from typing import Optional
 import logging
 
 from app.services.snowflake_service import SnowflakeService
+from app.services.metadata_catalog import metadata_catalog
 from app.config import settings
-from app.utils.auth_utils import get_caller_token
+from app.utils.auth_utils import get_caller_token, get_caller_user
+from app.utils.batch_lookup import fetch_rows_by_key, enrich_rows
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -29,13 +31,9 @@ async def get_gold_table_data(request: Request, table_name: str, tpa: str, limit
             raise HTTPException(status_code=400, detail=f"Invalid table name. Must be one of: {valid_tables}")
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return []
         
         # Build query with TPA filter
@@ -70,13 +68,9 @@ async def get_gold_stats(request: Request, table_name: str, tpa: str):
             raise HTTPException(status_code=400, detail=f"Invalid table name. Must be one of: {valid_tables}")
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return {"total_records": 0, "last_updated": None, "status": "No Data", "quality_score": 0}
         
         tpa_suffix = f"_{tpa}" if tpa != 'ALL' else "_ALL"
@@ -111,13 +105,9 @@ async def get_business_metrics(request: Request, tpa: str):
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return []
         
         query = f"""
@@ -154,13 +144,9 @@ async def get_quality_check_results(request: Request, tpa: str, limit: int = 100
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return []
         
         query = f"""
@@ -184,19 +170,16 @@ async def get_quality_check_results(request: Request, tpa: str, limit: int = 100
         
         results = await sf_service.execute_query_dict(query)
         
-        # Enrich with rule information
-        for result in results:
-            if result.get('QUALITY_RULE_ID'):
-                rule_query = f"""
-                    SELECT RULE_NAME, SEVERITY, CHECK_LOGIC, ACTION_ON_FAILURE
-                    FROM {settings.DATABASE_NAME}.GOLD.quality_rules
-                    WHERE QUALITY_RULE_ID = {result['QUALITY_RULE_ID']}
-                """
-                rule_data = await sf_service.execute_query_dict(rule_query)
-                if rule_data and len(rule_data) > 0:
-                    result.update(rule_data[0])
-        
-        return results
+        # Enrich with rule information (one batched lookup, cached per rule)
+        rules = await fetch_rows_by_key(
+            sf_service,
+            f"{settings.DATABASE_NAME}.GOLD.quality_rules",
+            "QUALITY_RULE_ID",
+            [r.get('QUALITY_RULE_ID') for r in results],
+            ["RULE_NAME", "SEVERITY", "CHECK_LOGIC", "ACTION_ON_FAILURE"],
+            cache_prefix="gold_quality_rule"
+        )
+        return enrich_rows(results, 'QUALITY_RULE_ID', rules)
     except Exception as e:
         logger.error(f"Failed to get quality check results: {str(e)}")
         if "does not exist" in str(e).lower() or "invalid" in str(e).lower():
@@ -210,13 +193,9 @@ async def get_quality_stats(request: Request, tpa: str):
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return {"total_checks": 0, "passed_checks": 0, "failed_checks": 0, "warning_checks": 0, "pass_rate": 0}
         
         query = f"""
@@ -245,13 +224,9 @@ async def get_transformation_rules(request: Request, tpa: str):
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return []
         
         query = f"""
@@ -289,13 +264,9 @@ async def get_quality_rules(request: Request, tpa: str):
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
         # Check if Gold schema exists
-        check_schema = f"""
-            SELECT COUNT(*) as cnt 
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.SCHEMATA 
-            WHERE SCHEMA_NAME = 'GOLD' AND CATALOG_NAME = '{settings.DATABASE_NAME}'
-        """
-        schema_result = await sf_service.execute_query_dict(check_schema)
-        if not schema_result or schema_result[0]['CNT'] == 0:
+        if not await metadata_catalog.schema_exists(
+            settings.GOLD_SCHEMA_NAME, caller_token=get_caller_token(request), caller_user=get_caller_user(request)
+        ):
             return []
         
         query = f"""
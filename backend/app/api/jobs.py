@@ -0,0 +1,129 @@
+"""
+Background Job API Endpoints
+"""
+
+from fastapi import APIRouter, Request, HTTPException
+from typing import Optional
+from urllib.parse import quote
+import logging
+
+from app.services.job_service import job_service, TERMINAL_JOB_STATUSES
+from app.api.silver import parse_mapping_counts, mapping_result_cached
+from app.utils.auth_utils import get_caller_user
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Endpoints with step-level progress for a job, built from its ID and procedure arguments
+PROGRESS_URLS = {
+    'TRANSFORM': lambda job_id, args: f"/api/silver/transform/progress?tpa={quote(str(args[1]))}&target_table={quote(str(args[0]))}",
+    'QUALITY_CHECK_ALL': lambda job_id, args: f"/api/silver/quality/check-all/{quote(str(job_id))}",
+}
+
+async def get_own_job(request: Request, job_id: str) -> dict:
+    """Job row if it exists and was submitted by the caller; 404 otherwise
+
+    API_JOBS is read with the service credentials, so jobs are scoped to
+    their submitter here rather than by Snowflake grants.
+    """
+    job = await job_service.get_job(job_id)
+    if not job or not job_service.is_owner(job, get_caller_user(request)):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+def format_job(job: dict) -> dict:
+    """API representation of an API_JOBS row"""
+    args = job.get('PARAMETERS') or []
+    response = {
+        "job_id": job['JOB_ID'],
+        "job_type": job['JOB_TYPE'],
+        "status": job['STATUS'],
+        "procedure_name": job['PROCEDURE_NAME'],
+        "parameters": args,
+        "query_id": job.get('QUERY_ID'),
+        "progress": job.get('PROGRESS'),
+        "result": job.get('RESULT'),
+        "error_message": job.get('ERROR_MESSAGE'),
+        "cancel_requested": bool(job.get('CANCEL_REQUESTED')),
+        "tpa": job.get('TPA_CODE'),
+        "submitted_by": job.get('SUBMITTED_BY'),
+        "created_timestamp": job.get('CREATED_TIMESTAMP'),
+        "started_timestamp": job.get('STARTED_TIMESTAMP'),
+        "completed_timestamp": job.get('COMPLETED_TIMESTAMP'),
+        "finished": job['STATUS'] in TERMINAL_JOB_STATUSES
+    }
+    if job['JOB_TYPE'] in PROGRESS_URLS and len(args) > 1:
+        response["progress_url"] = PROGRESS_URLS[job['JOB_TYPE']](job['JOB_ID'], args)
+    if job['JOB_TYPE'] in ('AUTO_MAP_ML', 'AUTO_MAP_LLM') and job['STATUS'] == 'SUCCEEDED':
+        counts = parse_mapping_counts(job.get('RESULT'))
+        response["mappings_created"] = counts['inserted']
+        response["mappings_duplicate"] = counts['duplicate']
+        response["mappings_rejected"] = counts['rejected']
+        response["cached"] = mapping_result_cached(job.get('RESULT'))
+    return response
+
+@router.get("")
+async def list_jobs(
+    request: Request,
+    status: Optional[str] = None,
+    job_type: Optional[str] = None,
+    tpa: Optional[str] = None,
+    limit: int = 50
+):
+    """List the caller's recent background jobs"""
+    try:
+        jobs = await job_service.list_jobs(
+            status, job_type, tpa, min(max(1, limit), 500),
+            submitted_by=get_caller_user(request) or ''
+        )
+        return [
+            {
+                "job_id": j['JOB_ID'],
+                "job_type": j['JOB_TYPE'],
+                "status": j['STATUS'],
+                "query_id": j.get('QUERY_ID'),
+                "tpa": j.get('TPA_CODE'),
+                "submitted_by": j.get('SUBMITTED_BY'),
+                "error_message": j.get('ERROR_MESSAGE'),
+                "created_timestamp": j.get('CREATED_TIMESTAMP'),
+                "started_timestamp": j.get('STARTED_TIMESTAMP'),
+                "completed_timestamp": j.get('COMPLETED_TIMESTAMP')
+            }
+            for j in jobs
+        ]
+    except Exception as e:
+        logger.error(f"Failed to list jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """Get status, progress and result of a background job"""
+    try:
+        return format_job(await get_own_job(request, job_id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(request: Request, job_id: str):
+    """Cancel a queued or running background job"""
+    try:
+        job = await get_own_job(request, job_id)
+        if job['STATUS'] in TERMINAL_JOB_STATUSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Job '{job_id}' has already finished with status {job['STATUS']}"
+            )
+        job = await job_service.cancel(job_id)
+        logger.info(f"Cancellation requested for job {job_id}")
+        return {
+            "message": f"Job {job_id} cancelled" if job['STATUS'] == 'CANCELLED' else f"Cancellation requested for job {job_id}",
+            **format_job(job)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to cancel job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
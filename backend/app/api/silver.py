@@ -7,11 +7,16 @@ from pydantic import BaseModel
 from typing import List, Optional
 import logging
 import asyncio
+import re
+import uuid
+from datetime import datetime
 
 from app.services.snowflake_service import SnowflakeService
 from app.config import settings
 from app.utils.cache import cache
-from app.utils.auth_utils import get_caller_token
+from app.services.job_service import job_service
+from app.services.metadata_catalog import metadata_catalog
+from app.utils.auth_utils import get_caller_token, get_caller_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -118,6 +123,7 @@ class TransformRequest(BaseModel):
     batch_size: int = 10000
     apply_rules: bool = True
     incremental: bool = False
+    run_async: bool = False  # Return a job handle after pre-validation instead of waiting
 
 @router.get("/schemas")
 async def get_target_schemas(request: Request, tpa: Optional[str] = None, table_name: Optional[str] = None):
@@ -415,17 +421,13 @@ async def check_table_exists(request: Request, table_name: str, tpa: str):
     Checks for table with name format: {TPA}_{TABLE_NAME}
     """
     try:
-        sf_service = SnowflakeService(caller_token=get_caller_token(request))
         physical_table_name = f"{tpa.upper()}_{table_name.upper()}"
-        
-        query = f"""
-            SELECT COUNT(*) as count
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_SCHEMA = '{settings.SILVER_SCHEMA_NAME}'
-              AND TABLE_NAME = '{physical_table_name}'
-        """
-        result = await sf_service.execute_query_dict(query)
-        exists = result[0]['COUNT'] > 0 if result else False
+        exists = await metadata_catalog.table_exists(
+            settings.SILVER_SCHEMA_NAME,
+            physical_table_name,
+            caller_token=get_caller_token(request),
+            caller_user=get_caller_user(request)
+        )
         
         return {
             "exists": exists,
@@ -452,6 +454,7 @@ async def create_silver_table(request: Request, table_name: str, tpa: str):
         
         result = await sf_service.execute_procedure(proc_name, table_name, tpa)
         logger.info(f"Procedure result: {result}")
+        metadata_catalog.invalidate()
         
         # Check if result indicates an error
         if result and isinstance(result, str) and result.startswith("ERROR:"):
@@ -524,6 +527,7 @@ async def delete_physical_table(request: Request, table_name: str, tpa: str):
         # 3. Drop the physical table
         drop_query = f"DROP TABLE IF EXISTS {settings.SILVER_SCHEMA_NAME}.{physical_table_name}"
         await sf_service.execute_query(drop_query)
+        metadata_catalog.invalidate()
         logger.info(f"Physical table {physical_table_name} dropped successfully")
         
         # 4. Remove from created_tables tracking
@@ -628,8 +632,9 @@ async def get_silver_data_stats(request: Request, tpa: str, table_name: str):
         
         # Calculate overall quality score from metrics
         if quality_metrics:
+            # Profile statistics (NULL passed) are informational, not checks
             passed_count = sum(1 for m in quality_metrics if m.get('PASSED'))
-            total_count = len(quality_metrics)
+            total_count = sum(1 for m in quality_metrics if m.get('PASSED') is not None)
             quality_score = round((passed_count / total_count) * 100, 1) if total_count > 0 else 0
         else:
             quality_score = 0
@@ -716,16 +721,15 @@ async def validate_field_mappings(request: Request, tpa: str, target_table: str)
         
         # Get physical table columns
         physical_table_name = f"{tpa.upper()}_{target_table.upper()}"
-        columns_query = f"""
-            SELECT column_name
-            FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.COLUMNS
-            WHERE table_schema = '{settings.SILVER_SCHEMA_NAME}'
-              AND table_name = '{physical_table_name}'
-        """
         
         try:
-            columns_result = await sf_service.execute_query_dict(columns_query)
-            existing_columns = {row['COLUMN_NAME'].upper() for row in columns_result}
+            existing_columns = set(await metadata_catalog.get_columns(
+                settings.SILVER_SCHEMA_NAME,
+                physical_table_name,
+                required=[m['TARGET_COLUMN'] for m in mappings],
+                caller_token=get_caller_token(request),
+                caller_user=get_caller_user(request)
+            ) or [])
         except Exception as e:
             return {
                 "valid": False,
@@ -798,15 +802,14 @@ async def create_field_mapping(request: Request, mapping: FieldMappingCreate):
         # Validation 2: Check if target column exists in physical table
         physical_table_name = f"{mapping.tpa.upper()}_{mapping.target_table.upper()}"
         try:
-            column_check_query = f"""
-                SELECT column_name
-                FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.COLUMNS
-                WHERE table_schema = '{settings.SILVER_SCHEMA_NAME}'
-                  AND table_name = '{physical_table_name}'
-                  AND column_name = '{mapping.target_column.upper()}'
-            """
-            column_result = await sf_service.execute_query_dict(column_check_query)
-            if not column_result or len(column_result) == 0:
+            table_columns = await metadata_catalog.get_columns(
+                settings.SILVER_SCHEMA_NAME,
+                physical_table_name,
+                required=[mapping.target_column],
+                caller_token=get_caller_token(request),
+                caller_user=get_caller_user(request)
+            )
+            if not table_columns or mapping.target_column.upper() not in table_columns:
                 raise HTTPException(
                     status_code=400,
                     detail=f"Target column '{mapping.target_column}' does not exist in table '{physical_table_name}'. Please add it to the target schema first."
@@ -840,12 +843,35 @@ class AutoMapMLRequest(BaseModel):
     tpa: str
     top_n: int = 3
     min_confidence: float = 0.6
+    run_async: bool = False  # Return a job handle after pre-flight checks instead of waiting
 
 class AutoMapLLMRequest(BaseModel):
     source_table: str
     target_table: str
     tpa: str
     model_name: str = "llama3.1-70b"
+    use_cache: bool = True  # False forces a fresh Cortex call (the cache entry is refreshed)
+    cache_ttl_hours: Optional[int] = 168  # None = cached responses never expire
+    candidate_top_k: Optional[int] = None  # Shortlist K target columns per source field before prompting
+    run_async: bool = False  # Return a job handle after pre-flight checks instead of waiting
+
+def parse_mapping_counts(result) -> dict:
+    """Read the inserted/duplicate/rejected counts reported by auto_map_fields_ml/llm"""
+    counts = {"inserted": 0, "duplicate": 0, "rejected": 0}
+    if not isinstance(result, str):
+        return counts
+    match = re.search(r'(\d+) inserted, (\d+) skipped as duplicate, (\d+) rejected', result)
+    if match:
+        counts["inserted"], counts["duplicate"], counts["rejected"] = (int(g) for g in match.groups())
+    else:
+        match = re.search(r'generated (\d+)', result)
+        if match:
+            counts["inserted"] = int(match.group(1))
+    return counts
+
+def mapping_result_cached(result) -> bool:
+    """Whether auto_map_fields_llm served every prompt chunk from the LLM response cache"""
+    return isinstance(result, str) and "served from cache" in result
 
 @router.post("/mappings/auto-ml")
 async def auto_map_fields_ml(request: Request, mapping_request: AutoMapMLRequest):
@@ -854,6 +880,7 @@ async def auto_map_fields_ml(request: Request, mapping_request: AutoMapMLRequest
     Note: This operation can take 30-60 seconds depending on data volume.
     The procedure analyzes source fields and calculates similarity scores
     using multiple algorithms (TF-IDF, sequence matching, word overlap).
+    With run_async the procedure runs as a background job; poll /api/jobs/{job_id}.
     """
     try:
         logger.info(f"Starting ML auto-mapping: source={mapping_request.source_table}, target={mapping_request.target_table}, tpa={mapping_request.tpa}")
@@ -862,18 +889,18 @@ async def auto_map_fields_ml(request: Request, mapping_request: AutoMapMLRequest
         # Escape single quotes for SQL safety
         safe_table = mapping_request.target_table.replace("'", "''")
         safe_tpa = mapping_request.tpa.replace("'", "''")
-        safe_source = mapping_request.source_table.replace("'", "''")
         
         # PRE-FLIGHT CHECK 1: Verify Bronze data exists for this TPA
         logger.info(f"Pre-flight check: Checking Bronze data for TPA '{mapping_request.tpa}'")
         bronze_check = await sf_service.execute_query_dict(f"""
-            SELECT COUNT(*) as record_count,
-                   COUNT(DISTINCT f.key) as field_count
-            FROM {settings.BRONZE_SCHEMA_NAME}.{safe_source},
-            LATERAL FLATTEN(input => RAW_DATA) f
-            WHERE RAW_DATA IS NOT NULL
-              AND TPA = '{safe_tpa}'
-            LIMIT 1000
+            SELECT COALESCE(SUM(IFF(file_rank = 1, ROW_COUNT, 0)), 0) as record_count,
+                   COUNT(DISTINCT FIELD_NAME) as field_count
+            FROM (
+                SELECT FIELD_NAME, ROW_COUNT,
+                       ROW_NUMBER() OVER (PARTITION BY FILE_NAME ORDER BY FIELD_NAME) as file_rank
+                FROM {settings.BRONZE_SCHEMA_NAME}.SOURCE_FIELD_CATALOG
+                WHERE TPA = '{safe_tpa}'
+            )
         """)
         if not bronze_check or bronze_check[0].get('RECORD_COUNT', 0) == 0:
             raise HTTPException(
@@ -902,61 +929,34 @@ async def auto_map_fields_ml(request: Request, mapping_request: AutoMapMLRequest
         # All pre-flight checks passed - proceed with ML mapping
         logger.info(f"✓ Pre-flight checks passed. Proceeding with ML auto-mapping...")
         
-        # Count existing mappings BEFORE the procedure runs (for reliable delta)
-        count_before = 0
-        try:
-            before_query = f"""
-                SELECT COUNT(*) as count 
-                FROM {settings.SILVER_SCHEMA_NAME}.FIELD_MAPPINGS 
-                WHERE TARGET_TABLE = '{safe_table}' 
-                AND TPA = '{safe_tpa}'
-                AND MAPPING_METHOD LIKE 'ML%'
-            """
-            before_result = await sf_service.execute_query_dict(before_query)
-            count_before = before_result[0].get('COUNT', 0) if before_result else 0
-            logger.info(f"ML mappings before procedure: {count_before}")
-        except Exception as e:
-            logger.warning(f"Could not count existing ML mappings: {e}")
-        
-        result = await sf_service.execute_procedure(
-            "auto_map_fields_ml",
+        proc_args = [
             mapping_request.source_table,
             mapping_request.target_table,
             mapping_request.tpa,
             mapping_request.top_n,
             mapping_request.min_confidence
-        )
-        logger.info(f"ML auto-mapping completed. Result type: {type(result)}, Result value: {result}")
+        ]
+        if mapping_request.run_async:
+            job = await job_service.submit(
+                "AUTO_MAP_ML", "auto_map_fields_ml", proc_args,
+                caller_token=get_caller_token(request),
+                tpa=mapping_request.tpa,
+                submitted_by=get_caller_user(request)
+            )
+            return job_service.to_handle(job)
         
-        # Count mappings AFTER the procedure to get reliable delta
-        mappings_created = 0
-        try:
-            after_query = f"""
-                SELECT COUNT(*) as count 
-                FROM {settings.SILVER_SCHEMA_NAME}.FIELD_MAPPINGS 
-                WHERE TARGET_TABLE = '{safe_table}' 
-                AND TPA = '{safe_tpa}'
-                AND MAPPING_METHOD LIKE 'ML%'
-            """
-            after_result = await sf_service.execute_query_dict(after_query)
-            count_after = after_result[0].get('COUNT', 0) if after_result else 0
-            mappings_created = max(0, count_after - count_before)
-            logger.info(f"ML mappings after procedure: {count_after}, new mappings created: {mappings_created}")
-        except Exception as e:
-            logger.warning(f"Could not count ML mappings after procedure: {e}")
+        result = await sf_service.execute_procedure("auto_map_fields_ml", *proc_args)
+        logger.info(f"ML auto-mapping completed. Result type: {type(result)}, Result value: {result}")
         
-        # Fallback: try to parse the result string if DB count failed
-        if mappings_created == 0 and result and isinstance(result, str):
-            import re
-            match = re.search(r'generated (\d+)', result)
-            if match:
-                mappings_created = int(match.group(1))
-                logger.info(f"Extracted mappings_created from result string: {mappings_created}")
+        counts = parse_mapping_counts(result)
+        mappings_created = counts['inserted']
         
         return {
             "message": result if result else f"ML auto-mapping completed ({mappings_created} mappings created)",
             "result": result,
             "mappings_created": mappings_created,
+            "mappings_duplicate": counts['duplicate'],
+            "mappings_rejected": counts['rejected'],
             "success": mappings_created > 0 or (result and isinstance(result, str) and "successfully" in result.lower())
         }
     except HTTPException:
@@ -978,6 +978,7 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
     Note: This operation can take 30-90 seconds depending on data volume
     and LLM model response time. The procedure uses Snowflake Cortex AI
     to semantically understand field relationships.
+    With run_async the procedure runs as a background job; poll /api/jobs/{job_id}.
     """
     try:
         logger.info(f"Starting LLM auto-mapping: source={mapping_request.source_table}, target={mapping_request.target_table}, tpa={mapping_request.tpa}, model={mapping_request.model_name}")
@@ -986,7 +987,6 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
         # Escape single quotes for SQL safety
         safe_table = mapping_request.target_table.replace("'", "''")
         safe_tpa = mapping_request.tpa.replace("'", "''")
-        safe_source = mapping_request.source_table.replace("'", "''")
         
         # PRE-FLIGHT CHECK 1: Verify TPA exists and is active
         logger.info(f"Pre-flight check 1: Verifying TPA '{mapping_request.tpa}' exists")
@@ -1010,13 +1010,14 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
         # PRE-FLIGHT CHECK 2: Verify Bronze data exists for this TPA
         logger.info(f"Pre-flight check 2: Checking Bronze data for TPA '{mapping_request.tpa}'")
         bronze_check = await sf_service.execute_query_dict(f"""
-            SELECT COUNT(*) as record_count,
-                   COUNT(DISTINCT f.key) as field_count
-            FROM {settings.BRONZE_SCHEMA_NAME}.{safe_source},
-            LATERAL FLATTEN(input => RAW_DATA) f
-            WHERE RAW_DATA IS NOT NULL
-              AND TPA = '{safe_tpa}'
-            LIMIT 1000
+            SELECT COALESCE(SUM(IFF(file_rank = 1, ROW_COUNT, 0)), 0) as record_count,
+                   COUNT(DISTINCT FIELD_NAME) as field_count
+            FROM (
+                SELECT FIELD_NAME, ROW_COUNT,
+                       ROW_NUMBER() OVER (PARTITION BY FILE_NAME ORDER BY FIELD_NAME) as file_rank
+                FROM {settings.BRONZE_SCHEMA_NAME}.SOURCE_FIELD_CATALOG
+                WHERE TPA = '{safe_tpa}'
+            )
         """)
         if not bronze_check or bronze_check[0].get('RECORD_COUNT', 0) == 0:
             raise HTTPException(
@@ -1091,31 +1092,26 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
         logger.info(f"  - Target: {mapping_request.target_table} ({column_count} columns)")
         logger.info(f"  - Model: {mapping_request.model_name}")
         
-        # Count existing LLM mappings BEFORE the procedure runs (for reliable delta)
-        count_before = 0
-        try:
-            before_query = f"""
-                SELECT COUNT(*) as count 
-                FROM {settings.SILVER_SCHEMA_NAME}.FIELD_MAPPINGS 
-                WHERE TARGET_TABLE = '{safe_table}' 
-                AND TPA = '{safe_tpa}'
-                AND MAPPING_METHOD LIKE 'LLM%'
-                AND ACTIVE = TRUE
-            """
-            before_result = await sf_service.execute_query_dict(before_query)
-            count_before = before_result[0].get('COUNT', 0) if before_result else 0
-            logger.info(f"LLM mappings before procedure: {count_before}")
-        except Exception as e:
-            logger.warning(f"Could not count existing LLM mappings: {e}")
-        
-        result = await sf_service.execute_procedure(
-            "auto_map_fields_llm",
+        proc_args = [
             mapping_request.source_table,
             mapping_request.target_table,
             mapping_request.tpa,
             mapping_request.model_name,
-            "DEFAULT_FIELD_MAPPING"
-        )
+            "DEFAULT_FIELD_MAPPING",
+            mapping_request.use_cache,
+            mapping_request.cache_ttl_hours,
+            mapping_request.candidate_top_k
+        ]
+        if mapping_request.run_async:
+            job = await job_service.submit(
+                "AUTO_MAP_LLM", "auto_map_fields_llm", proc_args,
+                caller_token=get_caller_token(request),
+                tpa=mapping_request.tpa,
+                submitted_by=get_caller_user(request)
+            )
+            return job_service.to_handle(job)
+        
+        result = await sf_service.execute_procedure("auto_map_fields_llm", *proc_args)
         logger.info(f"LLM auto-mapping completed. Result type: {type(result)}, Result value: '{result}'")
         
         # Check if procedure returned an error message
@@ -1148,36 +1144,16 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
                     # Generic error from procedure
                     raise HTTPException(status_code=500, detail=f"LLM mapping failed: {result}")
         
-        # Count mappings AFTER the procedure to get reliable delta
-        mappings_created = 0
-        try:
-            after_query = f"""
-                SELECT COUNT(*) as count 
-                FROM {settings.SILVER_SCHEMA_NAME}.FIELD_MAPPINGS 
-                WHERE TARGET_TABLE = '{safe_table}' 
-                AND TPA = '{safe_tpa}'
-                AND MAPPING_METHOD LIKE 'LLM%'
-                AND ACTIVE = TRUE
-            """
-            after_result = await sf_service.execute_query_dict(after_query)
-            count_after = after_result[0].get('COUNT', 0) if after_result else 0
-            mappings_created = max(0, count_after - count_before)
-            logger.info(f"LLM mappings after procedure: {count_after}, new mappings created: {mappings_created}")
-        except Exception as e:
-            logger.warning(f"Could not count LLM mappings after procedure: {e}")
-        
-        # Fallback: try to parse the result string if DB count failed
-        if mappings_created == 0 and result and isinstance(result, str):
-            import re
-            match = re.search(r'generated (\d+)', result)
-            if match:
-                mappings_created = int(match.group(1))
-                logger.info(f"Extracted mappings_created from result string: {mappings_created}")
+        counts = parse_mapping_counts(result)
+        mappings_created = counts['inserted']
         
         return {
             "message": result if result else f"LLM auto-mapping completed ({mappings_created} mappings created)",
             "result": result,
             "mappings_created": mappings_created,
+            "mappings_duplicate": counts['duplicate'],
+            "mappings_rejected": counts['rejected'],
+            "cached": mapping_result_cached(result),
             "success": mappings_created > 0 or (result and isinstance(result, str) and "successfully" in result.lower())
         }
     except asyncio.TimeoutError:
@@ -1211,6 +1187,37 @@ async def auto_map_fields_llm(request: Request, mapping_request: AutoMapLLMReque
         else:
             raise HTTPException(status_code=500, detail=f"LLM auto-mapping failed: {error_msg}")
 
+@router.delete("/mappings/llm-cache")
+async def clear_llm_response_cache(
+    request: Request,
+    model_name: Optional[str] = None,
+    template_id: Optional[str] = None,
+    older_than_hours: Optional[int] = None
+):
+    """Expire cached LLM mapping responses (all, or filtered by model, template and age)"""
+    try:
+        sf_service = SnowflakeService(caller_token=get_caller_token(request))
+        conditions = ["1=1"]
+        if model_name:
+            safe_model = model_name.replace("'", "''")
+            conditions.append(f"model_name = '{safe_model}'")
+        if template_id:
+            safe_template = template_id.replace("'", "''")
+            conditions.append(f"template_id = '{safe_template}'")
+        if older_than_hours is not None:
+            conditions.append(f"created_timestamp < DATEADD('hour', -{int(older_than_hours)}, CURRENT_TIMESTAMP())")
+
+        result = await sf_service.execute_query_dict(f"""
+            DELETE FROM {settings.SILVER_SCHEMA_NAME}.llm_response_cache
+            WHERE {' AND '.join(conditions)}
+        """)
+        entries_deleted = result[0].get('number of rows deleted', 0) if result else 0
+        logger.info(f"Cleared {entries_deleted} LLM response cache entries")
+        return {"message": f"Cleared {entries_deleted} cached LLM response(s)", "entries_deleted": entries_deleted}
+    except Exception as e:
+        logger.error(f"Failed to clear LLM response cache: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/mappings/{mapping_id}/approve")
 async def approve_mapping(request: Request, mapping_id: int):
     """Approve a field mapping"""
@@ -1240,7 +1247,11 @@ async def decline_mapping(request: Request, mapping_id: int):
 
 @router.post("/transform")
 async def transform_bronze_to_silver(request: Request, transform_request: TransformRequest):
-    """Transform Bronze data to Silver with pre-validation"""
+    """Transform Bronze data to Silver with pre-validation
+    
+    With run_async the transformation runs as a background job after
+    pre-validation; poll /api/jobs/{job_id}.
+    """
     try:
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
@@ -1273,16 +1284,15 @@ async def transform_bronze_to_silver(request: Request, transform_request: Transf
             logger.info(f"Pre-validation: Checking if physical table '{physical_table_name}' exists")
             
             # First check if table exists
-            table_exists_query = f"""
-                SELECT COUNT(*) as count
-                FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.TABLES
-                WHERE table_schema = '{settings.SILVER_SCHEMA_NAME}'
-                  AND table_name = '{physical_table_name}'
-            """
-            logger.debug(f"Table exists query: {table_exists_query}")
-            table_check = await sf_service.execute_query_dict(table_exists_query)
+            existing_columns = await metadata_catalog.get_columns(
+                settings.SILVER_SCHEMA_NAME,
+                physical_table_name,
+                required=[m['TARGET_COLUMN'] for m in mappings],
+                caller_token=get_caller_token(request),
+                caller_user=get_caller_user(request)
+            )
             
-            if not table_check or table_check[0].get('COUNT', 0) == 0:
+            if existing_columns is None:
                 raise HTTPException(
                     status_code=400,
                     detail=f"Physical table '{physical_table_name}' does not exist. Please create the table first using the 'Create Physical Table' button."
@@ -1290,16 +1300,8 @@ async def transform_bronze_to_silver(request: Request, transform_request: Transf
             
             logger.info(f"Physical table '{physical_table_name}' exists, validating columns")
             
-            # Now get columns
-            columns_query = f"""
-                SELECT column_name
-                FROM {settings.DATABASE_NAME}.INFORMATION_SCHEMA.COLUMNS
-                WHERE table_schema = '{settings.SILVER_SCHEMA_NAME}'
-                  AND table_name = '{physical_table_name}'
-            """
-            logger.debug(f"Columns query: {columns_query}")
-            columns_result = await sf_service.execute_query_dict(columns_query)
-            existing_columns = {row['COLUMN_NAME'].upper() for row in columns_result}
+            # Now validate columns
+            existing_columns = set(existing_columns)
             logger.info(f"Found {len(existing_columns)} columns in physical table")
             
             # Validate all mapped columns exist
@@ -1328,8 +1330,7 @@ async def transform_bronze_to_silver(request: Request, transform_request: Transf
         
         # Execute transformation
         # Note: Procedure signature is (target_table, tpa, source_table, source_schema, batch_size, apply_rules, incremental)
-        result = await sf_service.execute_procedure(
-            "transform_bronze_to_silver",
+        proc_args = [
             transform_request.target_table,
             transform_request.tpa,
             transform_request.source_table,
@@ -1337,7 +1338,17 @@ async def transform_bronze_to_silver(request: Request, transform_request: Transf
             transform_request.batch_size,
             transform_request.apply_rules,
             transform_request.incremental
-        )
+        ]
+        if transform_request.run_async:
+            job = await job_service.submit(
+                "TRANSFORM", "transform_bronze_to_silver", proc_args,
+                caller_token=get_caller_token(request),
+                tpa=transform_request.tpa,
+                submitted_by=get_caller_user(request)
+            )
+            return job_service.to_handle(job)
+        
+        result = await sf_service.execute_procedure("transform_bronze_to_silver", *proc_args)
         logger.info(f"Transformation completed. Result type: {type(result)}, Result value: {result}")
         
         # Ensure result is a string
@@ -1371,6 +1382,84 @@ async def transform_bronze_to_silver(request: Request, transform_request: Transf
         
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/transform/progress")
+async def get_transform_progress(request: Request, tpa: str, target_table: str, batch_id: Optional[str] = None):
+    """Get chunk progress and percent complete for the latest (or a given) transformation run"""
+    try:
+        sf_service = SnowflakeService(caller_token=get_caller_token(request))
+        safe_tpa = tpa.replace("'", "''")
+        safe_table = target_table.upper().replace("'", "''")
+        safe_batch_id = batch_id.replace("'", "''") if batch_id else None
+
+        batch_filter = f"AND batch_id = '{safe_batch_id}'" if safe_batch_id else ""
+        query = f"""
+            SELECT batch_id, status, records_total, records_processed, chunks_completed,
+                   records_inserted, records_updated, records_unchanged, last_record_id, run_mode, start_timestamp, end_timestamp, error_message
+            FROM {settings.SILVER_SCHEMA_NAME}.silver_processing_log
+            WHERE tpa = '{safe_tpa}'
+              AND UPPER(target_table) = '{safe_table}'
+              AND processing_type = 'TRANSFORMATION'
+              {batch_filter}
+            ORDER BY start_timestamp DESC
+            LIMIT 1
+        """
+        result = await sf_service.execute_query_dict(query)
+
+        if not result:
+            raise HTTPException(status_code=404, detail=f"No transformation runs found for '{target_table}' and TPA '{tpa}'")
+
+        run = result[0]
+        records_total = run.get('RECORDS_TOTAL') or 0
+        records_processed = run.get('RECORDS_PROCESSED') or 0
+        records_unchanged = run.get('RECORDS_UNCHANGED') or 0
+        if run.get('STATUS') in ('SUCCESS', 'PARTIAL'):
+            percent_complete = 100.0
+        elif records_total > 0:
+            percent_complete = round(min((records_processed + records_unchanged) / records_total, 1.0) * 100, 2)
+        else:
+            percent_complete = 0.0
+
+        return {
+            "batch_id": run.get('BATCH_ID'),
+            "status": run.get('STATUS'),
+            "records_total": records_total,
+            "records_processed": records_processed,
+            "records_inserted": run.get('RECORDS_INSERTED') or 0,
+            "records_updated": run.get('RECORDS_UPDATED') or 0,
+            "records_unchanged": records_unchanged,
+            "chunks_completed": run.get('CHUNKS_COMPLETED') or 0,
+            "last_record_id": run.get('LAST_RECORD_ID'),
+            "run_mode": run.get('RUN_MODE'),
+            "percent_complete": percent_complete,
+            "start_timestamp": run.get('START_TIMESTAMP'),
+            "end_timestamp": run.get('END_TIMESTAMP'),
+            "error_message": run.get('ERROR_MESSAGE')
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get transformation progress: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/transform/plans")
+async def get_transformation_plans(request: Request, tpa: str, target_table: str, include_sql: bool = True):
+    """Get cached transformation plan versions (generated stage/MERGE SQL) for a TPA and table, newest first"""
+    try:
+        sf_service = SnowflakeService(caller_token=get_caller_token(request))
+        sql_columns = ", stage_sql, merge_sql" if include_sql else ""
+        query = f"""
+            SELECT plan_id, tpa, target_table, plan_hash, plan_version, mapping_count,
+                   created_timestamp, last_used_timestamp{sql_columns}
+            FROM {settings.SILVER_SCHEMA_NAME}.transformation_plans
+            WHERE tpa = '{tpa}'
+              AND target_table = '{target_table.upper()}'
+            ORDER BY plan_version DESC
+        """
+        return await sf_service.execute_query_dict(query)
+    except Exception as e:
+        logger.error(f"Failed to get transformation plans: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ============================================
 # Task Management Endpoints
 # ============================================
@@ -1486,19 +1575,22 @@ async def run_quality_checks(
     request: Request,
     table_name: str,
     tpa: str,
-    batch_id: Optional[str] = None
+    batch_id: Optional[str] = None,
+    profile: bool = True,
+    source_batch_id: Optional[str] = None
 ):
     """
     Run data quality checks on a Silver table
     
-    Performs comprehensive quality validation including:
+    All checks are computed in a single scan of the table:
     - Row count validation
-    - Null value analysis
-    - Duplicate detection
-    - Completeness score
     - Data freshness
-    - Range validation
-    - Date validation
+    - Column profiling (profile=true): null rate, approximate distinct
+      count, min/max and pattern violations per column
+    
+    With source_batch_id (a Silver _BATCH_ID, or LATEST for all batches not
+    yet profiled) only those rows are scanned and merged into the table's
+    running profile.
     """
     try:
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
@@ -1511,7 +1603,9 @@ async def run_quality_checks(
             proc_name,
             table_name,
             tpa,
-            batch_id
+            batch_id,
+            profile,
+            source_batch_id
         )
         
         logger.info(f"Quality check result: {result}")
@@ -1532,34 +1626,120 @@ async def run_quality_checks(
 async def run_quality_checks_all(
     request: Request,
     tpa: str,
-    batch_id: Optional[str] = None
+    batch_id: Optional[str] = None,
+    source_batch_id: Optional[str] = None,
+    max_concurrency: int = 4
 ):
     """
-    Run data quality checks on all Silver tables for a TPA
+    Start data quality checks on all Silver tables for a TPA (ALL = every TPA)
+    
+    Tables are checked concurrently (up to max_concurrency) by the stored
+    procedure, which runs as a background job after this request returns.
+    The response is a job handle; poll GET /api/jobs/{job_id} for the job
+    and GET /quality/check-all/{job_id} for the per-table score roll-up.
+    batch_id names the DQ batch (default: the job ID); it is not the job key,
+    so resubmitting a batch_id starts a new job.
+    source_batch_id=LATEST profiles only batches not yet merged per table.
     """
     try:
+        job_id = f"{tpa.upper()}_DQ_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        dq_batch_id = batch_id or job_id
+        logger.info(f"Submitting data quality checks for all tables: tpa={tpa}, job_id={job_id}, batch_id={dq_batch_id}")
+        
+        job = await job_service.submit(
+            "QUALITY_CHECK_ALL",
+            "SILVER.run_data_quality_checks_all",
+            [tpa, dq_batch_id, source_batch_id, max(1, max_concurrency)],
+            caller_token=get_caller_token(request),
+            tpa=tpa,
+            submitted_by=get_caller_user(request),
+            job_id=job_id
+        )
+        
+        return {
+            **job_service.to_handle(job),
+            "progress_url": f"/api/silver/quality/check-all/{job_id}",
+            "batch_id": dq_batch_id,
+            "tpa": tpa
+        }
+        
+    except Exception as e:
+        logger.error(f"Error submitting quality checks: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/quality/check-all/{job_id}")
+async def get_quality_checks_all_status(request: Request, job_id: str):
+    """Get progress and the score roll-up of the caller's check-all job"""
+    try:
+        job = await job_service.get_job(job_id)
+        if not job or job['JOB_TYPE'] != 'QUALITY_CHECK_ALL' or not job_service.is_owner(job, get_caller_user(request)):
+            raise HTTPException(status_code=404, detail=f"No data quality job found for '{job_id}'")
+        
+        # The DQ batch ID is the procedure's second argument
+        args = job.get('PARAMETERS') or []
+        safe_batch_id = str(args[1] if len(args) > 1 and args[1] else job_id).replace("'", "''")
         sf_service = SnowflakeService(caller_token=get_caller_token(request))
         
-        logger.info(f"Running data quality checks for all tables: tpa={tpa}")
+        result = await sf_service.execute_query_dict(f"""
+            SELECT batch_id, tpa, status, records_total, records_processed, records_success, records_failed,
+                   start_timestamp, end_timestamp, duration_seconds, error_message
+            FROM {settings.SILVER_SCHEMA_NAME}.silver_processing_log
+            WHERE batch_id = '{safe_batch_id}'
+              AND processing_type = 'DATA_QUALITY'
+            ORDER BY start_timestamp DESC
+            LIMIT 1
+        """)
         
-        # Call the stored procedure
-        proc_name = "SILVER.run_data_quality_checks_all"
-        result = await sf_service.execute_procedure(
-            proc_name,
-            tpa,
-            batch_id
-        )
+        if not result:
+            # Not started logging yet (or failed before it could); report the job status
+            return {
+                "job_id": job_id,
+                "status": "SUBMITTED" if job['STATUS'] in ('QUEUED', 'RUNNING') else job['STATUS'],
+                "error_message": job.get('ERROR_MESSAGE')
+            }
         
-        logger.info(f"Quality check result: {result}")
+        run = result[0]
+        records_total = run.get('RECORDS_TOTAL') or 0
+        records_processed = run.get('RECORDS_PROCESSED') or 0
+        
+        tables = await sf_service.execute_query_dict(f"""
+            SELECT tpa, target_table, metric_value AS quality_score, passed, measured_timestamp
+            FROM {settings.SILVER_SCHEMA_NAME}.data_quality_metrics
+            WHERE batch_id = '{safe_batch_id}'
+              AND metric_name = 'OVERALL_QUALITY_SCORE'
+            ORDER BY metric_value ASC, tpa, target_table
+        """)
+        scores = [t['QUALITY_SCORE'] for t in tables if t.get('QUALITY_SCORE') is not None]
         
         return {
-            "success": True,
-            "message": result,
-            "tpa": tpa
+            "job_id": job_id,
+            "tpa": run.get('TPA'),
+            "status": run.get('STATUS'),
+            "tables_total": records_total,
+            "tables_completed": records_processed,
+            "tables_succeeded": run.get('RECORDS_SUCCESS') or 0,
+            "tables_failed": run.get('RECORDS_FAILED') or 0,
+            "percent_complete": round(records_processed / records_total * 100, 2) if records_total else 0.0,
+            "average_score": round(sum(scores) / len(scores), 2) if scores else None,
+            "tables_below_threshold": sum(1 for t in tables if t.get('PASSED') is False),
+            "tables": [
+                {
+                    "tpa": t['TPA'],
+                    "target_table": t['TARGET_TABLE'],
+                    "quality_score": t['QUALITY_SCORE'],
+                    "passed": t['PASSED']
+                }
+                for t in tables
+            ],
+            "start_timestamp": run.get('START_TIMESTAMP'),
+            "end_timestamp": run.get('END_TIMESTAMP'),
+            "error_message": run.get('ERROR_MESSAGE')
         }
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error running quality checks: {str(e)}", exc_info=True)
+        logger.error(f"Failed to get data quality job status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
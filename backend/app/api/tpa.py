@@ -8,6 +8,7 @@ from typing import Optional
 import logging
 
 from app.services.snowflake_service import SnowflakeService
+from app.services.metadata_catalog import metadata_catalog
 from app.utils.auth_utils import get_caller_token
 from app.config import settings
 
@@ -136,6 +137,7 @@ async def update_tpa(request: Request, tpa_code: str, tpa: TPAUpdate):
                         RENAME TO {settings.SILVER_SCHEMA_NAME}.{new_table_name}
                     """
                     await sf_service.execute_query(rename_query)
+                    metadata_catalog.invalidate()
                     logger.info(f"Renamed table {old_table_name} to {new_table_name}")
                 except Exception as e:
                     logger.warning(f"Failed to rename table {old_table_name}: {e}")
@@ -185,6 +187,30 @@ async def update_tpa(request: Request, tpa_code: str, tpa: TPAUpdate):
             """
             await sf_service.execute_query(update_bronze_query)
             logger.info(f"Updated Bronze raw data for TPA '{tpa_code}' to '{new_tpa_code}'")
+            
+            # Update Bronze source field catalog
+            update_catalog_query = f"""
+                UPDATE {settings.BRONZE_SCHEMA_NAME}.SOURCE_FIELD_CATALOG 
+                SET TPA = '{new_tpa_code}'
+                WHERE TPA = '{tpa_code}'
+            """
+            await sf_service.execute_query(update_catalog_query)
+            logger.info(f"Updated source field catalog for TPA '{tpa_code}' to '{new_tpa_code}'")
+            
+            # Update file layout fingerprints and their mapping-set links
+            update_fingerprints_query = f"""
+                UPDATE {settings.BRONZE_SCHEMA_NAME}.SCHEMA_FINGERPRINTS 
+                SET TPA = '{new_tpa_code}'
+                WHERE TPA = '{tpa_code}'
+            """
+            await sf_service.execute_query(update_fingerprints_query)
+            update_layouts_query = f"""
+                UPDATE {settings.SILVER_SCHEMA_NAME}.layout_mapping_sets 
+                SET tpa = '{new_tpa_code}'
+                WHERE tpa = '{tpa_code}'
+            """
+            await sf_service.execute_query(update_layouts_query)
+            logger.info(f"Updated file layout fingerprints for TPA '{tpa_code}' to '{new_tpa_code}'")
         
         # Build update query for TPA_MASTER
         updates = []
@@ -253,6 +279,7 @@ async def delete_tpa(request: Request, tpa_code: str):
             try:
                 drop_query = f"DROP TABLE IF EXISTS {settings.SILVER_SCHEMA_NAME}.{table_name}"
                 await sf_service.execute_query(drop_query)
+                metadata_catalog.invalidate()
                 logger.info(f"Dropped table {table_name}")
             except Exception as e:
                 logger.warning(f"Failed to drop table {table_name}: {e}")
@@ -309,6 +336,25 @@ async def delete_tpa(request: Request, tpa_code: str):
             """
             await sf_service.execute_query(delete_bronze_query)
             logger.info(f"Deleted Bronze raw data for TPA '{tpa_code}'")
+            
+            delete_catalog_query = f"""
+                DELETE FROM {settings.BRONZE_SCHEMA_NAME}.SOURCE_FIELD_CATALOG 
+                WHERE TPA = '{tpa_code}'
+            """
+            await sf_service.execute_query(delete_catalog_query)
+            logger.info(f"Deleted source field catalog entries for TPA '{tpa_code}'")
+            
+            delete_fingerprints_query = f"""
+                DELETE FROM {settings.BRONZE_SCHEMA_NAME}.SCHEMA_FINGERPRINTS 
+                WHERE TPA = '{tpa_code}'
+            """
+            await sf_service.execute_query(delete_fingerprints_query)
+            delete_layouts_query = f"""
+                DELETE FROM {settings.SILVER_SCHEMA_NAME}.layout_mapping_sets 
+                WHERE tpa = '{tpa_code}'
+            """
+            await sf_service.execute_query(delete_layouts_query)
+            logger.info(f"Deleted file layout fingerprints for TPA '{tpa_code}'")
         except Exception as e:
             logger.warning(f"Failed to delete Bronze raw data: {e}")
         
@@ -53,6 +53,7 @@ class Settings(BaseSettings):
     DATABASE_NAME: str = "BORDEREAU_PROCESSING_PIPELINE"
     BRONZE_SCHEMA_NAME: str = "BRONZE"
     SILVER_SCHEMA_NAME: str = "SILVER"
+    GOLD_SCHEMA_NAME: str = "GOLD"
     
     # LLM Configuration
     ALLOWED_LLM_MODELS: str = "CLAUDE-4-SONNET,OPENAI-GPT-4.1"
@@ -87,6 +88,16 @@ class Settings(BaseSettings):
     BATCH_SIZE: int = 10000
     MAX_RETRIES: int = 3
     
+    # Background Jobs
+    JOB_MAX_WORKERS: int = 4  # Jobs running at once; further submissions wait in the queue
+    JOB_POLL_INTERVAL_SECONDS: int = 5
+    
+    # Idempotency-Key support for POST requests
+    IDEMPOTENCY_TTL_HOURS: int = 24  # How long a stored response is replayed to retries
+    
+    # Metadata catalog (in-memory snapshot of schemas, tables and columns)
+    METADATA_CATALOG_TTL_SECONDS: int = 300
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -9,11 +9,13 @@ from fastapi.responses import JSONResponse
 from typing import List, Optional
 import logging
 
-from app.api import bronze, silver, gold, tpa, user, logs, admin
+from app.api import bronze, silver, gold, tpa, user, logs, admin, jobs
 from app.services.snowflake_service import SnowflakeService
+from app.services.job_service import job_service
 from app.config import settings
 from app.middleware.logging_middleware import APILoggingMiddleware
 from app.middleware.auth_middleware import SnowflakeAuthMiddleware
+from app.middleware.idempotency_middleware import IdempotencyMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -54,6 +56,10 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers including Set-Cookie
 )
 
+# Replay responses to POST retries carrying an Idempotency-Key header
+# (added before auth so it runs after the caller has been identified)
+app.add_middleware(IdempotencyMiddleware)
+
 # Add authentication middleware (extracts caller's token from cookies)
 app.add_middleware(SnowflakeAuthMiddleware)
 
@@ -68,6 +74,7 @@ app.include_router(gold.router, prefix="/api/gold", tags=["Gold"])
 app.include_router(user.router, prefix="/api/user", tags=["User"])
 app.include_router(logs.router, prefix="/api/logs", tags=["Logs"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -173,11 +180,15 @@ async def startup_event():
         logger.info(f"Auth method detected - authenticator: {config.get('authenticator', 'NOT SET')}")
     except Exception as e:
         logger.error(f"Failed to get Snowflake config: {e}")
+    
+    # Start background job workers (resumes jobs left running by a previous instance)
+    await job_service.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler"""
     logger.info("Shutting down Snowflake Pipeline API...")
+    await job_service.stop()
 
 if __name__ == "__main__":
     import uvicorn
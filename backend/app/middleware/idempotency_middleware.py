@@ -0,0 +1,264 @@
+"""
+Idempotency-Key Middleware
+Replays the original response when a POST request is retried with the same key
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp
+import logging
+
+from app.services.snowflake_service import SnowflakeService
+from app.config import settings
+from app.utils.auth_utils import get_caller_user
+
+logger = logging.getLogger(__name__)
+
+# An IN_PROGRESS key older than this is treated as abandoned (the request
+# timeout for stored procedures is 600s)
+IN_PROGRESS_TIMEOUT_SECONDS = 900
+
+# Responses larger than this are returned but not stored for replay
+MAX_STORED_BODY_BYTES = 1_000_000
+
+# Minimum seconds between purges of expired keys
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def _quote(value: Optional[object]) -> str:
+    """SQL string literal for a value, NULL if None"""
+    if value is None:
+        return 'NULL'
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def request_fingerprint(request: Request, body: bytes) -> str:
+    """SHA-256 over the parts of a request that must match for a key to be reused"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update("&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items())).encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware that makes POST requests carrying an Idempotency-Key header safe to retry
+
+    The first request with a key claims it in BRONZE.API_IDEMPOTENCY_KEYS and
+    its response is stored for IDEMPOTENCY_TTL_HOURS. A retry with the same
+    key and request gets the stored response (for job submissions, the
+    handle of the job already running). A retry that arrives while the
+    original is still running in this process waits for it; one that reaches
+    another instance gets 409 with Retry-After. Reusing a key for a different
+    request is rejected with 422.
+    """
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app)
+        self._in_flight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+        self._last_purge = 0.0
+
+    async def dispatch(self, request: Request, call_next):
+        key = request.headers.get("idempotency-key")
+        if request.method != "POST" or key is None or not request.url.path.startswith("/api/"):
+            return await call_next(request)
+
+        key = key.strip()
+        if not key or len(key) > 255:
+            return JSONResponse(status_code=400, content={"detail": "Idempotency-Key must be 1 to 255 characters"})
+
+        user_name = get_caller_user(request) or ''
+        body = await request.body()
+        fingerprint = request_fingerprint(request, body)
+        scope_key = (user_name, key)
+
+        # Original still running in this process: wait for its response
+        in_flight = self._in_flight.get(scope_key)
+        if in_flight:
+            if in_flight[0] != fingerprint:
+                return self._mismatch_response(key)
+            logger.info(f"Idempotency-Key {key}: waiting for the in-flight original request")
+            status_code, content_type, content = await asyncio.shield(in_flight[1])
+            return self._replay_response(status_code, content_type, content)
+
+        try:
+            stored = await self._get_stored(user_name, key)
+        except Exception as e:
+            logger.warning(f"Idempotency lookup failed, processing request without it: {e}")
+            return await call_next(request)
+
+        if stored:
+            if stored['REQUEST_FINGERPRINT'] != fingerprint:
+                return self._mismatch_response(key)
+            if stored['STATUS'] == 'COMPLETED':
+                logger.info(f"Idempotency-Key {key}: replaying stored response for {request.url.path}")
+                return self._replay_response(
+                    stored['RESPONSE_STATUS'],
+                    stored.get('RESPONSE_CONTENT_TYPE'),
+                    (stored.get('RESPONSE_BODY') or '').encode()
+                )
+            return self._in_progress_response(key)
+
+        try:
+            claimed = await self._claim(user_name, key, request, fingerprint)
+        except Exception as e:
+            logger.warning(f"Could not claim Idempotency-Key, processing request without it: {e}")
+            return await call_next(request)
+        if not claimed:
+            return self._in_progress_response(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[scope_key] = (fingerprint, future)
+        try:
+            response = await call_next(request)
+            content = b""
+            async for chunk in response.body_iterator:
+                content += chunk if isinstance(chunk, bytes) else chunk.encode()
+            content_type = response.headers.get("content-type")
+            future.set_result((response.status_code, content_type, content))
+
+            if response.status_code < 500 and len(content) <= MAX_STORED_BODY_BYTES:
+                await self._complete(user_name, key, response.status_code, content_type, content)
+            else:
+                # Server errors are not replayed: a retry should run the request again
+                await self._release(user_name, key)
+
+            return Response(
+                content=content,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                media_type=response.media_type
+            )
+        except Exception:
+            if not future.done():
+                future.set_result((500, "application/json", b'{"detail": "The original request failed"}'))
+            await self._release(user_name, key)
+            raise
+        finally:
+            self._in_flight.pop(scope_key, None)
+
+    @staticmethod
+    def _replay_response(status_code: int, content_type: Optional[str], content: bytes) -> Response:
+        return Response(
+            content=content,
+            status_code=status_code,
+            headers={"Idempotent-Replayed": "true"},
+            media_type=content_type
+        )
+
+    @staticmethod
+    def _mismatch_response(key: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=422,
+            content={"detail": f"Idempotency-Key '{key}' was already used for a different request"}
+        )
+
+    @staticmethod
+    def _in_progress_response(key: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": f"A request with Idempotency-Key '{key}' is still in progress"},
+            headers={"Retry-After": "5"}
+        )
+
+    async def _get_stored(self, user_name: str, key: str) -> Optional[dict]:
+        """Live stored entry for a key (expired and abandoned entries are ignored)"""
+        rows = await SnowflakeService().execute_query_dict(f"""
+            SELECT REQUEST_FINGERPRINT, STATUS, RESPONSE_STATUS, RESPONSE_CONTENT_TYPE, RESPONSE_BODY
+            FROM {settings.BRONZE_SCHEMA_NAME}.API_IDEMPOTENCY_KEYS
+            WHERE USER_NAME = {_quote(user_name)}
+              AND IDEMPOTENCY_KEY = {_quote(key)}
+              AND EXPIRES_TIMESTAMP > CURRENT_TIMESTAMP()
+              AND (STATUS = 'COMPLETED'
+                   OR CREATED_TIMESTAMP > DATEADD('second', -{IN_PROGRESS_TIMEOUT_SECONDS}, CURRENT_TIMESTAMP()))
+        """, timeout=30)
+        return rows[0] if rows else None
+
+    async def _claim(self, user_name: str, key: str, request: Request, fingerprint: str) -> bool:
+        """Insert the IN_PROGRESS entry; False if another request claimed the key first"""
+        sf_service = SnowflakeService()
+        await self._purge_expired(sf_service)
+        table = f"{settings.BRONZE_SCHEMA_NAME}.API_IDEMPOTENCY_KEYS"
+        try:
+            # Clear an expired or abandoned entry for this key so it can be claimed again
+            await sf_service.execute_query(f"""
+                DELETE FROM {table}
+                WHERE USER_NAME = {_quote(user_name)}
+                  AND IDEMPOTENCY_KEY = {_quote(key)}
+                  AND (EXPIRES_TIMESTAMP <= CURRENT_TIMESTAMP()
+                       OR (STATUS = 'IN_PROGRESS'
+                           AND CREATED_TIMESTAMP <= DATEADD('second', -{IN_PROGRESS_TIMEOUT_SECONDS}, CURRENT_TIMESTAMP())))
+            """, timeout=30)
+            await sf_service.execute_query(f"""
+                INSERT INTO {table} (
+                    USER_NAME, IDEMPOTENCY_KEY, REQUEST_METHOD, REQUEST_PATH, REQUEST_FINGERPRINT, EXPIRES_TIMESTAMP
+                ) SELECT
+                    {_quote(user_name)},
+                    {_quote(key)},
+                    {_quote(request.method)},
+                    {_quote(request.url.path)},
+                    {_quote(fingerprint)},
+                    DATEADD('hour', {int(settings.IDEMPOTENCY_TTL_HOURS)}, CURRENT_TIMESTAMP())
+            """, timeout=30)
+            return True
+        except Exception as e:
+            if "duplicate" in str(e).lower() or "unique" in str(e).lower():
+                logger.info(f"Idempotency-Key {key} was claimed by a concurrent request")
+                return False
+            raise
+
+    async def _complete(self, user_name: str, key: str, status_code: int, content_type: Optional[str], content: bytes):
+        """Store the response of the original request for replay"""
+        job_id = None
+        try:
+            parsed = json.loads(content) if content else None
+            if isinstance(parsed, dict):
+                job_id = parsed.get("job_id")
+        except ValueError:
+            pass
+        try:
+            await SnowflakeService().execute_query(f"""
+                UPDATE {settings.BRONZE_SCHEMA_NAME}.API_IDEMPOTENCY_KEYS
+                SET STATUS = 'COMPLETED',
+                    RESPONSE_STATUS = {int(status_code)},
+                    RESPONSE_CONTENT_TYPE = {_quote(content_type)},
+                    RESPONSE_BODY = {_quote(content.decode(errors='replace'))},
+                    JOB_ID = {_quote(job_id)},
+                    COMPLETED_TIMESTAMP = CURRENT_TIMESTAMP()
+                WHERE USER_NAME = {_quote(user_name)}
+                  AND IDEMPOTENCY_KEY = {_quote(key)}
+            """, timeout=30)
+        except Exception as e:
+            logger.error(f"Failed to store response for Idempotency-Key {key}: {e}")
+
+    async def _release(self, user_name: str, key: str):
+        """Drop an IN_PROGRESS claim so the request can be retried"""
+        try:
+            await SnowflakeService().execute_query(f"""
+                DELETE FROM {settings.BRONZE_SCHEMA_NAME}.API_IDEMPOTENCY_KEYS
+                WHERE USER_NAME = {_quote(user_name)}
+                  AND IDEMPOTENCY_KEY = {_quote(key)}
+                  AND STATUS = 'IN_PROGRESS'
+            """, timeout=30)
+        except Exception as e:
+            logger.error(f"Failed to release Idempotency-Key {key}: {e}")
+
+    async def _purge_expired(self, sf_service: SnowflakeService):
+        if time.time() - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.time()
+        try:
+            await sf_service.execute_query(f"""
+                DELETE FROM {settings.BRONZE_SCHEMA_NAME}.API_IDEMPOTENCY_KEYS
+                WHERE EXPIRES_TIMESTAMP <= CURRENT_TIMESTAMP()
+            """, timeout=30)
+        except Exception as e:
+            logger.warning(f"Failed to purge expired idempotency keys: {e}")
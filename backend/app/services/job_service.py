@@ -0,0 +1,313 @@
+"""
+Background job execution for long-running stored procedures
+
+Jobs are persisted in BRONZE.API_JOBS. A fixed pool of asyncio workers
+takes queued jobs, starts each procedure as a detached Snowflake query and
+polls it until it finishes, so the work and its status outlive both the
+HTTP request that submitted it and a restart of the API.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.services.snowflake_service import SnowflakeService
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_JOB_STATUSES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+# Snowflake query states after which the CALL will not change any more
+FINISHED_QUERY_STATUSES = ('SUCCESS', 'FAILED_WITH_ERROR', 'FAILED_WITH_INCIDENT', 'ABORTED', 'DISCONNECTED')
+
+
+def _quote(value: Optional[Any]) -> str:
+    """SQL string literal for a value, NULL if None"""
+    if value is None:
+        return 'NULL'
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+class JobService:
+    """Queue, run and track background jobs backed by the API_JOBS table"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Caller tokens are held in memory only; they are never written to API_JOBS
+        self._caller_tokens: Dict[str, Optional[str]] = {}
+
+    @property
+    def table(self) -> str:
+        return f"{settings.BRONZE_SCHEMA_NAME}.API_JOBS"
+
+    async def start(self):
+        """Start the worker pool and pick up jobs left over from a previous run"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(max(1, settings.JOB_MAX_WORKERS))
+        ]
+        logger.info(f"Started {len(self._workers)} background job worker(s)")
+        await self._recover()
+
+    async def stop(self):
+        """Stop the workers; detached Snowflake queries keep running and are resumed on the next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Stopped background job workers")
+
+    async def submit(
+        self,
+        job_type: str,
+        procedure_name: str,
+        args: List[Any],
+        caller_token: Optional[str] = None,
+        tpa: Optional[str] = None,
+        submitted_by: Optional[str] = None,
+        job_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Persist a job as QUEUED and hand it to the worker pool; returns the job row"""
+        if self._queue is None:
+            raise RuntimeError("Background job workers are not running")
+
+        job_id = job_id or f"{job_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        parameters = json.dumps(args, default=str)
+
+        await SnowflakeService().execute_query(f"""
+            INSERT INTO {self.table} (
+                JOB_ID, JOB_TYPE, STATUS, PROCEDURE_NAME, PARAMETERS, TPA_CODE, SUBMITTED_BY
+            ) SELECT
+                {_quote(job_id)},
+                {_quote(job_type)},
+                'QUEUED',
+                {_quote(procedure_name)},
+                PARSE_JSON({_quote(parameters)}),
+                {_quote(tpa)},
+                {_quote(submitted_by)}
+        """)
+
+        self._caller_tokens[job_id] = caller_token
+        await self._queue.put(job_id)
+        logger.info(f"Queued job {job_id}: {procedure_name}")
+        return await self.get_job(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, None if unknown"""
+        rows = await SnowflakeService().execute_query_dict(f"""
+            SELECT *
+            FROM {self.table}
+            WHERE JOB_ID = {_quote(job_id)}
+        """)
+        if not rows:
+            return None
+        job = rows[0]
+        for key in ('PARAMETERS', 'PROGRESS'):
+            if isinstance(job.get(key), str):
+                job[key] = json.loads(job[key])
+        return job
+
+    async def list_jobs(
+        self,
+        status: Optional[str] = None,
+        job_type: Optional[str] = None,
+        tpa: Optional[str] = None,
+        limit: int = 50,
+        submitted_by: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Most recent jobs, optionally filtered ('' for submitted_by matches jobs without a submitter)"""
+        conditions = ["1=1"]
+        if submitted_by is not None:
+            conditions.append(f"COALESCE(SUBMITTED_BY, '') = {_quote(submitted_by)}")
+        if status:
+            conditions.append(f"STATUS = {_quote(status.upper())}")
+        if job_type:
+            conditions.append(f"JOB_TYPE = {_quote(job_type.upper())}")
+        if tpa:
+            conditions.append(f"TPA_CODE = {_quote(tpa)}")
+
+        return await SnowflakeService().execute_query_dict(f"""
+            SELECT JOB_ID, JOB_TYPE, STATUS, QUERY_ID, TPA_CODE, SUBMITTED_BY, ERROR_MESSAGE,
+                   CREATED_TIMESTAMP, STARTED_TIMESTAMP, COMPLETED_TIMESTAMP
+            FROM {self.table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY CREATED_TIMESTAMP DESC
+            LIMIT {int(limit)}
+        """)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; queued jobs stop at once, running ones at the worker's next poll"""
+        job = await self.get_job(job_id)
+        if not job or job['STATUS'] in TERMINAL_JOB_STATUSES:
+            return job
+
+        await SnowflakeService().execute_query(f"""
+            UPDATE {self.table}
+            SET CANCEL_REQUESTED = TRUE,
+                UPDATED_TIMESTAMP = CURRENT_TIMESTAMP()
+            WHERE JOB_ID = {_quote(job_id)}
+        """)
+        if job['STATUS'] == 'QUEUED':
+            await self._finish(job_id, 'CANCELLED', error="Cancelled before it started")
+        return await self.get_job(job_id)
+
+    @staticmethod
+    def is_owner(job: Dict[str, Any], user_name: Optional[str]) -> bool:
+        """Whether a job was submitted by user_name (None/'' for an unidentified caller)"""
+        return (job.get('SUBMITTED_BY') or '') == (user_name or '')
+
+    @staticmethod
+    def to_handle(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Response returned by endpoints that submit a job"""
+        return {
+            "success": True,
+            "job_id": job['JOB_ID'],
+            "job_type": job['JOB_TYPE'],
+            "status": job['STATUS'],
+            "status_url": f"{settings.API_PREFIX}/jobs/{job['JOB_ID']}"
+        }
+
+    async def _recover(self):
+        """Re-attach to jobs that were queued or running when the API stopped"""
+        try:
+            rows = await SnowflakeService().execute_query_dict(f"""
+                SELECT JOB_ID, STATUS
+                FROM {self.table}
+                WHERE STATUS IN ('QUEUED', 'RUNNING')
+                ORDER BY CREATED_TIMESTAMP
+            """)
+        except Exception as e:
+            logger.warning(f"Could not recover background jobs: {e}")
+            return
+
+        for row in rows:
+            if row['STATUS'] == 'QUEUED' and settings.USE_CALLERS_RIGHTS:
+                # The submitter's token was not persisted, so the job cannot run with their rights
+                await self._finish(row['JOB_ID'], 'FAILED', error="API restarted before the job started; please resubmit")
+                continue
+            await self._queue.put(row['JOB_ID'])
+        if rows:
+            logger.info(f"Recovered {len(rows)} background job(s)")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed on worker {worker_id}: {str(e)}", exc_info=True)
+                try:
+                    await self._finish(job_id, 'FAILED', error=str(e))
+                except Exception as finish_error:
+                    logger.error(f"Could not record failure of job {job_id}: {finish_error}")
+            finally:
+                self._caller_tokens.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        job = await self.get_job(job_id)
+        if not job or job['STATUS'] in TERMINAL_JOB_STATUSES:
+            return
+
+        sf_service = SnowflakeService(caller_token=self._caller_tokens.get(job_id))
+
+        if job['STATUS'] == 'RUNNING':
+            # Resumed after a restart: the CALL was detached and may still be running
+            if not job.get('QUERY_ID'):
+                await self._finish(job_id, 'FAILED', error="API restarted while the job was starting; its outcome is unknown")
+                return
+            await self._wait_for_query(job_id, job['QUERY_ID'], sf_service)
+            return
+
+        if job.get('CANCEL_REQUESTED'):
+            await self._finish(job_id, 'CANCELLED', error="Cancelled before it started")
+            return
+
+        query_id = await sf_service.submit_procedure(job['PROCEDURE_NAME'], *(job.get('PARAMETERS') or []))
+        await SnowflakeService().execute_query(f"""
+            UPDATE {self.table}
+            SET STATUS = 'RUNNING',
+                QUERY_ID = {_quote(query_id)},
+                STARTED_TIMESTAMP = CURRENT_TIMESTAMP(),
+                UPDATED_TIMESTAMP = CURRENT_TIMESTAMP()
+            WHERE JOB_ID = {_quote(job_id)}
+        """)
+        logger.info(f"Job {job_id} running as query {query_id}")
+        await self._wait_for_query(job_id, query_id, sf_service)
+
+    async def _wait_for_query(self, job_id: str, query_id: str, sf_service: SnowflakeService):
+        cancel_sent = False
+        while True:
+            query_status = await sf_service.get_query_status(query_id)
+            if query_status in FINISHED_QUERY_STATUSES:
+                break
+
+            await SnowflakeService().execute_query(f"""
+                UPDATE {self.table}
+                SET PROGRESS = OBJECT_CONSTRUCT(
+                        'query_status', {_quote(query_status)},
+                        'elapsed_seconds', DATEDIFF('second', STARTED_TIMESTAMP, CURRENT_TIMESTAMP())
+                    ),
+                    UPDATED_TIMESTAMP = CURRENT_TIMESTAMP()
+                WHERE JOB_ID = {_quote(job_id)}
+            """)
+            job = await self.get_job(job_id)
+            if job and job.get('CANCEL_REQUESTED') and not cancel_sent:
+                logger.info(f"Cancelling query {query_id} of job {job_id}")
+                await sf_service.cancel_query(query_id)
+                cancel_sent = True
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+
+        if query_status == 'SUCCESS':
+            result = await sf_service.get_query_result(query_id)
+            await self._finish(job_id, 'SUCCEEDED', result=result, query_status=query_status)
+            return
+
+        job = await self.get_job(job_id)
+        if job and job.get('CANCEL_REQUESTED'):
+            await self._finish(job_id, 'CANCELLED', error="Cancelled while running", query_status=query_status)
+            return
+        try:
+            # Fetching the result of a failed query raises its error
+            await sf_service.get_query_result(query_id)
+            error = f"Query ended with status {query_status}"
+        except Exception as e:
+            error = str(e)
+        await self._finish(job_id, 'FAILED', error=error, query_status=query_status)
+
+    async def _finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None,
+        query_status: Optional[str] = None
+    ):
+        progress = "PROGRESS"
+        if query_status:
+            progress = f"OBJECT_INSERT(COALESCE(PROGRESS::OBJECT, OBJECT_CONSTRUCT()), 'query_status', {_quote(query_status)}, TRUE)"
+        await SnowflakeService().execute_query(f"""
+            UPDATE {self.table}
+            SET STATUS = {_quote(status)},
+                RESULT = {_quote(result)},
+                ERROR_MESSAGE = {_quote(error[:4000] if error else None)},
+                PROGRESS = {progress},
+                COMPLETED_TIMESTAMP = CURRENT_TIMESTAMP(),
+                UPDATED_TIMESTAMP = CURRENT_TIMESTAMP()
+            WHERE JOB_ID = {_quote(job_id)}
+              AND STATUS NOT IN ('SUCCEEDED', 'FAILED', 'CANCELLED')
+        """)
+        logger.info(f"Job {job_id} {status.lower()}")
+
+
+# Global job service instance
+job_service = JobService()
@@ -0,0 +1,198 @@
+"""
+In-process metadata catalog
+
+Snapshots the schemas, tables, columns and procedures of the pipeline
+database from a handful of bulk SHOW commands and answers existence and
+column lookups from memory, instead of querying INFORMATION_SCHEMA on every
+request. The snapshot is refreshed after METADATA_CATALOG_TTL_SECONDS and
+invalidated by the API's own DDL (table creation, drops and renames).
+
+SHOW only lists objects the session's role can see, so with caller's rights
+each caller gets a snapshot loaded with their own token (keyed by user, whose
+default role the token carries); without a caller token the service
+snapshot is used.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.services.snowflake_service import SnowflakeService
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SHOW COLUMNS returns at most this many rows; a schema that hits the cap
+# gets its columns loaded per table on demand instead
+SHOW_COLUMNS_LIMIT = 10000
+
+# A lookup that misses forces a reload if the snapshot is older than this,
+# so objects created outside the API become visible without waiting a full TTL
+MISS_REFRESH_SECONDS = 30
+
+# Caller snapshots kept at once; the least recently loaded is dropped first
+MAX_CALLER_SNAPSHOTS = 50
+
+
+class CatalogSnapshot:
+    """Metadata of one database as of loaded_at"""
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self.schemas: Set[str] = set()
+        self.tables: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.columns: Dict[Tuple[str, str], List[str]] = {}
+        self.procedures: Set[Tuple[str, str]] = set()
+        self.partial_column_schemas: Set[str] = set()
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class MetadataCatalog:
+    """Process-wide cache of database metadata, one snapshot per caller scope"""
+
+    def __init__(self):
+        self._snapshots: Dict[Optional[str], CatalogSnapshot] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def column_schemas(self) -> List[str]:
+        """Schemas whose columns are included in the snapshot"""
+        return [settings.BRONZE_SCHEMA_NAME, settings.SILVER_SCHEMA_NAME, settings.GOLD_SCHEMA_NAME]
+
+    def invalidate(self):
+        """Drop every snapshot; the next lookup of each caller reloads it"""
+        self._snapshots.clear()
+        logger.info("Metadata catalog invalidated")
+
+    async def schema_exists(self, schema: str, caller_token: Optional[str] = None, caller_user: Optional[str] = None) -> bool:
+        return await self._lookup(lambda s: schema.upper() in s.schemas, caller_token, caller_user)
+
+    async def table_exists(self, schema: str, table: str, caller_token: Optional[str] = None, caller_user: Optional[str] = None) -> bool:
+        return await self._lookup(lambda s: (schema.upper(), table.upper()) in s.tables, caller_token, caller_user)
+
+    async def procedure_exists(self, schema: str, procedure: str, caller_token: Optional[str] = None, caller_user: Optional[str] = None) -> bool:
+        return await self._lookup(lambda s: (schema.upper(), procedure.upper()) in s.procedures, caller_token, caller_user)
+
+    async def list_tables(self, schema: str, caller_token: Optional[str] = None, caller_user: Optional[str] = None) -> Set[str]:
+        """Names of the tables in a schema"""
+        snapshot = await self._get(caller_token, caller_user)
+        return {table for (table_schema, table) in snapshot.tables if table_schema == schema.upper()}
+
+    async def list_procedures(self, schema: str, caller_token: Optional[str] = None, caller_user: Optional[str] = None) -> Set[str]:
+        """Names of the user procedures in a schema"""
+        snapshot = await self._get(caller_token, caller_user)
+        return {procedure for (procedure_schema, procedure) in snapshot.procedures if procedure_schema == schema.upper()}
+
+    async def get_columns(
+        self,
+        schema: str,
+        table: str,
+        required: Optional[List[str]] = None,
+        caller_token: Optional[str] = None,
+        caller_user: Optional[str] = None
+    ) -> Optional[List[str]]:
+        """Column names of a table in ordinal order, None if the table does not exist
+
+        If any of the required columns is missing from a snapshot older than
+        MISS_REFRESH_SECONDS, the snapshot is reloaded once before answering.
+        """
+        key = (schema.upper(), table.upper())
+        if not await self.table_exists(*key, caller_token=caller_token, caller_user=caller_user):
+            return None
+        snapshot = await self._get(caller_token, caller_user)
+        columns = await self._table_columns(snapshot, key, caller_token)
+        if required and snapshot.age_seconds > MISS_REFRESH_SECONDS and any(c.upper() not in columns for c in required):
+            snapshot = await self._get(caller_token, caller_user, force=True)
+            if key not in snapshot.tables:
+                return None
+            columns = await self._table_columns(snapshot, key, caller_token)
+        return columns
+
+    async def _table_columns(self, snapshot: CatalogSnapshot, key: Tuple[str, str], caller_token: Optional[str]) -> List[str]:
+        if key not in snapshot.columns and key[0] in snapshot.partial_column_schemas:
+            rows = await SnowflakeService(caller_token=caller_token).execute_query_dict(
+                f"SHOW COLUMNS IN TABLE {settings.DATABASE_NAME}.{key[0]}.{key[1]}", timeout=30
+            )
+            snapshot.columns[key] = [row['column_name'].upper() for row in rows]
+        return snapshot.columns.get(key, [])
+
+    async def _lookup(self, predicate, caller_token: Optional[str], caller_user: Optional[str]) -> bool:
+        snapshot = await self._get(caller_token, caller_user)
+        if predicate(snapshot):
+            return True
+        if snapshot.age_seconds > MISS_REFRESH_SECONDS:
+            snapshot = await self._get(caller_token, caller_user, force=True)
+            return predicate(snapshot)
+        return False
+
+    @staticmethod
+    def _scope(caller_token: Optional[str], caller_user: Optional[str]) -> Optional[str]:
+        """Snapshot key: the caller when a caller token is in use, None for the service"""
+        if not caller_token:
+            return None
+        return (caller_user or caller_token).upper()
+
+    async def _get(self, caller_token: Optional[str] = None, caller_user: Optional[str] = None, force: bool = False) -> CatalogSnapshot:
+        scope = self._scope(caller_token, caller_user)
+        snapshot = self._snapshots.get(scope)
+        if snapshot and not force and snapshot.age_seconds < settings.METADATA_CATALOG_TTL_SECONDS:
+            return snapshot
+        async with self._lock:
+            # Another request may have reloaded it while we waited
+            current = self._snapshots.get(scope)
+            if current and current is not snapshot and current.age_seconds < settings.METADATA_CATALOG_TTL_SECONDS:
+                return current
+            current = await self._load(caller_token)
+            self._snapshots.pop(scope, None)
+            self._snapshots[scope] = current
+            while len(self._snapshots) > MAX_CALLER_SNAPSHOTS:
+                del self._snapshots[next(iter(self._snapshots))]
+            return current
+
+    async def _load(self, caller_token: Optional[str] = None) -> CatalogSnapshot:
+        started = time.monotonic()
+        sf_service = SnowflakeService(caller_token=caller_token)
+        database = settings.DATABASE_NAME
+        snapshot = CatalogSnapshot()
+
+        schemas, tables, procedures = await asyncio.gather(
+            sf_service.execute_query_dict(f"SHOW SCHEMAS IN DATABASE {database}", timeout=60),
+            sf_service.execute_query_dict(f"SHOW TABLES IN DATABASE {database}", timeout=60),
+            sf_service.execute_query_dict(f"SHOW USER PROCEDURES IN DATABASE {database}", timeout=60)
+        )
+        snapshot.schemas = {row['name'].upper() for row in schemas}
+        for row in tables:
+            snapshot.tables[(row['schema_name'].upper(), row['name'].upper())] = {
+                "rows": row.get('rows'),
+                "bytes": row.get('bytes'),
+                "kind": row.get('kind'),
+                "created_on": row.get('created_on')
+            }
+        snapshot.procedures = {(row['schema_name'].upper(), row['name'].upper()) for row in procedures}
+
+        column_schemas = [schema.upper() for schema in self.column_schemas if schema.upper() in snapshot.schemas]
+        column_results = await asyncio.gather(*[
+            sf_service.execute_query_dict(f"SHOW COLUMNS IN SCHEMA {database}.{schema}", timeout=60)
+            for schema in column_schemas
+        ])
+        for schema, rows in zip(column_schemas, column_results):
+            if len(rows) >= SHOW_COLUMNS_LIMIT:
+                snapshot.partial_column_schemas.add(schema)
+                continue
+            for row in rows:
+                snapshot.columns.setdefault((schema, row['table_name'].upper()), []).append(row['column_name'].upper())
+
+        snapshot.loaded_at = time.monotonic()
+        logger.info(
+            f"Metadata catalog loaded{' for caller' if caller_token else ''} in {snapshot.loaded_at - started:.2f}s: "
+            f"{len(snapshot.schemas)} schemas, {len(snapshot.tables)} tables, {len(snapshot.procedures)} procedures"
+        )
+        return snapshot
+
+
+# Global metadata catalog instance
+metadata_catalog = MetadataCatalog()
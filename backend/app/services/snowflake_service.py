@@ -170,6 +170,23 @@ class SnowflakeService:
         """Execute multiple queries in the same session asynchronously and return the last result"""
         return await asyncio.to_thread(self._execute_queries_same_session_sync, queries, timeout)
     
+    @staticmethod
+    def _build_call_statement(procedure_name: str, *args) -> str:
+        """Build a CALL statement: strings get quotes, numbers/booleans don't"""
+        formatted_args = []
+        for arg in args:
+            if arg is None:
+                formatted_args.append('NULL')
+            elif isinstance(arg, str):
+                # Escape single quotes in strings
+                escaped = arg.replace("'", "''")
+                formatted_args.append(f"'{escaped}'")
+            elif isinstance(arg, bool):
+                formatted_args.append('TRUE' if arg else 'FALSE')
+            else:
+                formatted_args.append(str(arg))
+        return f"CALL {procedure_name}({', '.join(formatted_args)})"
+    
     def _execute_procedure_sync(self, procedure_name: str, *args) -> Any:
         """Execute a stored procedure synchronously (internal use)
         
@@ -195,23 +212,7 @@ class SnowflakeService:
                     logger.info(f"Setting schema context to: {settings.SILVER_SCHEMA_NAME}")
                     cursor.execute(f"USE SCHEMA {settings.SILVER_SCHEMA_NAME}")
                     
-                    # Build CALL statement with proper parameter formatting
-                    # Format parameters: strings get quotes, numbers/booleans don't
-                    formatted_args = []
-                    for arg in args:
-                        if arg is None:
-                            formatted_args.append('NULL')
-                        elif isinstance(arg, str):
-                            # Escape single quotes in strings
-                            escaped = arg.replace("'", "''")
-                            formatted_args.append(f"'{escaped}'")
-                        elif isinstance(arg, bool):
-                            formatted_args.append('TRUE' if arg else 'FALSE')
-                        else:
-                            formatted_args.append(str(arg))
-                    
-                    params_str = ', '.join(formatted_args)
-                    call_stmt = f"CALL {procedure_name}({params_str})"
+                    call_stmt = self._build_call_statement(procedure_name, *args)
                     
                     logger.info(f"Executing procedure: {call_stmt}")
                     sys.stdout.flush()
@@ -236,6 +237,69 @@ class SnowflakeService:
         """Execute a stored procedure asynchronously"""
         return await asyncio.to_thread(self._execute_procedure_sync, procedure_name, *args)
     
+    def _submit_procedure_sync(self, procedure_name: str, *args) -> str:
+        """Start a stored procedure without waiting for it (internal use)
+        
+        The CALL keeps running in Snowflake after the connection closes
+        (ABORT_DETACHED_QUERY = FALSE); returns its query ID.
+        """
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("ALTER SESSION SET ABORT_DETACHED_QUERY = FALSE")
+                    cursor.execute("ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = 14400")
+                    cursor.execute(f"USE DATABASE {settings.DATABASE_NAME}")
+                    cursor.execute(f"USE SCHEMA {settings.SILVER_SCHEMA_NAME}")
+                    
+                    call_stmt = self._build_call_statement(procedure_name, *args)
+                    logger.info(f"Submitting procedure: {call_stmt}")
+                    cursor.execute_async(call_stmt)
+                    return cursor.sfqid
+        except Exception as e:
+            logger.error(f"Procedure submission failed: {str(e)}")
+            raise
+    
+    async def submit_procedure(self, procedure_name: str, *args) -> str:
+        """Start a stored procedure asynchronously and return its Snowflake query ID"""
+        return await asyncio.to_thread(self._submit_procedure_sync, procedure_name, *args)
+    
+    def _get_query_status_sync(self, query_id: str) -> str:
+        """Status name of a Snowflake query, e.g. RUNNING, SUCCESS, FAILED_WITH_ERROR (internal use)"""
+        try:
+            with self.get_connection() as conn:
+                return conn.get_query_status(query_id).name
+        except Exception as e:
+            logger.error(f"Failed to get query status: {str(e)}")
+            raise
+    
+    async def get_query_status(self, query_id: str) -> str:
+        """Get the status of a Snowflake query asynchronously"""
+        return await asyncio.to_thread(self._get_query_status_sync, query_id)
+
+    def _get_query_result_sync(self, query_id: str) -> Any:
+        """Return value of a finished query; raises the query's error if it failed (internal use)"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.get_results_from_sfqid(query_id)
+                    result = cursor.fetchone()
+                    if result:
+                        return result[0] if len(result) == 1 else result
+                    return None
+        except Exception as e:
+            logger.error(f"Failed to get query result: {str(e)}")
+            raise
+
+    async def get_query_result(self, query_id: str) -> Any:
+        """Fetch the result of a finished Snowflake query asynchronously"""
+        return await asyncio.to_thread(self._get_query_result_sync, query_id)
+
+    async def cancel_query(self, query_id: str) -> Any:
+        """Cancel a running Snowflake query by ID"""
+        safe_query_id = query_id.replace("'", "''")
+        result = await self.execute_query(f"SELECT SYSTEM$CANCEL_QUERY('{safe_query_id}')", timeout=30)
+        return result[0][0] if result else None
+
     def _upload_file_to_stage_sync(self, local_path: str, stage_path: str) -> bool:
         """Upload file to Snowflake stage synchronously (internal use)"""
         try:
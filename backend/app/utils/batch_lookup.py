@@ -0,0 +1,81 @@
+"""
+Batched lookups for enriching query results with rows from a reference table
+
+Replaces the per-row "SELECT ... WHERE id = n" pattern with one IN (...)
+query over the distinct keys, optionally backed by the in-memory cache so
+repeated requests for the same reference rows cost no query at all.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+
+from app.utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Keys per IN (...) list; larger key sets are split into several queries
+MAX_KEYS_PER_QUERY = 1000
+
+
+def sql_literal(value: Any) -> str:
+    """SQL literal for a lookup key"""
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def fetch_rows_by_key(
+    sf_service,
+    table: str,
+    key_column: str,
+    keys: Iterable[Any],
+    columns: List[str],
+    cache_prefix: Optional[str] = None,
+    ttl_seconds: int = 300
+) -> Dict[Any, Dict[str, Any]]:
+    """Fetch the rows of `table` whose `key_column` is in `keys`, keyed by that column
+
+    Only keys not found in the cache are queried. Keys without a row are
+    cached too, so they are not looked up again until the entry expires.
+    """
+    key_column = key_column.upper()
+    distinct_keys = list(dict.fromkeys(k for k in keys if k is not None))
+    found: Dict[Any, Dict[str, Any]] = {}
+    missing = []
+
+    for key in distinct_keys:
+        cached_row = cache.get(f"{cache_prefix}:{key}") if cache_prefix else None
+        if cached_row is None:
+            missing.append(key)
+        elif cached_row:
+            found[key] = cached_row
+
+    select_columns = ", ".join([key_column] + [c for c in columns if c.upper() != key_column])
+    for start in range(0, len(missing), MAX_KEYS_PER_QUERY):
+        chunk = missing[start:start + MAX_KEYS_PER_QUERY]
+        rows = await sf_service.execute_query_dict(f"""
+            SELECT {select_columns}
+            FROM {table}
+            WHERE {key_column} IN ({', '.join(sql_literal(k) for k in chunk)})
+        """)
+        fetched = {row[key_column]: row for row in rows}
+        for key in chunk:
+            row = fetched.get(key, {})
+            if row:
+                found[key] = row
+            if cache_prefix:
+                cache.set(f"{cache_prefix}:{key}", row, ttl_seconds)
+
+    logger.debug(f"Batched lookup on {table}: {len(distinct_keys)} keys, {len(missing)} queried")
+    return found
+
+
+def enrich_rows(rows: List[Dict[str, Any]], key_field: str, lookup: Dict[Any, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge the looked-up row for each row's `key_field` into it (rows without a match are left as is)"""
+    for row in rows:
+        match = lookup.get(row.get(key_field))
+        if match:
+            row.update(match)
+    return rows
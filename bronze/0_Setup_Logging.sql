@@ -9,6 +9,8 @@
 --   3. FILE_PROCESSING_LOGS - Detailed file processing logs
 --   4. API_REQUEST_LOGS - API endpoint request/response logs
 --   5. ERROR_LOGS - Detailed error tracking
+--   6. API_JOBS - Background jobs submitted through the API
+--   7. API_IDEMPOTENCY_KEYS - Stored responses for Idempotency-Key retries
 --
 -- All tables use hybrid table format for fast transactional access
 -- ============================================
@@ -150,6 +152,53 @@ CREATE HYBRID TABLE IF NOT EXISTS ERROR_LOGS (
     INDEX idx_resolution (RESOLUTION_STATUS)
 ) COMMENT = 'Detailed error tracking and resolution management';
 
+-- ============================================
+-- TABLE 6: API_JOBS (Background Job Tracking)
+-- ============================================
+
+CREATE HYBRID TABLE IF NOT EXISTS API_JOBS (
+    JOB_ID VARCHAR(100) PRIMARY KEY,
+    JOB_TYPE VARCHAR(50) NOT NULL,  -- AUTO_MAP_ML, AUTO_MAP_LLM, TRANSFORM, QUALITY_CHECK_ALL, DISCOVER_FILES
+    STATUS VARCHAR(20) NOT NULL DEFAULT 'QUEUED',  -- QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+    PROCEDURE_NAME VARCHAR(200) NOT NULL,
+    PARAMETERS VARIANT,  -- JSON array of procedure arguments
+    QUERY_ID VARCHAR(100),  -- Snowflake query ID of the detached CALL
+    PROGRESS VARIANT,  -- JSON with query status, elapsed time and step counts
+    RESULT TEXT,  -- Procedure return value
+    ERROR_MESSAGE TEXT,
+    CANCEL_REQUESTED BOOLEAN DEFAULT FALSE,
+    TPA_CODE VARCHAR(50),
+    SUBMITTED_BY VARCHAR(100),
+    CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    STARTED_TIMESTAMP TIMESTAMP_NTZ,
+    COMPLETED_TIMESTAMP TIMESTAMP_NTZ,
+    UPDATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    INDEX idx_status (STATUS),
+    INDEX idx_created (CREATED_TIMESTAMP)
+) COMMENT = 'Long-running API operations executed by the background job workers';
+
+-- ============================================
+-- TABLE 7: API_IDEMPOTENCY_KEYS
+-- ============================================
+
+CREATE HYBRID TABLE IF NOT EXISTS API_IDEMPOTENCY_KEYS (
+    USER_NAME VARCHAR(100) NOT NULL,  -- Keys are scoped per caller ('' when unauthenticated)
+    IDEMPOTENCY_KEY VARCHAR(255) NOT NULL,
+    REQUEST_METHOD VARCHAR(10) NOT NULL,
+    REQUEST_PATH VARCHAR(500) NOT NULL,
+    REQUEST_FINGERPRINT VARCHAR(64) NOT NULL,  -- SHA-256 of method, path, query string and body
+    STATUS VARCHAR(20) NOT NULL DEFAULT 'IN_PROGRESS',  -- IN_PROGRESS, COMPLETED
+    RESPONSE_STATUS INTEGER,
+    RESPONSE_CONTENT_TYPE VARCHAR(100),
+    RESPONSE_BODY TEXT,
+    JOB_ID VARCHAR(100),  -- Background job started by the request, if any
+    CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    COMPLETED_TIMESTAMP TIMESTAMP_NTZ,
+    EXPIRES_TIMESTAMP TIMESTAMP_NTZ NOT NULL,
+    PRIMARY KEY (USER_NAME, IDEMPOTENCY_KEY),
+    INDEX idx_expires (EXPIRES_TIMESTAMP)
+) COMMENT = 'Responses of POST requests sent with an Idempotency-Key header, replayed to retries';
+
 -- ============================================
 -- LOGGING PROCEDURES
 -- ============================================
@@ -406,6 +455,8 @@ GRANT SELECT, INSERT, UPDATE ON TASK_EXECUTION_LOGS TO ROLE IDENTIFIER($SNOWFLAK
 GRANT SELECT, INSERT, UPDATE ON FILE_PROCESSING_LOGS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT SELECT, INSERT, UPDATE ON API_REQUEST_LOGS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT SELECT, INSERT, UPDATE ON ERROR_LOGS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+GRANT SELECT, INSERT, UPDATE, DELETE ON API_JOBS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+GRANT SELECT, INSERT, UPDATE, DELETE ON API_IDEMPOTENCY_KEYS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 
 -- Grant access to views
 GRANT SELECT ON V_RECENT_APPLICATION_LOGS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
@@ -5,7 +5,8 @@
 -- 
 -- This script creates:
 --   1. Stages (4): @SRC, @COMPLETED, @ERROR, @ARCHIVE
---   2. Tables (3): TPA_MASTER, RAW_DATA_TABLE, file_processing_queue
+--   2. Tables (5): TPA_MASTER, RAW_DATA_TABLE, SOURCE_FIELD_CATALOG, SCHEMA_FINGERPRINTS,
+--      file_processing_queue
 --
 -- TPA Architecture:
 --   - Files organized by TPA in @SRC stage (@SRC/provider_a/, @SRC/provider_b/)
@@ -111,6 +112,89 @@ CREATE TABLE IF NOT EXISTS RAW_DATA_TABLE (
 CLUSTER BY (TPA, FILE_NAME, LOAD_TIMESTAMP)
 COMMENT = 'Raw data storage table. Each row represents one record from a source file, stored as VARIANT (JSON). TPA is extracted from file path during ingestion. STANDARD TABLE with clustering for large-scale storage.';
 
+-- ============================================
+-- CREATE SOURCE FIELD CATALOG (HYBRID)
+-- ============================================
+-- Populated by the file loaders while they parse each file: one row per
+-- (TPA, file, header field) with the inferred type and counts. Cell values are
+-- not copied here: Bordereau rows carry member PII/PHI.
+-- Field discovery and auto-mapping read this small table instead of running
+-- LATERAL FLATTEN over every RAW_DATA VARIANT for the TPA.
+
+CREATE HYBRID TABLE IF NOT EXISTS SOURCE_FIELD_CATALOG (
+    TPA VARCHAR(500) NOT NULL,
+    FILE_NAME VARCHAR(500) NOT NULL,  -- Matches RAW_DATA_TABLE.FILE_NAME
+    FIELD_NAME VARCHAR(500) NOT NULL,
+    FIELD_POSITION NUMBER(38,0),  -- 1-based header position (NULL when backfilled)
+    INFERRED_TYPE VARCHAR(50),  -- NUMBER, FLOAT, BOOLEAN, VARCHAR
+    NON_NULL_COUNT NUMBER(38,0) DEFAULT 0,
+    ROW_COUNT NUMBER(38,0) DEFAULT 0,
+    FILE_TYPE VARCHAR(50),
+    CAPTURED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (TPA, FILE_NAME, FIELD_NAME),
+    INDEX idx_catalog_tpa_field (TPA, FIELD_NAME)
+)
+COMMENT = 'Source field catalog captured at ingestion time. One row per TPA, file and header field with inferred type and counts (no cell values). HYBRID TABLE for fast per-TPA field lookups.';
+
+-- Earlier deployments stored sample cell values; drop them
+ALTER TABLE SOURCE_FIELD_CATALOG DROP COLUMN IF EXISTS SAMPLE_VALUES;
+
+-- Backfill existing deployments once from data loaded before the catalog existed
+MERGE INTO SOURCE_FIELD_CATALOG t
+USING (
+    SELECT
+        r.TPA,
+        r.FILE_NAME,
+        f.key AS FIELD_NAME,
+        CASE MODE(IFF(IS_NULL_VALUE(f.value), NULL, TYPEOF(f.value)))
+            WHEN 'INTEGER' THEN 'NUMBER'
+            WHEN 'DECIMAL' THEN 'FLOAT'
+            WHEN 'DOUBLE' THEN 'FLOAT'
+            WHEN 'BOOLEAN' THEN 'BOOLEAN'
+            ELSE 'VARCHAR'
+        END AS INFERRED_TYPE,
+        COUNT_IF(NOT IS_NULL_VALUE(f.value)) AS NON_NULL_COUNT,
+        COUNT(DISTINCT r.FILE_ROW_NUMBER) AS ROW_COUNT,
+        MAX(r.FILE_TYPE) AS FILE_TYPE
+    FROM RAW_DATA_TABLE r,
+    LATERAL FLATTEN(input => r.RAW_DATA) f
+    WHERE NOT EXISTS (
+        SELECT 1 FROM SOURCE_FIELD_CATALOG c
+        WHERE c.TPA = r.TPA AND c.FILE_NAME = r.FILE_NAME
+    )
+    GROUP BY r.TPA, r.FILE_NAME, f.key
+) s
+ON t.TPA = s.TPA AND t.FILE_NAME = s.FILE_NAME AND t.FIELD_NAME = s.FIELD_NAME
+WHEN NOT MATCHED THEN INSERT (
+    TPA, FILE_NAME, FIELD_NAME, INFERRED_TYPE, NON_NULL_COUNT, ROW_COUNT, FILE_TYPE
+) VALUES (
+    s.TPA, s.FILE_NAME, s.FIELD_NAME, s.INFERRED_TYPE, s.NON_NULL_COUNT, s.ROW_COUNT, s.FILE_TYPE
+);
+
+-- ============================================
+-- CREATE SCHEMA FINGERPRINTS (HYBRID)
+-- ============================================
+-- One row per distinct file layout per TPA. The fingerprint is a SHA-256 of
+-- the ordered header names, computed by the loaders from the same parse that
+-- fills SOURCE_FIELD_CATALOG. Inferred types vary with each file's values, so
+-- they are kept as metadata (as last seen) and not hashed. Silver links each
+-- fingerprint to the mapping set (transformation plan) validated against it.
+
+CREATE HYBRID TABLE IF NOT EXISTS SCHEMA_FINGERPRINTS (
+    TPA VARCHAR(500) NOT NULL,
+    FINGERPRINT VARCHAR(64) NOT NULL,
+    FIELD_NAMES ARRAY,  -- Ordered header names
+    FIELD_TYPES ARRAY,  -- Inferred type per header as last seen, same order (not hashed)
+    FIELD_COUNT NUMBER(38,0),
+    FILE_COUNT NUMBER(38,0) DEFAULT 1,
+    FIRST_SEEN_FILE VARCHAR(500),
+    FIRST_SEEN_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    LAST_SEEN_FILE VARCHAR(500),
+    LAST_SEEN_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (TPA, FINGERPRINT)
+)
+COMMENT = 'Distinct file layouts per TPA (hash of ordered header names; inferred types kept as metadata). Files with a known fingerprint reuse validated mappings; new layouts are flagged at ingestion. HYBRID TABLE for point lookups by TPA and fingerprint.';
+
 -- ============================================
 -- CREATE FILE PROCESSING QUEUE (HYBRID)
 -- ============================================
@@ -120,6 +204,7 @@ COMMENT = 'Raw data storage table. Each row represents one record from a source
 CREATE HYBRID TABLE IF NOT EXISTS file_processing_queue (
     queue_id NUMBER(38,0) AUTOINCREMENT PRIMARY KEY,
     file_name VARCHAR(500) NOT NULL UNIQUE,
+    base_file_name VARCHAR(500),  -- File name without TPA folder (matches RAW_DATA_TABLE.FILE_NAME)
     tpa VARCHAR(500) NOT NULL,  -- TPA from file path
     file_type VARCHAR(50),
     file_size_bytes NUMBER(38,0),
@@ -129,13 +214,29 @@ CREATE HYBRID TABLE IF NOT EXISTS file_processing_queue (
     error_message VARCHAR(5000),
     process_result VARCHAR(5000),
     retry_count NUMBER(38,0) DEFAULT 0,
+    schema_fingerprint VARCHAR(64),  -- Layout hash of the loaded file (SCHEMA_FINGERPRINTS)
     INDEX idx_queue_status (status),
     INDEX idx_queue_tpa (tpa),
     INDEX idx_queue_status_tpa (status, tpa),
-    INDEX idx_queue_discovered (discovered_timestamp)
+    INDEX idx_queue_discovered (discovered_timestamp),
+    INDEX idx_queue_base_file_tpa (base_file_name, tpa)
 )
 COMMENT = 'File processing queue. Tracks status of each file from discovery to completion. Status values: PENDING, PROCESSING, SUCCESS, FAILED. HYBRID TABLE for fast status queries and updates.';
 
+-- Upgrade existing deployments: add normalized base file name and its index
+-- so per-file lookups (delete, logging) are exact-key index probes instead of
+-- LIKE / SPLIT_PART scans.
+ALTER TABLE file_processing_queue ADD COLUMN IF NOT EXISTS base_file_name VARCHAR(500);
+
+UPDATE file_processing_queue
+SET base_file_name = SPLIT_PART(file_name, '/', -1)
+WHERE base_file_name IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_queue_base_file_tpa ON file_processing_queue (base_file_name, tpa);
+
+-- Layout fingerprint of each loaded file (see SCHEMA_FINGERPRINTS)
+ALTER TABLE file_processing_queue ADD COLUMN IF NOT EXISTS schema_fingerprint VARCHAR(64);
+
 -- ============================================
 -- CREATE VIEWS FOR MONITORING
 -- ============================================
@@ -206,6 +307,23 @@ ORDER BY TPA, FILE_TYPE;
 
 COMMENT ON VIEW v_raw_data_statistics IS 'Statistics on raw data by TPA and file type. Shows record counts, file counts, and load timestamps.';
 
+-- View: Source Fields by TPA
+CREATE OR REPLACE VIEW v_source_fields AS
+SELECT 
+    TPA,
+    FIELD_NAME,
+    MODE(INFERRED_TYPE) as inferred_type,
+    MIN(FIELD_POSITION) as field_position,
+    COUNT(DISTINCT FILE_NAME) as file_count,
+    SUM(NON_NULL_COUNT) as non_null_count,
+    SUM(ROW_COUNT) as row_count,
+    MAX(CAPTURED_TIMESTAMP) as last_seen
+FROM SOURCE_FIELD_CATALOG
+GROUP BY TPA, FIELD_NAME
+ORDER BY TPA, FIELD_NAME;
+
+COMMENT ON VIEW v_source_fields IS 'Distinct source fields per TPA from the ingestion-time field catalog. Shows dominant inferred type, header position, and how many files and rows carry each field.';
+
 -- ============================================
 -- GRANT PERMISSIONS
 -- ============================================
@@ -220,12 +338,15 @@ GRANT ALL ON STAGE ARCHIVE TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT ALL ON TABLE TPA_MASTER TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT ALL ON TABLE RAW_DATA_TABLE TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT ALL ON TABLE file_processing_queue TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+GRANT ALL ON TABLE SOURCE_FIELD_CATALOG TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+GRANT ALL ON TABLE SCHEMA_FINGERPRINTS TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 
 -- Grant permissions on views
 GRANT SELECT ON VIEW v_processing_status_summary TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT SELECT ON VIEW v_recent_processing_activity TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT SELECT ON VIEW v_failed_files TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 GRANT SELECT ON VIEW v_raw_data_statistics TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+GRANT SELECT ON VIEW v_source_fields TO ROLE IDENTIFIER($SNOWFLAKE_ROLE);
 
 -- ============================================
 -- VERIFICATION
@@ -43,6 +43,8 @@ $$
 import pandas as pd
 import io
 import gzip
+import hashlib
+import uuid
 from snowflake.snowpark.types import StructType, StructField, StringType, IntegerType, VariantType
 import json
 
@@ -50,7 +52,7 @@ def log_stage(session, queue_id, file_name, tpa, stage, status, rows_processed,
     """Helper function to log file processing stages"""
     try:
         details_str = details_json if details_json else 'null'
-        error_str = f"'{error_msg}'" if error_msg else 'null'
+        error_str = "'" + str(error_msg).replace("'", "''") + "'" if error_msg else 'null'
         queue_id_str = str(queue_id) if queue_id else 'null'
         
         log_query = f"""
@@ -67,6 +69,141 @@ def log_stage(session, queue_id, file_name, tpa, stage, status, rows_processed,
         # Don't fail the main process if logging fails
         pass
 
+def infer_field_type(series):
+    """Map a parsed pandas column onto the catalog's coarse type vocabulary"""
+    values = series.dropna()
+    if values.empty:
+        return 'VARCHAR'
+    if pd.api.types.is_bool_dtype(values):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(values):
+        return 'NUMBER'
+    if pd.api.types.is_float_dtype(values):
+        return 'NUMBER' if (values % 1 == 0).all() else 'FLOAT'
+    return 'VARCHAR'
+
+def build_field_catalog(df):
+    """Describe each header field of a parsed file: position, type and counts (no cell values)"""
+    catalog = []
+    for position, column in enumerate(df.columns, start=1):
+        series = df[column]
+        catalog.append({
+            'FIELD_NAME': str(column),
+            'FIELD_POSITION': position,
+            'INFERRED_TYPE': infer_field_type(series),
+            'NON_NULL_COUNT': int(series.notna().sum()),
+            'ROW_COUNT': len(series)
+        })
+    return catalog
+
+def record_field_catalog(session, file_name, tpa, file_type, catalog):
+    """Upsert the file's header fields into SOURCE_FIELD_CATALOG with one MERGE"""
+    if not catalog:
+        return 0
+    rows = [dict(entry, TPA=tpa, FILE_NAME=file_name, FILE_TYPE=file_type) for entry in catalog]
+    view_name = f"TEMP_FIELD_CATALOG_{uuid.uuid4().hex.upper()}"
+    session.create_dataframe(rows).create_or_replace_temp_view(view_name)
+    session.sql(f"""
+        MERGE INTO SOURCE_FIELD_CATALOG t
+        USING (
+            SELECT TPA, FILE_NAME, FIELD_NAME, FIELD_POSITION, INFERRED_TYPE,
+                   NON_NULL_COUNT, ROW_COUNT, FILE_TYPE
+            FROM {view_name}
+        ) s
+        ON t.TPA = s.TPA AND t.FILE_NAME = s.FILE_NAME AND t.FIELD_NAME = s.FIELD_NAME
+        WHEN MATCHED THEN UPDATE SET
+            FIELD_POSITION = s.FIELD_POSITION,
+            INFERRED_TYPE = s.INFERRED_TYPE,
+            NON_NULL_COUNT = s.NON_NULL_COUNT,
+            ROW_COUNT = s.ROW_COUNT,
+            FILE_TYPE = s.FILE_TYPE,
+            CAPTURED_TIMESTAMP = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            TPA, FILE_NAME, FIELD_NAME, FIELD_POSITION, INFERRED_TYPE,
+            NON_NULL_COUNT, ROW_COUNT, FILE_TYPE
+        ) VALUES (
+            s.TPA, s.FILE_NAME, s.FIELD_NAME, s.FIELD_POSITION, s.INFERRED_TYPE,
+            s.NON_NULL_COUNT, s.ROW_COUNT, s.FILE_TYPE
+        )
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view_name}").collect()
+    return len(rows)
+
+def schema_fingerprint(catalog):
+    """SHA-256 of the ordered header names of a parsed file
+    
+    Inferred types are not part of the layout: they depend on the values in
+    each file (an all-empty column, a batch without decimals), so they are
+    kept in SCHEMA_FINGERPRINTS.FIELD_TYPES as metadata only.
+    """
+    field_names = [entry['FIELD_NAME'] for entry in catalog]
+    return hashlib.sha256(json.dumps(field_names).encode('utf-8')).hexdigest()
+
+def record_schema_fingerprint(session, file_name, tpa, catalog):
+    """Register the file's layout; returns (fingerprint, 'KNOWN' | 'NEW' | 'CHANGED')
+    
+    NEW is the TPA's first layout; CHANGED means the TPA already sent files
+    with a different layout, so its mappings need review.
+    """
+    fingerprint = schema_fingerprint(catalog)
+    field_names = [entry['FIELD_NAME'] for entry in catalog]
+    known_rows = session.sql(
+        "SELECT FINGERPRINT, FIELD_NAMES FROM SCHEMA_FINGERPRINTS WHERE TPA = ?", params=[tpa]
+    ).collect()
+    # Rows fingerprinted before types were dropped from the hash still
+    # identify the layout by their header names
+    known = {row['FINGERPRINT'] for row in known_rows}
+    if any(json.loads(row['FIELD_NAMES'] or '[]') == field_names for row in known_rows):
+        known.add(fingerprint)
+    
+    session.sql("""
+        MERGE INTO SCHEMA_FINGERPRINTS t
+        USING (
+            SELECT ? AS TPA, ? AS FINGERPRINT, PARSE_JSON(?)::ARRAY AS FIELD_NAMES,
+                   PARSE_JSON(?)::ARRAY AS FIELD_TYPES, ? AS FIELD_COUNT, ? AS FILE_NAME
+        ) s
+        ON t.TPA = s.TPA AND t.FINGERPRINT = s.FINGERPRINT
+        WHEN MATCHED THEN UPDATE SET
+            FIELD_TYPES = s.FIELD_TYPES,
+            FILE_COUNT = t.FILE_COUNT + 1,
+            LAST_SEEN_FILE = s.FILE_NAME,
+            LAST_SEEN_TIMESTAMP = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            TPA, FINGERPRINT, FIELD_NAMES, FIELD_TYPES, FIELD_COUNT, FIRST_SEEN_FILE, LAST_SEEN_FILE
+        ) VALUES (
+            s.TPA, s.FINGERPRINT, s.FIELD_NAMES, s.FIELD_TYPES, s.FIELD_COUNT, s.FILE_NAME, s.FILE_NAME
+        )
+    """, params=[
+        tpa, fingerprint,
+        json.dumps(field_names),
+        json.dumps([entry['INFERRED_TYPE'] for entry in catalog]),
+        len(catalog), file_name
+    ]).collect()
+    
+    session.sql(
+        "UPDATE file_processing_queue SET schema_fingerprint = ? WHERE base_file_name = ? AND tpa = ?",
+        params=[fingerprint, file_name, tpa]
+    ).collect()
+    
+    if fingerprint in known:
+        return fingerprint, 'KNOWN'
+    return fingerprint, 'CHANGED' if known else 'NEW'
+
+def flag_layout_change(session, file_name, tpa, fingerprint, source):
+    """Raise a WARNING application event when a TPA sends a previously unseen layout"""
+    try:
+        session.sql(
+            "CALL log_application_event('WARNING', ?, ?, PARSE_JSON(?), CURRENT_USER(), ?)",
+            params=[
+                source,
+                f'New file layout for TPA {tpa} in {file_name}; review field mappings',
+                json.dumps({'file_name': file_name, 'fingerprint': fingerprint}),
+                tpa
+            ]
+        ).collect()
+    except Exception:
+        pass
+
 def process_csv_file(session, file_path, tpa):
     """Process a single CSV file and load into RAW_DATA_TABLE using bulk operations"""
     
@@ -74,10 +211,10 @@ def process_csv_file(session, file_path, tpa):
     file_name = file_path.split('/')[-1]
     queue_id = None
     
-    # Get queue_id for logging
+    # Get queue_id for logging (exact-key lookup on idx_queue_base_file_tpa)
     try:
-        queue_query = f"SELECT QUEUE_ID FROM file_processing_queue WHERE file_name LIKE '%{file_name}%' ORDER BY QUEUE_ID DESC LIMIT 1"
-        queue_result = session.sql(queue_query).collect()
+        queue_query = "SELECT QUEUE_ID FROM file_processing_queue WHERE base_file_name = ? AND tpa = ? ORDER BY QUEUE_ID DESC LIMIT 1"
+        queue_result = session.sql(queue_query, params=[file_name, tpa]).collect()
         if queue_result:
             queue_id = queue_result[0]['QUEUE_ID']
     except:
@@ -199,6 +336,18 @@ def process_csv_file(session, file_path, tpa):
         
         log_stage(session, queue_id, file_name, tpa, 'LOADING', 'SUCCESS', rows_inserted, 0, None, f'{{"rows_inserted": {rows_inserted}}}')
         
+        # Record the header fields so discovery never has to FLATTEN RAW_DATA,
+        # and the layout fingerprint so known layouts reuse validated mappings
+        try:
+            catalog = build_field_catalog(df)
+            fields_recorded = record_field_catalog(session, file_name, tpa, 'CSV', catalog)
+            fingerprint, layout = record_schema_fingerprint(session, file_name, tpa, catalog)
+            log_stage(session, queue_id, file_name, tpa, 'CATALOG', 'SUCCESS', fields_recorded, 0, None, f'{{"fields_recorded": {fields_recorded}, "fingerprint": "{fingerprint}", "layout": "{layout}"}}')
+            if layout == 'CHANGED':
+                flag_layout_change(session, file_name, tpa, fingerprint, 'process_single_csv_file')
+        except Exception as e:
+            log_stage(session, queue_id, file_name, tpa, 'CATALOG', 'FAILED', 0, 0, str(e)[:500], None)
+        
         return f"SUCCESS: Processed {rows_inserted} rows from {file_name}"
         
     except Exception as e:
@@ -221,6 +370,165 @@ AS
 $$
 import pandas as pd
 import io
+import hashlib
+import json
+import uuid
+
+def log_stage(session, queue_id, file_name, tpa, stage, status, rows_processed, rows_failed, error_msg, details_json):
+    """Helper function to log file processing stages"""
+    try:
+        details_str = details_json if details_json else 'null'
+        error_str = "'" + str(error_msg).replace("'", "''") + "'" if error_msg else 'null'
+        queue_id_str = str(queue_id) if queue_id else 'null'
+        
+        log_query = f"""
+            INSERT INTO FILE_PROCESSING_LOGS (
+                QUEUE_ID, FILE_NAME, TPA_CODE, PROCESSING_STAGE, STAGE_STATUS,
+                STAGE_END, ROWS_PROCESSED, ROWS_FAILED, ERROR_MESSAGE, STAGE_DETAILS
+            ) VALUES (
+                {queue_id_str}, '{file_name}', '{tpa}', '{stage}', '{status}',
+                CURRENT_TIMESTAMP(), {rows_processed}, {rows_failed}, {error_str}, PARSE_JSON('{details_str}')
+            )
+        """
+        session.sql(log_query).collect()
+    except Exception:
+        # Don't fail the main process if logging fails
+        pass
+
+def infer_field_type(series):
+    """Map a parsed pandas column onto the catalog's coarse type vocabulary"""
+    values = series.dropna()
+    if values.empty:
+        return 'VARCHAR'
+    if pd.api.types.is_bool_dtype(values):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(values):
+        return 'NUMBER'
+    if pd.api.types.is_float_dtype(values):
+        return 'NUMBER' if (values % 1 == 0).all() else 'FLOAT'
+    return 'VARCHAR'
+
+def build_field_catalog(df):
+    """Describe each header field of a parsed file: position, type and counts (no cell values)"""
+    catalog = []
+    for position, column in enumerate(df.columns, start=1):
+        series = df[column]
+        catalog.append({
+            'FIELD_NAME': str(column),
+            'FIELD_POSITION': position,
+            'INFERRED_TYPE': infer_field_type(series),
+            'NON_NULL_COUNT': int(series.notna().sum()),
+            'ROW_COUNT': len(series)
+        })
+    return catalog
+
+def record_field_catalog(session, file_name, tpa, file_type, catalog):
+    """Upsert the file's header fields into SOURCE_FIELD_CATALOG with one MERGE"""
+    if not catalog:
+        return 0
+    rows = [dict(entry, TPA=tpa, FILE_NAME=file_name, FILE_TYPE=file_type) for entry in catalog]
+    view_name = f"TEMP_FIELD_CATALOG_{uuid.uuid4().hex.upper()}"
+    session.create_dataframe(rows).create_or_replace_temp_view(view_name)
+    session.sql(f"""
+        MERGE INTO SOURCE_FIELD_CATALOG t
+        USING (
+            SELECT TPA, FILE_NAME, FIELD_NAME, FIELD_POSITION, INFERRED_TYPE,
+                   NON_NULL_COUNT, ROW_COUNT, FILE_TYPE
+            FROM {view_name}
+        ) s
+        ON t.TPA = s.TPA AND t.FILE_NAME = s.FILE_NAME AND t.FIELD_NAME = s.FIELD_NAME
+        WHEN MATCHED THEN UPDATE SET
+            FIELD_POSITION = s.FIELD_POSITION,
+            INFERRED_TYPE = s.INFERRED_TYPE,
+            NON_NULL_COUNT = s.NON_NULL_COUNT,
+            ROW_COUNT = s.ROW_COUNT,
+            FILE_TYPE = s.FILE_TYPE,
+            CAPTURED_TIMESTAMP = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            TPA, FILE_NAME, FIELD_NAME, FIELD_POSITION, INFERRED_TYPE,
+            NON_NULL_COUNT, ROW_COUNT, FILE_TYPE
+        ) VALUES (
+            s.TPA, s.FILE_NAME, s.FIELD_NAME, s.FIELD_POSITION, s.INFERRED_TYPE,
+            s.NON_NULL_COUNT, s.ROW_COUNT, s.FILE_TYPE
+        )
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view_name}").collect()
+    return len(rows)
+
+def schema_fingerprint(catalog):
+    """SHA-256 of the ordered header names of a parsed file
+    
+    Inferred types are not part of the layout: they depend on the values in
+    each file (an all-empty column, a batch without decimals), so they are
+    kept in SCHEMA_FINGERPRINTS.FIELD_TYPES as metadata only.
+    """
+    field_names = [entry['FIELD_NAME'] for entry in catalog]
+    return hashlib.sha256(json.dumps(field_names).encode('utf-8')).hexdigest()
+
+def record_schema_fingerprint(session, file_name, tpa, catalog):
+    """Register the file's layout; returns (fingerprint, 'KNOWN' | 'NEW' | 'CHANGED')
+    
+    NEW is the TPA's first layout; CHANGED means the TPA already sent files
+    with a different layout, so its mappings need review.
+    """
+    fingerprint = schema_fingerprint(catalog)
+    field_names = [entry['FIELD_NAME'] for entry in catalog]
+    known_rows = session.sql(
+        "SELECT FINGERPRINT, FIELD_NAMES FROM SCHEMA_FINGERPRINTS WHERE TPA = ?", params=[tpa]
+    ).collect()
+    # Rows fingerprinted before types were dropped from the hash still
+    # identify the layout by their header names
+    known = {row['FINGERPRINT'] for row in known_rows}
+    if any(json.loads(row['FIELD_NAMES'] or '[]') == field_names for row in known_rows):
+        known.add(fingerprint)
+    
+    session.sql("""
+        MERGE INTO SCHEMA_FINGERPRINTS t
+        USING (
+            SELECT ? AS TPA, ? AS FINGERPRINT, PARSE_JSON(?)::ARRAY AS FIELD_NAMES,
+                   PARSE_JSON(?)::ARRAY AS FIELD_TYPES, ? AS FIELD_COUNT, ? AS FILE_NAME
+        ) s
+        ON t.TPA = s.TPA AND t.FINGERPRINT = s.FINGERPRINT
+        WHEN MATCHED THEN UPDATE SET
+            FIELD_TYPES = s.FIELD_TYPES,
+            FILE_COUNT = t.FILE_COUNT + 1,
+            LAST_SEEN_FILE = s.FILE_NAME,
+            LAST_SEEN_TIMESTAMP = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            TPA, FINGERPRINT, FIELD_NAMES, FIELD_TYPES, FIELD_COUNT, FIRST_SEEN_FILE, LAST_SEEN_FILE
+        ) VALUES (
+            s.TPA, s.FINGERPRINT, s.FIELD_NAMES, s.FIELD_TYPES, s.FIELD_COUNT, s.FILE_NAME, s.FILE_NAME
+        )
+    """, params=[
+        tpa, fingerprint,
+        json.dumps(field_names),
+        json.dumps([entry['INFERRED_TYPE'] for entry in catalog]),
+        len(catalog), file_name
+    ]).collect()
+    
+    session.sql(
+        "UPDATE file_processing_queue SET schema_fingerprint = ? WHERE base_file_name = ? AND tpa = ?",
+        params=[fingerprint, file_name, tpa]
+    ).collect()
+    
+    if fingerprint in known:
+        return fingerprint, 'KNOWN'
+    return fingerprint, 'CHANGED' if known else 'NEW'
+
+def flag_layout_change(session, file_name, tpa, fingerprint, source):
+    """Raise a WARNING application event when a TPA sends a previously unseen layout"""
+    try:
+        session.sql(
+            "CALL log_application_event('WARNING', ?, ?, PARSE_JSON(?), CURRENT_USER(), ?)",
+            params=[
+                source,
+                f'New file layout for TPA {tpa} in {file_name}; review field mappings',
+                json.dumps({'file_name': file_name, 'fingerprint': fingerprint}),
+                tpa
+            ]
+        ).collect()
+    except Exception:
+        pass
 
 def process_excel_file(session, file_path, tpa):
     """Process a single Excel file and load into RAW_DATA_TABLE"""
@@ -238,11 +546,13 @@ def process_excel_file(session, file_path, tpa):
         total_rows_inserted = 0
         total_rows_failed = 0
         total_rows_in_file = 0
+        sheets = []
         
         # Process all sheets
         for sheet_name in excel_file.sheet_names:
             df = pd.read_excel(excel_file, sheet_name=sheet_name)
             total_rows_in_file += len(df)
+            sheets.append(df)
             
             # Prepare data for insertion
             for idx, row in df.iterrows():
@@ -276,11 +586,34 @@ def process_excel_file(session, file_path, tpa):
                 try:
                     session.sql(merge_query).collect()
                     total_rows_inserted += 1
-                except Exception as e:
+                except Exception:
                     # Log error but continue processing
                     total_rows_failed += 1
                     pass
         
+        # Record the header fields (union across sheets) in the source field
+        # catalog, and the layout fingerprint
+        if total_rows_inserted > 0 and sheets:
+            queue_id = None
+            try:
+                queue_result = session.sql(
+                    "SELECT QUEUE_ID FROM file_processing_queue WHERE base_file_name = ? AND tpa = ? ORDER BY QUEUE_ID DESC LIMIT 1",
+                    params=[file_name, tpa]
+                ).collect()
+                if queue_result:
+                    queue_id = queue_result[0]['QUEUE_ID']
+            except Exception:
+                pass
+            try:
+                catalog = build_field_catalog(pd.concat(sheets, ignore_index=True))
+                fields_recorded = record_field_catalog(session, file_name, tpa, 'EXCEL', catalog)
+                fingerprint, layout = record_schema_fingerprint(session, file_name, tpa, catalog)
+                log_stage(session, queue_id, file_name, tpa, 'CATALOG', 'SUCCESS', fields_recorded, 0, None, f'{{"fields_recorded": {fields_recorded}, "fingerprint": "{fingerprint}", "layout": "{layout}"}}')
+                if layout == 'CHANGED':
+                    flag_layout_change(session, file_name, tpa, fingerprint, 'process_single_excel_file')
+            except Exception as e:
+                log_stage(session, queue_id, file_name, tpa, 'CATALOG', 'FAILED', 0, 0, str(e)[:500], None)
+        
         # Return success if at least some rows were inserted
         if total_rows_inserted > 0:
             if total_rows_failed > 0:
@@ -316,6 +649,7 @@ def discover_files(session):
     query = """
         SELECT 
             RELATIVE_PATH AS file_name,
+            SPLIT_PART(RELATIVE_PATH, '/', -1) AS base_file_name,
             SPLIT_PART(RELATIVE_PATH, '/', 1) AS tpa,
             CASE 
                 WHEN UPPER(RELATIVE_PATH) LIKE '%.CSV%' THEN 'CSV'
@@ -339,6 +673,7 @@ def discover_files(session):
     
     for file_row in new_files:
         file_name = file_row['FILE_NAME']
+        base_file_name = file_row['BASE_FILE_NAME']
         tpa = file_row['TPA']
         file_type = file_row['FILE_TYPE']
         file_size = file_row['FILE_SIZE_BYTES']
@@ -346,8 +681,8 @@ def discover_files(session):
         try:
             # Insert into queue - files stay in @SRC until processed
             insert_query = f"""
-                INSERT INTO file_processing_queue (file_name, tpa, file_type, file_size_bytes, status)
-                VALUES ('{file_name}', '{tpa}', '{file_type}', {file_size}, 'PENDING')
+                INSERT INTO file_processing_queue (file_name, base_file_name, tpa, file_type, file_size_bytes, status)
+                VALUES ('{file_name}', '{base_file_name}', '{tpa}', '{file_type}', {file_size}, 'PENDING')
             """
             session.sql(insert_query).collect()
             files_discovered += 1
@@ -679,66 +1014,81 @@ HANDLER = 'delete_file_data'
 AS
 $$
 def delete_file_data(session, p_file_name, p_tpa):
-    """Delete all data for a specific file and TPA from RAW_DATA_TABLE"""
+    """Delete all data for a specific file and TPA from RAW_DATA_TABLE
+    
+    Every lookup uses exact keys: the queue is probed through the
+    (base_file_name, tpa) hybrid index, and RAW_DATA_TABLE is filtered on its
+    clustering key prefix (TPA, FILE_NAME) so only this file's micro-partitions
+    are scanned and rewritten.
+    """
     
     # Get the file name without path if full path provided
     file_name = p_file_name.split('/')[-1]
     
-    # Delete from RAW_DATA_TABLE for specific TPA
-    delete_query = f"DELETE FROM RAW_DATA_TABLE WHERE FILE_NAME = '{file_name}' AND TPA = '{p_tpa}'"
-    delete_result = session.sql(delete_query).collect()
+    # Resolve queue entries for this file via idx_queue_base_file_tpa
+    queue_result = session.sql("""
+        SELECT QUEUE_ID
+        FROM file_processing_queue
+        WHERE base_file_name = ?
+          AND tpa = ?
+        ORDER BY QUEUE_ID DESC
+    """, params=[file_name, p_tpa]).collect()
+    queue_ids = [row['QUEUE_ID'] for row in queue_result]
+    
+    # Delete from RAW_DATA_TABLE on the clustering key (TPA, FILE_NAME)
+    delete_result = session.sql(
+        "DELETE FROM RAW_DATA_TABLE WHERE TPA = ? AND FILE_NAME = ?",
+        params=[p_tpa, file_name]
+    ).collect()
     rows_deleted = delete_result[0]['number of rows deleted'] if delete_result else 0
     
-    # Update queue status for this specific TPA
-    update_query = f"""
+    # Drop the file's entries from the source field catalog (primary key prefix)
+    session.sql(
+        "DELETE FROM SOURCE_FIELD_CATALOG WHERE TPA = ? AND FILE_NAME = ?",
+        params=[p_tpa, file_name]
+    ).collect()
+    
+    if not queue_ids:
+        return f"Deleted {rows_deleted} row(s) for file: {file_name}"
+    
+    # Update queue status by primary key
+    queue_id_list = ', '.join(str(qid) for qid in queue_ids)
+    session.sql(f"""
         UPDATE file_processing_queue
         SET status = 'DELETED',
             processed_timestamp = CURRENT_TIMESTAMP(),
             process_result = 'Data deleted for TPA {p_tpa}: {rows_deleted} rows removed'
-        WHERE (file_name LIKE '%{file_name}%' OR SPLIT_PART(file_name, '/', -1) = '{file_name}')
-          AND tpa = '{p_tpa}'
-    """
-    session.sql(update_query).collect()
-    
-    # Get queue_id and tpa for logging
-    queue_query = f"""
-        SELECT QUEUE_ID, TPA 
-        FROM file_processing_queue 
-        WHERE SPLIT_PART(file_name, '/', -1) = '{file_name}'
-        LIMIT 1
+        WHERE queue_id IN ({queue_id_list})
+    """).collect()
+    
+    queue_id = queue_ids[0]
+    
+    # Log the deletion
+    log_query = f"""
+        CALL log_file_processing_stage(
+            {queue_id}, '{file_name}', '{p_tpa}', 'DELETION', 'SUCCESS',
+            {rows_deleted}, 0, NULL, 
+            PARSE_JSON('{{"action": "data_deleted", "rows_deleted": {rows_deleted}}}')
+        )
     """
-    queue_result = session.sql(queue_query).collect()
+    try:
+        session.sql(log_query).collect()
+    except:
+        pass
     
-    if queue_result:
-        queue_id = queue_result[0]['QUEUE_ID']
-        tpa = queue_result[0]['TPA']
-        
-        # Log the deletion
-        log_query = f"""
-            CALL log_file_processing_stage(
-                {queue_id}, '{file_name}', '{tpa}', 'DELETION', 'SUCCESS',
-                {rows_deleted}, 0, NULL, 
-                PARSE_JSON('{{"action": "data_deleted", "rows_deleted": {rows_deleted}}}')
-            )
-        """
-        try:
-            session.sql(log_query).collect()
-        except:
-            pass
-        
-        # Log to application logs
-        app_log_query = f"""
-            CALL log_application_event(
-                'INFO', 'delete_file_data',
-                'Deleted data for file: {file_name}',
-                PARSE_JSON('{{"file_name": "{file_name}", "rows_deleted": {rows_deleted}}}'),
-                CURRENT_USER(), '{tpa}'
-            )
-        """
-        try:
-            session.sql(app_log_query).collect()
-        except:
-            pass
+    # Log to application logs
+    app_log_query = f"""
+        CALL log_application_event(
+            'INFO', 'delete_file_data',
+            'Deleted data for file: {file_name}',
+            PARSE_JSON('{{"file_name": "{file_name}", "rows_deleted": {rows_deleted}}}'),
+            CURRENT_USER(), '{p_tpa}'
+        )
+    """
+    try:
+        session.sql(app_log_query).collect()
+    except:
+        pass
     
     return f"Deleted {rows_deleted} row(s) for file: {file_name}"
 $$;
@@ -108,4 +108,11 @@ else
     echo -e "${CYAN}  snow sql -f deployment/resume_silver_tasks.sql --enable-templating LEGACY --connection ${CONNECTION_NAME}${NC}"
 fi
 
+# Optionally enable CDC mode (stream-triggered transformations)
+if [[ "${DEPLOY_SILVER_CDC_ENABLED:-${SILVER_CDC_ENABLED:-false}}" == "true" ]]; then
+    echo -e "${CYAN}Enabling Silver CDC transform task...${NC}"
+    execute_sql "${PROJECT_ROOT}/deployment/resume_silver_cdc_task.sql"
+    echo -e "${GREEN}✓ Silver CDC transform task resumed${NC}"
+fi
+
 echo -e "${GREEN}✓ Silver layer deployed successfully${NC}"
@@ -0,0 +1,41 @@
+-- ============================================
+-- RESUME SILVER CDC TRANSFORM TASK
+-- ============================================
+-- Purpose: Enable optional CDC mode for Silver transformations
+-- 
+-- cdc_transform_task is triggered by raw_data_cdc_stream and transforms
+-- newly inserted Bronze rows through each TPA's approved mappings, so
+-- Silver freshness is minutes instead of the nightly schedule.
+--
+-- To disable CDC mode again:
+--   ALTER TASK cdc_transform_task SUSPEND;
+-- ============================================
+
+-- ============================================
+-- CONFIGURATION
+-- ============================================
+
+SET DATABASE_NAME = '$DATABASE_NAME';
+SET SILVER_SCHEMA_NAME = '$SILVER_SCHEMA_NAME';
+SET WAREHOUSE_NAME = '$SNOWFLAKE_WAREHOUSE';
+SET SNOWFLAKE_ROLE = '$SNOWFLAKE_ROLE';
+
+USE ROLE IDENTIFIER($SNOWFLAKE_ROLE);
+USE DATABASE IDENTIFIER($DATABASE_NAME);
+USE WAREHOUSE IDENTIFIER($WAREHOUSE_NAME);
+USE SCHEMA IDENTIFIER($SILVER_SCHEMA_NAME);
+
+-- ============================================
+-- RESUME TASK
+-- ============================================
+
+ALTER TASK cdc_transform_task RESUME;
+
+-- ============================================
+-- VERIFICATION
+-- ============================================
+
+SHOW TASKS LIKE 'CDC_TRANSFORM_TASK' IN SCHEMA IDENTIFIER($SILVER_SCHEMA_NAME);
+
+SELECT 'Silver CDC transform task resumed!' AS status,
+       'cdc_transform_task runs whenever raw_data_cdc_stream has new rows' AS schedule_info;
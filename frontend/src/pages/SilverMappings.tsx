@@ -373,7 +373,8 @@ const SilverMappings: React.FC<SilverMappingsProps> = ({ tpas }) => {
       
       if (hasCount || hasSuccessFlag || messageIndicatesSuccess) {
         const countText = result.mappings_created > 0 ? `${result.mappings_created} ` : ''
-        message.success(`Created ${countText}LLM-based mappings for ${schemaTableName}`)
+        const cacheText = result.cached ? ' (cached LLM response)' : ''
+        message.success(`Created ${countText}LLM-based mappings for ${schemaTableName}${cacheText}`)
       } else {
         const errorMsg = result.message || result.result || 'No new mappings were created. The LLM may not have found confident matches.'
         message.warning(errorMsg, 10)
@@ -1235,9 +1236,9 @@ const SilverMappings: React.FC<SilverMappingsProps> = ({ tpas }) => {
           <Form.Item
             name="transformation_logic"
             label="Transformation Logic (Optional)"
-            tooltip="SQL expression to transform the source field"
+            tooltip="Expression over source field names. Supported: TRIM, UPPER, LOWER, INITCAP, SUBSTR, REPLACE, CONCAT, COALESCE, NULLIF, LOOKUP(field, 'key', 'value', ...), REGEXP_REPLACE, REGEXP_SUBSTR, TO_DATE(field[, 'format']), TO_TIMESTAMP, TO_NUMBER, ROUND, ABS, + - * / and ||"
           >
-            <TextArea rows={3} placeholder="e.g., UPPER(source_field)" />
+            <TextArea rows={3} placeholder="e.g., UPPER(TRIM(source_field))" />
           </Form.Item>
 
           <Form.Item>
@@ -186,7 +186,7 @@ const SilverTransform: React.FC<SilverTransformProps> = ({ selectedTpa, setSelec
       console.log('Parsed record count:', recordCount)
 
       // Check if the result indicates an error (even though HTTP status was 200)
-      const isError = resultMessage.toUpperCase().startsWith('ERROR')
+      const isError = ['ERROR', 'PARTIAL'].some(prefix => resultMessage.toUpperCase().startsWith(prefix))
       
       const transformData = {
         source: sourceTable,
@@ -10,6 +10,60 @@ const api = axios.create({
   withCredentials: true, // Enable sending cookies with cross-origin requests
 })
 
+// crypto.randomUUID only exists in secure contexts (https or localhost); fall
+// back to getRandomValues, which is available everywhere
+const newIdempotencyKey = (): string => {
+  if (typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID()
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16))
+  bytes[6] = (bytes[6] & 0x0f) | 0x40
+  bytes[8] = (bytes[8] & 0x3f) | 0x80
+  const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('')
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`
+}
+
+// A fresh key per user action: proxy or client retries of the same request
+// reuse it, so the server replays the original response instead of re-running it
+const idempotencyHeaders = () => ({ 'Idempotency-Key': newIdempotencyKey() })
+
+const JOB_POLL_INTERVAL_MS = 2000
+
+export interface JobHandle {
+  job_id: string
+  job_type: string
+  status: string
+  status_url: string
+}
+
+// Long-running operations are submitted as background jobs (run_async) so no
+// request outlives the proxy timeout; poll the job until it finishes.
+// status_url already carries the API prefix, so it is resolved against the origin.
+const waitForJob = async (handle: JobHandle): Promise<any> => {
+  const origin = new URL(API_BASE_URL, window.location.origin).origin
+  while (true) {
+    const { data: job } = await api.get(handle.status_url, { baseURL: origin })
+    if (job.finished) {
+      if (job.status !== 'SUCCEEDED') {
+        throw new Error(job.error_message || `Job ${job.job_id} ${String(job.status).toLowerCase()}`)
+      }
+      return job
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+  }
+}
+
+// Same shape as the synchronous auto-ml / auto-llm response
+const mappingJobResult = (job: any) => ({
+  message: job.result || `Auto-mapping completed (${job.mappings_created || 0} mappings created)`,
+  result: job.result,
+  mappings_created: job.mappings_created || 0,
+  mappings_duplicate: job.mappings_duplicate || 0,
+  mappings_rejected: job.mappings_rejected || 0,
+  cached: Boolean(job.cached),
+  success: job.mappings_created > 0 || (typeof job.result === 'string' && job.result.toLowerCase().includes('successfully')),
+})
+
 export interface TPA {
   TPA_CODE: string
   TPA_NAME: string
@@ -357,23 +411,27 @@ export const apiService = {
       tpa,
       top_n: topN,
       min_confidence: minConfidence,
-    })
-    return response.data
+      run_async: true,
+    }, { headers: idempotencyHeaders() })
+    return mappingJobResult(await waitForJob(response.data))
   },
 
   autoMapFieldsLLM: async (
     sourceTable: string,
     targetTable: string,
     tpa: string,
-    modelName = 'llama3.1-70b'
+    modelName = 'llama3.1-70b',
+    useCache = true
   ): Promise<any> => {
     const response = await api.post('/silver/mappings/auto-llm', {
       source_table: sourceTable,
       target_table: targetTable,
       tpa,
       model_name: modelName,
-    })
-    return response.data
+      use_cache: useCache,
+      run_async: true,
+    }, { headers: idempotencyHeaders() })
+    return mappingJobResult(await waitForJob(response.data))
   },
 
   approveMapping: async (mappingId: number): Promise<any> => {
@@ -401,9 +459,14 @@ export const apiService = {
       source_table: sourceTable,
       target_table: targetTable,
       tpa,
+      run_async: true,
       ...options,
-    })
-    return response.data
+    }, { headers: idempotencyHeaders() })
+    if (!response.data.job_id) {
+      return response.data
+    }
+    const job = await waitForJob(response.data)
+    return { message: 'Transformation completed', result: job.result }
   },
 
   // Gold endpoints
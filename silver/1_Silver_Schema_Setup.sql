@@ -90,6 +90,14 @@ CREATE HYBRID TABLE IF NOT EXISTS field_mappings (
 )
 COMMENT = 'Bronze → Silver field mappings per TPA. Supports multiple mapping methods: MANUAL (CSV), ML_AUTO (pattern matching), LLM_CORTEX (AI-powered).';
 
+-- Upgrade existing deployments: ML auto-mapping used to store its match scores
+-- in transformation_logic, which is now compiled into SQL. Move them to description.
+UPDATE field_mappings
+SET description = COALESCE(description, transformation_logic),
+    transformation_logic = NULL
+WHERE mapping_method = 'ML_AUTO'
+  AND transformation_logic LIKE 'Scores:%';
+
 -- ============================================
 -- METADATA TABLE 3: transformation_rules (HYBRID TABLE)
 -- ============================================
@@ -117,6 +125,62 @@ CREATE HYBRID TABLE IF NOT EXISTS transformation_rules (
 )
 COMMENT = 'Data quality and business rules per TPA. Five rule types: DATA_QUALITY, BUSINESS_LOGIC, STANDARDIZATION, DEDUPLICATION, REFERENTIAL_INTEGRITY.';
 
+-- ============================================
+-- METADATA TABLE 3b: transformation_rule_plans
+-- ============================================
+-- Compiled rules-engine plans (fused passes) per rule-set version
+
+CREATE TABLE IF NOT EXISTS transformation_rule_plans (
+    tpa VARCHAR(500) NOT NULL,
+    target_table VARCHAR(500) NOT NULL,
+    ruleset_hash VARCHAR(64) NOT NULL,
+    plan VARIANT,
+    rule_count NUMBER(38,0),
+    compiled_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    CONSTRAINT uk_transformation_rule_plans UNIQUE (tpa, target_table)
+)
+COMMENT = 'Cached apply_transformation_rules plans. Recompiled when the active rules or table columns change (ruleset_hash).';
+
+-- ============================================
+-- METADATA TABLE 3c: transformation_plans
+-- ============================================
+-- Generated Bronze → Silver stage/MERGE SQL per mapping-set version
+
+CREATE TABLE IF NOT EXISTS transformation_plans (
+    plan_id NUMBER(38,0) AUTOINCREMENT PRIMARY KEY,
+    tpa VARCHAR(500) NOT NULL,
+    target_table VARCHAR(500) NOT NULL,
+    plan_hash VARCHAR(64) NOT NULL,  -- Hash of approved mappings, target columns, date formats
+    plan_version NUMBER(38,0) NOT NULL,
+    mapping_count NUMBER(38,0),
+    stage_sql VARCHAR,
+    merge_sql VARCHAR,
+    plan VARIANT,
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    last_used_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),  -- Refreshed at most once a day
+    CONSTRAINT uk_transformation_plans UNIQUE (tpa, target_table, plan_hash)
+)
+COMMENT = 'Versioned transformation plans generated by transform_bronze_to_silver. A new version is created only when mappings or schemas change.';
+
+-- ============================================
+-- METADATA TABLE 3d: layout_mapping_sets
+-- ============================================
+-- Which Bronze file layouts (SCHEMA_FINGERPRINTS) each mapping set / plan
+-- version has been validated against, so known layouts skip validation
+
+CREATE TABLE IF NOT EXISTS layout_mapping_sets (
+    tpa VARCHAR(500) NOT NULL,
+    target_table VARCHAR(500) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,  -- Bronze SCHEMA_FINGERPRINTS.FINGERPRINT
+    plan_hash VARCHAR(64) NOT NULL,  -- transformation_plans.plan_hash of the mapping set
+    status VARCHAR(50) NOT NULL,  -- VALID, INCOMPLETE
+    missing_source_fields ARRAY,  -- Mapped source fields absent from the layout's header
+    mapped_field_count NUMBER(38,0),
+    validated_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    CONSTRAINT pk_layout_mapping_sets PRIMARY KEY (tpa, target_table, fingerprint, plan_hash)
+)
+COMMENT = 'Links Bronze file layout fingerprints to the mapping sets (transformation plans) validated against them. INCOMPLETE rows list mapped fields the layout lacks.';
+
 -- ============================================
 -- METADATA TABLE 4: created_tables (HYBRID TABLE)
 -- ============================================
@@ -148,10 +212,19 @@ CREATE TABLE IF NOT EXISTS silver_processing_log (
     source_table VARCHAR(500),
     target_table VARCHAR(500),
     processing_type VARCHAR(50),  -- DISCOVERY, MAPPING, TRANSFORMATION, VALIDATION, PUBLISH
-    status VARCHAR(50),  -- STARTED, IN_PROGRESS, SUCCESS, FAILED
+    status VARCHAR(50),  -- STARTED, IN_PROGRESS, SUCCESS, FAILED, RESUMED
     records_processed NUMBER(38,0),
     records_success NUMBER(38,0),
     records_failed NUMBER(38,0),
+    records_total NUMBER(38,0),  -- Source rows in scope (for percent complete)
+    last_record_id NUMBER(38,0),  -- Checkpoint: last RECORD_ID of the last committed chunk
+    chunks_completed NUMBER(38,0),
+    records_inserted NUMBER(38,0),
+    records_updated NUMBER(38,0),
+    records_unchanged NUMBER(38,0),  -- Matched rows skipped because _ROW_HASH was equal
+    run_mode VARCHAR(20),  -- FULL or INCREMENTAL (TRANSFORMATION runs); resume only within the same mode
+    plan_hash VARCHAR(64),  -- transformation_plans.plan_hash of the run; resume only under the same plan
+    heartbeat_timestamp TIMESTAMP_NTZ,  -- Last checkpoint write; unfinished runs with a stale heartbeat are resumable
     start_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
     end_timestamp TIMESTAMP_NTZ,
     duration_seconds NUMBER(38,0),
@@ -160,6 +233,94 @@ CREATE TABLE IF NOT EXISTS silver_processing_log (
 )
 COMMENT = 'Transformation batch audit trail. Tracks all Silver processing activities with detailed metrics.';
 
+-- Upgrade existing deployments: chunk progress / resume checkpoint and MERGE outcome columns
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS records_total NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS last_record_id NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS chunks_completed NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS records_inserted NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS records_updated NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS records_unchanged NUMBER(38,0);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS run_mode VARCHAR(20);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS plan_hash VARCHAR(64);
+ALTER TABLE silver_processing_log ADD COLUMN IF NOT EXISTS heartbeat_timestamp TIMESTAMP_NTZ;
+
+-- ============================================
+-- METADATA TABLE 4b: mapping_expression_cache (HYBRID TABLE)
+-- ============================================
+-- Compiled transformation_logic fragments, keyed by mapping version (logic_hash)
+
+CREATE HYBRID TABLE IF NOT EXISTS mapping_expression_cache (
+    mapping_id NUMBER(38,0) NOT NULL PRIMARY KEY,
+    logic_hash VARCHAR(64) NOT NULL,
+    compiled_expression VARCHAR(16000),
+    result_type VARCHAR(50),  -- text, number, date, timestamp
+    check_expression VARCHAR(16000),
+    compile_error VARCHAR(5000),
+    compiled_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+COMMENT = 'Compiled field_mappings.transformation_logic SQL expressions per mapping version. Populated by transform_bronze_to_silver.';
+
+-- ============================================
+-- METADATA TABLE 4c: llm_response_cache (HYBRID TABLE)
+-- ============================================
+-- Cortex COMPLETE responses for auto_map_fields_llm, keyed by model, prompt
+-- template and a hash of the fully rendered prompt
+
+CREATE HYBRID TABLE IF NOT EXISTS llm_response_cache (
+    model_name VARCHAR(100) NOT NULL,
+    template_id VARCHAR(100) NOT NULL,
+    prompt_hash VARCHAR(64) NOT NULL,  -- SHA-256 of the rendered prompt
+    response VARCHAR,
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    last_hit_timestamp TIMESTAMP_NTZ,
+    hit_count NUMBER(38,0) DEFAULT 0,
+    PRIMARY KEY (model_name, template_id, prompt_hash)
+)
+COMMENT = 'Cached Cortex LLM responses for field mapping. Entries older than the caller''s TTL are refreshed; rows can be purged per model/template.';
+
+-- ============================================
+-- METADATA TABLE 4d: llm_candidate_audit
+-- ============================================
+-- Target candidates shortlisted per source field when auto_map_fields_llm
+-- runs with candidate_top_k (only these are sent to the LLM)
+
+CREATE TABLE IF NOT EXISTS llm_candidate_audit (
+    audit_id NUMBER(38,0) AUTOINCREMENT PRIMARY KEY,
+    run_id VARCHAR(100) NOT NULL,
+    tpa VARCHAR(500) NOT NULL,
+    target_table VARCHAR(500),
+    model_name VARCHAR(100),
+    source_field VARCHAR(500) NOT NULL,
+    candidates ARRAY,  -- Shortlisted target columns, best first
+    candidate_scores ARRAY,  -- Similarity score per candidate
+    target_field_count NUMBER(38,0),  -- Columns the shortlist was drawn from
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+COMMENT = 'Audit trail of the target candidates shortlisted per source field before LLM field mapping.';
+
+-- ============================================
+-- METADATA TABLE 4e: parallel_call_queue (HYBRID TABLE)
+-- ============================================
+-- CALL statements fanned out by start_parallel_calls (see 6_Silver_Tasks.sql).
+-- Each worker task runs its own items in its own session, so the child
+-- procedures' BEGIN/COMMIT transactions never share a session.
+
+CREATE HYBRID TABLE IF NOT EXISTS parallel_call_queue (
+    run_id VARCHAR(200) NOT NULL,
+    item_id NUMBER(38,0) NOT NULL,
+    item_key VARCHAR(1000),  -- Caller's label for the item, e.g. TPA.TABLE
+    call_sql VARCHAR(16000) NOT NULL,  -- A single CALL statement
+    worker_id NUMBER(38,0),
+    worker_task VARCHAR(300),  -- Task that runs this worker's items (NULL when run inline)
+    status VARCHAR(20) DEFAULT 'QUEUED',  -- QUEUED, RUNNING, DONE, FAILED
+    result VARCHAR(16000),  -- Procedure return value (DONE) or error (FAILED)
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    started_timestamp TIMESTAMP_NTZ,
+    completed_timestamp TIMESTAMP_NTZ,
+    PRIMARY KEY (run_id, item_id)
+)
+COMMENT = 'Work items of concurrent procedure runs. Each worker task runs its items in its own session.';
+
 -- ============================================
 -- METADATA TABLE 5: data_quality_metrics
 -- ============================================
@@ -188,6 +349,7 @@ CREATE TABLE IF NOT EXISTS quarantine_records (
     tpa VARCHAR(500) NOT NULL,
     source_table VARCHAR(500),
     target_table VARCHAR(500),
+    source_record_id NUMBER(38,0),  -- Bronze RECORD_ID of rows quarantined by transform_bronze_to_silver
     record_data VARIANT,
     rule_id VARCHAR(100),
     rule_name VARCHAR(500),
@@ -198,6 +360,14 @@ CREATE TABLE IF NOT EXISTS quarantine_records (
 )
 COMMENT = 'Failed validation records. Stores records that failed transformation rules for review and reprocessing.';
 
+-- Upgrade existing deployments: typed Bronze RECORD_ID, so the per-chunk
+-- duplicate check prunes on a range instead of reading record_data
+ALTER TABLE quarantine_records ADD COLUMN IF NOT EXISTS source_record_id NUMBER(38,0);
+UPDATE quarantine_records
+SET source_record_id = record_data:RECORD_ID::NUMBER
+WHERE source_record_id IS NULL
+  AND rule_id IN ('CAST_FAILURE', 'REQUIRED_FIELD');
+
 -- ============================================
 -- METADATA TABLE 7: processing_watermarks
 -- ============================================
@@ -214,6 +384,113 @@ CREATE TABLE IF NOT EXISTS processing_watermarks (
 )
 COMMENT = 'Incremental processing state per TPA. Tracks last processed record for incremental transformations.';
 
+-- ============================================
+-- METADATA TABLE 7b: cdc_pending_records
+-- ============================================
+-- Bronze rows captured from raw_data_cdc_stream (see 6_Silver_Tasks.sql)
+-- that have not yet been transformed into their TPA's Silver tables
+
+CREATE TABLE IF NOT EXISTS cdc_pending_records (
+    record_id NUMBER(38,0) NOT NULL,
+    tpa VARCHAR(500) NOT NULL,
+    captured_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+CLUSTER BY (tpa)
+COMMENT = 'CDC work queue. Inserted RAW_DATA_TABLE rows consumed from the stream, pending transformation per TPA.';
+
+-- ============================================
+-- METADATA TABLE 7c: tpa_date_formats
+-- ============================================
+
+-- Regular table for per-TPA date parsing formats (small config table)
+-- Formats are tried in priority order by typed DATE/TIMESTAMP extraction;
+-- tpa = 'DEFAULT' applies to TPAs without their own formats.
+CREATE TABLE IF NOT EXISTS tpa_date_formats (
+    tpa VARCHAR(500) NOT NULL,
+    date_format VARCHAR(100) NOT NULL,
+    priority NUMBER(38,0) DEFAULT 100,
+    active BOOLEAN DEFAULT TRUE,
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    created_by VARCHAR(500) DEFAULT CURRENT_USER(),
+    CONSTRAINT pk_tpa_date_formats PRIMARY KEY (tpa, date_format)
+)
+COMMENT = 'Date formats per TPA for typed Silver extraction. DEFAULT row set applies when a TPA has none.';
+
+-- Insert default date formats
+MERGE INTO tpa_date_formats t
+USING (
+    SELECT column1 AS tpa, column2 AS date_format, column3 AS priority
+    FROM VALUES
+        ('DEFAULT', 'YYYY-MM-DD', 10),
+        ('DEFAULT', 'MM/DD/YYYY', 20),
+        ('DEFAULT', 'YYYYMMDD', 30),
+        ('DEFAULT', 'DD-MON-YYYY', 40)
+) s
+ON t.tpa = s.tpa AND t.date_format = s.date_format
+WHEN NOT MATCHED THEN INSERT (tpa, date_format, priority)
+    VALUES (s.tpa, s.date_format, s.priority);
+
+-- ============================================
+-- METADATA TABLE 7d: column_quality_patterns
+-- ============================================
+
+-- Regular table for column value patterns (small config table)
+-- Checked by run_data_quality_checks as PATTERN_VIOLATIONS_<column>;
+-- table_name = 'DEFAULT' applies to any Silver table with that column.
+CREATE TABLE IF NOT EXISTS column_quality_patterns (
+    table_name VARCHAR(500) NOT NULL,
+    column_name VARCHAR(500) NOT NULL,
+    pattern VARCHAR(1000) NOT NULL,
+    description VARCHAR(5000),
+    active BOOLEAN DEFAULT TRUE,
+    created_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    created_by VARCHAR(500) DEFAULT CURRENT_USER(),
+    CONSTRAINT pk_column_quality_patterns PRIMARY KEY (table_name, column_name)
+)
+COMMENT = 'Expected value patterns (regular expressions) per Silver column for data quality profiling.';
+
+-- Insert default column patterns
+MERGE INTO column_quality_patterns t
+USING (
+    SELECT column1 AS table_name, column2 AS column_name, column3 AS pattern, column4 AS description
+    FROM VALUES
+        ('DEFAULT', 'ZIP_CODE', '[0-9]{5}(-[0-9]{4})?', 'US ZIP or ZIP+4'),
+        ('DEFAULT', 'STATE', '[A-Za-z]{2}', 'Two-letter state code'),
+        ('DEFAULT', 'EMAIL', '[^@[:space:]]+@[^@[:space:]]+\\.[^@[:space:]]+', 'Email address'),
+        ('DEFAULT', 'NDC_CODE', '[0-9]{4,5}-?[0-9]{3,4}-?[0-9]{1,2}', 'National Drug Code')
+) s
+ON t.table_name = s.table_name AND t.column_name = s.column_name
+WHEN NOT MATCHED THEN INSERT (table_name, column_name, pattern, description)
+    VALUES (s.table_name, s.column_name, s.pattern, s.description);
+
+-- ============================================
+-- METADATA TABLE 7e: column_profile_aggregates
+-- ============================================
+-- Running per-table profile maintained by run_data_quality_checks so
+-- batch-scoped checks can merge new batches instead of rescanning.
+-- column_name = '*' holds table-level values (row count, latest load,
+-- profiled batches); hll_state is an HLL_EXPORT sketch for distinct counts.
+
+CREATE TABLE IF NOT EXISTS column_profile_aggregates (
+    tpa VARCHAR(500) NOT NULL,
+    target_table VARCHAR(500) NOT NULL,
+    column_name VARCHAR(500) NOT NULL,
+    row_count NUMBER(38,0) DEFAULT 0,
+    null_count NUMBER(38,0) DEFAULT 0,
+    hll_state VARIANT,
+    min_numeric FLOAT,
+    max_numeric FLOAT,
+    min_text VARCHAR(100),  -- DATE/TIMESTAMP bounds as text
+    max_text VARCHAR(100),
+    pattern VARCHAR(1000),  -- Pattern the violation count was measured against
+    pattern_violations NUMBER(38,0) DEFAULT 0,
+    max_load_timestamp TIMESTAMP_NTZ,
+    profiled_batch_ids ARRAY,
+    updated_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    CONSTRAINT pk_column_profile_aggregates PRIMARY KEY (tpa, target_table, column_name)
+)
+COMMENT = 'Mergeable column statistics per Silver table (counts, min/max, HLL sketches) for batch-scoped data quality checks.';
+
 -- ============================================
 -- METADATA TABLE 8: llm_prompt_templates
 -- ============================================
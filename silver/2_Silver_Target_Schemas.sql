@@ -92,6 +92,7 @@ def create_silver_table(session, table_name, tpa):
         column_defs.append("_BATCH_ID VARCHAR(100)")
         column_defs.append("_LOAD_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()")
         column_defs.append("_LOADED_BY VARCHAR(500) DEFAULT CURRENT_USER()")
+        column_defs.append("_ROW_HASH NUMBER(19,0)")  # HASH() of mapped columns; MERGE skips unchanged rows
         
         # Create table
         create_sql = f"CREATE TABLE IF NOT EXISTS {full_table_name} ({', '.join(column_defs)})"
@@ -117,7 +118,7 @@ def create_silver_table(session, table_name, tpa):
             # Table was created but tracking failed - not critical
             return f"WARNING: Table {full_table_name} created but tracking failed: {str(tracking_error)}"
         
-        return f"Successfully created table: {full_table_name} ({len(columns)} columns + 7 metadata columns)"
+        return f"Successfully created table: {full_table_name} ({len(columns)} columns + 8 metadata columns)"
         
     except Exception as e:
         return f"ERROR: Unexpected error creating table: {str(e)}"
@@ -127,16 +127,26 @@ CREATE OR REPLACE PROCEDURE auto_map_fields_ml(
 RETURNS VARCHAR
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.11'
-PACKAGES = ('snowflake-snowpark-python', 'pandas', 'scikit-learn')
+PACKAGES = ('snowflake-snowpark-python', 'pandas', 'numpy', 'scipy', 'scikit-learn')
 HANDLER = 'auto_map_fields_ml'
 AS
 $$
+import numpy as np
 import pandas as pd
+import uuid
 from difflib import SequenceMatcher
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 import re
 
+# Combined score = basic score * 0.7 + TF-IDF cosine * 0.3, where
+# basic score = exact * 0.4 + substring * 0.2 + sequence * 0.2 + word overlap * 0.2
+EXACT_WEIGHT = 0.4
+SUBSTRING_WEIGHT = 0.2
+SEQUENCE_WEIGHT = 0.2
+WORD_OVERLAP_WEIGHT = 0.2
+BASIC_WEIGHT = 0.7
+TFIDF_WEIGHT = 0.3
+
 def normalize_field_name(field_name):
     """Normalize field name for comparison"""
     if not field_name:
@@ -145,39 +155,145 @@ def normalize_field_name(field_name):
     normalized = re.sub(r'[^a-zA-Z0-9]', ' ', str(field_name))
     return normalized.lower().strip()
 
-def calculate_exact_match(source, target):
-    """Exact match score (case-insensitive)"""
-    source_norm = normalize_field_name(source)
-    target_norm = normalize_field_name(target)
-    return 1.0 if source_norm == target_norm else 0.0
-
-def calculate_substring_match(source, target):
-    """Substring match score"""
-    source_norm = normalize_field_name(source)
-    target_norm = normalize_field_name(target)
-    if not source_norm or not target_norm:
-        return 0.0
-    if source_norm in target_norm or target_norm in source_norm:
-        return 1.0
-    return 0.0
-
-def calculate_sequence_similarity(source, target):
-    """Sequence similarity using difflib"""
-    source_norm = normalize_field_name(source)
-    target_norm = normalize_field_name(target)
+def calculate_sequence_similarity(source_norm, target_norm):
+    """Sequence similarity of two normalized names using difflib"""
     if not source_norm or not target_norm:
         return 0.0
     return SequenceMatcher(None, source_norm, target_norm).ratio()
 
-def calculate_word_overlap(source, target):
-    """Jaccard similarity of word sets"""
-    source_words = set(normalize_field_name(source).split())
-    target_words = set(normalize_field_name(target).split())
-    if not source_words or not target_words:
-        return 0.0
-    intersection = source_words.intersection(target_words)
-    union = source_words.union(target_words)
-    return len(intersection) / len(union) if union else 0.0
+def score_matrices(source_fields, target_fields):
+    """Similarity components for every source x target pair at once
+    
+    Exact and substring matches are numpy string comparisons over the S x T
+    grid; word overlap (Jaccard) and TF-IDF cosine come from sparse matrix
+    products. Sequence similarity is not vectorizable and is left to
+    combine_scores, which only computes it where it can matter.
+    """
+    source_norm = np.array([normalize_field_name(f) for f in source_fields], dtype=str)
+    target_norm = np.array([normalize_field_name(f) for f in target_fields], dtype=str)
+    src = source_norm[:, None]
+    tgt = target_norm[None, :]
+    
+    exact = (src == tgt).astype(np.float64)
+    nonempty = (np.char.str_len(src) > 0) & (np.char.str_len(tgt) > 0)
+    substring = (nonempty & ((np.char.find(tgt, src) >= 0) | (np.char.find(src, tgt) >= 0))).astype(np.float64)
+    
+    # Jaccard of word sets: |A & B| from a binary sparse product, |A | B| = |A| + |B| - |A & B|
+    words = CountVectorizer(tokenizer=str.split, token_pattern=None, lowercase=False, binary=True)
+    words.fit(np.concatenate([source_norm, target_norm]))
+    source_words = words.transform(source_norm)
+    target_words = words.transform(target_norm)
+    intersection = (source_words @ target_words.T).toarray().astype(np.float64)
+    union = np.asarray(source_words.sum(axis=1)) + np.asarray(target_words.sum(axis=1)).T - intersection
+    word_overlap = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+    
+    # TF-IDF over all names; rows are L2-normalized, so the product is the cosine
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(2, 3))
+    tfidf_matrix = vectorizer.fit_transform(np.concatenate([source_norm, target_norm]))
+    n_sources = len(source_norm)
+    tfidf = (tfidf_matrix[:n_sources] @ tfidf_matrix[n_sources:].T).toarray()
+    
+    return {
+        'source_norm': source_norm,
+        'target_norm': target_norm,
+        'exact': exact,
+        'substring': substring,
+        'word_overlap': word_overlap,
+        'tfidf': tfidf
+    }
+
+def combine_scores(scores, min_confidence):
+    """Combined S x T score (-inf below min_confidence) and the sequence scores computed
+    
+    A pair can only reach min_confidence if it does so with a perfect
+    sequence score, so difflib runs only for those candidate pairs.
+    """
+    partial_basic = (
+        scores['exact'] * EXACT_WEIGHT +
+        scores['substring'] * SUBSTRING_WEIGHT +
+        scores['word_overlap'] * WORD_OVERLAP_WEIGHT
+    )
+    upper_bound = (partial_basic + SEQUENCE_WEIGHT) * BASIC_WEIGHT + scores['tfidf'] * TFIDF_WEIGHT
+    rows, cols = np.nonzero(upper_bound >= min_confidence)
+    
+    sequence = np.zeros(partial_basic.shape)
+    cache = {}
+    for i, j in zip(rows, cols):
+        pair = (scores['source_norm'][i], scores['target_norm'][j])
+        if pair not in cache:
+            cache[pair] = calculate_sequence_similarity(*pair)
+        sequence[i, j] = cache[pair]
+    
+    combined = np.full(partial_basic.shape, -np.inf)
+    combined[rows, cols] = (
+        (partial_basic[rows, cols] + sequence[rows, cols] * SEQUENCE_WEIGHT) * BASIC_WEIGHT +
+        scores['tfidf'][rows, cols] * TFIDF_WEIGHT
+    )
+    combined[combined < min_confidence] = -np.inf
+    return combined, sequence
+
+def top_matches(combined, top_n):
+    """Column indices of the top_n scores per row, best first
+    
+    argpartition selects the top_n in linear time per row; only those are sorted.
+    """
+    k = max(1, min(int(top_n), combined.shape[1]))
+    top = np.argpartition(-combined, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(combined, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+MAPPING_COLUMNS = ['SOURCE_FIELD', 'SOURCE_TABLE', 'TARGET_TABLE', 'TARGET_COLUMN', 'TPA',
+                   'MAPPING_METHOD', 'CONFIDENCE_SCORE', 'DESCRIPTION']
+
+def validate_suggestions(suggestions_df):
+    """Split suggestions into (valid, rejected_count): key fields present and within column
+    length, confidence a number between 0 and 1"""
+    key_columns = ['SOURCE_FIELD', 'SOURCE_TABLE', 'TARGET_TABLE', 'TARGET_COLUMN', 'TPA']
+    valid = suggestions_df[key_columns].apply(
+        lambda col: col.notna() & (col.astype(str).str.strip() != '') & (col.astype(str).str.len() <= 500)
+    ).all(axis=1)
+    confidence = pd.to_numeric(suggestions_df['CONFIDENCE_SCORE'], errors='coerce')
+    valid &= confidence.between(0, 1)
+    return suggestions_df[valid], int((~valid).sum())
+
+def merge_mapping_suggestions(session, suggestions_df):
+    """Write suggestions to field_mappings with one MERGE on (tpa, target_table, target_column, source_field)
+    
+    Returns (inserted, duplicates): suggestions repeated within the batch or
+    already mapped are left untouched and counted as duplicates.
+    """
+    if suggestions_df.empty:
+        return 0, 0
+    
+    view_name = f"MAPPING_SUGGESTIONS_{uuid.uuid4().hex[:8].upper()}"
+    session.create_dataframe(suggestions_df[MAPPING_COLUMNS]).create_or_replace_temp_view(view_name)
+    result = session.sql(f"""
+        MERGE INTO field_mappings t
+        USING (
+            SELECT *
+            FROM {view_name}
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY TPA, TARGET_TABLE, TARGET_COLUMN, SOURCE_FIELD
+                ORDER BY CONFIDENCE_SCORE DESC
+            ) = 1
+        ) s
+        ON t.tpa = s.TPA
+           AND t.target_table = s.TARGET_TABLE
+           AND t.target_column = s.TARGET_COLUMN
+           AND t.source_field = s.SOURCE_FIELD
+        WHEN NOT MATCHED THEN INSERT (
+            source_field, source_table, target_table, target_column, tpa,
+            mapping_method, confidence_score, approved, description
+        )
+        VALUES (
+            s.SOURCE_FIELD, s.SOURCE_TABLE, s.TARGET_TABLE, s.TARGET_COLUMN, s.TPA,
+            s.MAPPING_METHOD, s.CONFIDENCE_SCORE, FALSE, s.DESCRIPTION
+        )
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view_name}").collect()
+    
+    inserted = int(result[0][0]) if result else 0
+    return inserted, len(suggestions_df) - inserted
 
 def auto_map_fields_ml(session, source_table, target_table, tpa, top_n, min_confidence):
     """Main function for ML-based field mapping"""
@@ -185,7 +301,7 @@ def auto_map_fields_ml(session, source_table, target_table, tpa, top_n, min_conf
     if not tpa:
         return "Error: TPA parameter is required"
     
-    # Get source fields from Bronze table (analyze VARIANT column structure)
+    # Get source fields from Bronze table
     bronze_schema = session.get_current_schema()
     database = session.get_current_database()
     
@@ -197,18 +313,17 @@ def auto_map_fields_ml(session, source_table, target_table, tpa, top_n, min_conf
         # Need to qualify - assume BRONZE schema
         full_source_table = f"{database}.BRONZE.{source_table}"
     
+    # Source fields come from the ingestion-time catalog next to the Bronze table
+    catalog_table = f"{full_source_table.rsplit('.', 1)[0]}.SOURCE_FIELD_CATALOG"
     bronze_query = f"""
-        SELECT DISTINCT 
-            f.key as field_name
-        FROM {full_source_table},
-        LATERAL FLATTEN(input => RAW_DATA) f
-        WHERE RAW_DATA IS NOT NULL
-          AND TPA = '{tpa}'
-        LIMIT 1000
+        SELECT DISTINCT FIELD_NAME
+        FROM {catalog_table}
+        WHERE TPA = ?
+        ORDER BY FIELD_NAME
     """
     
     try:
-        source_fields_df = session.sql(bronze_query).to_pandas()
+        source_fields_df = session.sql(bronze_query, params=[tpa]).to_pandas()
         source_fields = source_fields_df['FIELD_NAME'].tolist()
     except Exception as e:
         return f"Error extracting source fields: {str(e)}"
@@ -234,110 +349,51 @@ def auto_map_fields_ml(session, source_table, target_table, tpa, top_n, min_conf
     if target_fields_df.empty:
         return "No target fields found in target_schemas"
     
-    # Prepare data for TF-IDF
-    all_fields = source_fields + target_fields_df['COLUMN_NAME'].tolist()
-    normalized_fields = [normalize_field_name(f) for f in all_fields]
-    
-    # Calculate TF-IDF similarity
-    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(2, 3))
-    tfidf_matrix = vectorizer.fit_transform(normalized_fields)
+    # Score every source x target pair at once
+    target_fields = target_fields_df['COLUMN_NAME'].tolist()
+    target_tables = target_fields_df['TABLE_NAME'].tolist()
+    scores = score_matrices(source_fields, target_fields)
+    combined, sequence = combine_scores(scores, min_confidence)
     
-    # Calculate all similarity scores
+    # Top N per source field above the confidence threshold
     results = []
-    
-    for source_field in source_fields:
-        source_idx = all_fields.index(source_field)
-        
-        for _, target_row in target_fields_df.iterrows():
-            target_field = target_row['COLUMN_NAME']
-            target_table = target_row['TABLE_NAME']
-            target_idx = all_fields.index(target_field)
-            
-            # Calculate individual scores
-            exact_score = calculate_exact_match(source_field, target_field)
-            substring_score = calculate_substring_match(source_field, target_field)
-            sequence_score = calculate_sequence_similarity(source_field, target_field)
-            word_overlap = calculate_word_overlap(source_field, target_field)
-            
-            # TF-IDF cosine similarity
-            tfidf_score = cosine_similarity(
-                tfidf_matrix[source_idx:source_idx+1],
-                tfidf_matrix[target_idx:target_idx+1]
-            )[0][0]
-            
-            # Combined score (weighted average)
-            basic_score = (
-                exact_score * 0.4 +
-                substring_score * 0.2 +
-                sequence_score * 0.2 +
-                word_overlap * 0.2
-            )
-            combined_score = basic_score * 0.7 + tfidf_score * 0.3
-            
-            if combined_score >= min_confidence:
-                results.append({
-                    'SOURCE_FIELD': source_field,
-                    'TARGET_TABLE': target_table,
-                    'TARGET_COLUMN': target_field,
-                    'COMBINED_SCORE': round(combined_score, 4),
-                    'EXACT_SCORE': round(exact_score, 4),
-                    'SUBSTRING_SCORE': round(substring_score, 4),
-                    'SEQUENCE_SCORE': round(sequence_score, 4),
-                    'WORD_OVERLAP': round(word_overlap, 4),
-                    'TFIDF_SCORE': round(tfidf_score, 4)
-                })
+    for i, target_indices in enumerate(top_matches(combined, top_n)):
+        for rank, j in enumerate(target_indices, start=1):
+            if combined[i, j] == -np.inf:
+                break
+            results.append({
+                'SOURCE_FIELD': source_fields[i],
+                'TARGET_TABLE': target_tables[j],
+                'TARGET_COLUMN': target_fields[j],
+                'COMBINED_SCORE': round(float(combined[i, j]), 4),
+                'EXACT_SCORE': round(float(scores['exact'][i, j]), 4),
+                'SUBSTRING_SCORE': round(float(scores['substring'][i, j]), 4),
+                'SEQUENCE_SCORE': round(float(sequence[i, j]), 4),
+                'WORD_OVERLAP': round(float(scores['word_overlap'][i, j]), 4),
+                'TFIDF_SCORE': round(float(scores['tfidf'][i, j]), 4),
+                'MATCH_RANK': rank
+            })
     
     if not results:
-        return "No mappings found above confidence threshold"
+        return f"No mappings found above confidence threshold {min_confidence}"
     
-    # Convert to DataFrame and rank
     results_df = pd.DataFrame(results)
-    results_df['MATCH_RANK'] = results_df.groupby('SOURCE_FIELD')['COMBINED_SCORE'].rank(
-        ascending=False, method='first'
-    ).astype(int)
-    
-    # Filter to top N per source field
-    results_df = results_df[results_df['MATCH_RANK'] <= top_n]
     
-    # Filter by minimum confidence
-    results_df = results_df[results_df['COMBINED_SCORE'] >= min_confidence]
-    
-    if results_df.empty:
-        return f"No mappings found above confidence threshold {min_confidence}"
-    
-    # Insert directly into field_mappings table
-    rows_inserted = 0
-    for _, row in results_df.iterrows():
-        transformation_logic = f"Scores: Exact={row['EXACT_SCORE']}, Substring={row['SUBSTRING_SCORE']}, Sequence={row['SEQUENCE_SCORE']}, WordOverlap={row['WORD_OVERLAP']}, TFIDF={row['TFIDF_SCORE']}, Rank={row['MATCH_RANK']}"
-        
-        insert_query = f"""
-            INSERT INTO field_mappings (
-                source_field, source_table, target_table, target_column, tpa,
-                mapping_method, confidence_score, approved,
-                transformation_logic
-            )
-            VALUES (
-                '{row['SOURCE_FIELD']}',
-                '{source_table}',
-                '{row['TARGET_TABLE']}',
-                '{row['TARGET_COLUMN']}',
-                '{tpa}',
-                'ML_AUTO',
-                {row['COMBINED_SCORE']},
-                FALSE,
-                '{transformation_logic}'
-            )
-        """
-        
-        try:
-            session.sql(insert_query).collect()
-            rows_inserted += 1
-        except Exception as e:
-            # Skip duplicates or other errors
-            pass
+    # Write all suggestions to field_mappings in one MERGE
+    results_df['SOURCE_TABLE'] = source_table
+    results_df['TPA'] = tpa
+    results_df['MAPPING_METHOD'] = 'ML_AUTO'
+    results_df['CONFIDENCE_SCORE'] = results_df['COMBINED_SCORE']
+    results_df['DESCRIPTION'] = results_df.apply(
+        lambda row: f"Scores: Exact={row['EXACT_SCORE']}, Substring={row['SUBSTRING_SCORE']}, Sequence={row['SEQUENCE_SCORE']}, WordOverlap={row['WORD_OVERLAP']}, TFIDF={row['TFIDF_SCORE']}, Rank={row['MATCH_RANK']}",
+        axis=1
+    )
+    valid_df, rows_rejected = validate_suggestions(results_df)
+    rows_inserted, rows_duplicate = merge_mapping_suggestions(session, valid_df)
     
     table_msg = f" for {target_table}" if target_table else " for all tables"
-    return f"Successfully generated {rows_inserted} ML-based field mappings{table_msg} (top {top_n} per field, min confidence {min_confidence})"
+    return (f"Successfully generated {rows_inserted} ML-based field mappings{table_msg} (top {top_n} per field, min confidence {min_confidence}): "
+            f"{rows_inserted} inserted, {rows_duplicate} skipped as duplicate, {rows_rejected} rejected")
 $$;
 
 -- ============================================
@@ -347,26 +403,367 @@ $$;
 -- Input: source_table - Bronze table to analyze
 --        model_name - Cortex AI model to use
 --        custom_prompt_id - Optional custom prompt template ID
+--        use_cache - Reuse a cached response for an identical prompt (FALSE forces a fresh call)
+--        cache_ttl_hours - Maximum age of a cached response (NULL = no expiry)
+--        candidate_top_k - Target candidates per source field sent to the LLM (NULL = all columns)
 -- Output: Number of mappings generated
+--
+-- When candidate_top_k is set, a retrieval stage first shortlists the top-K
+-- target columns per source field with the auto_map_fields_ml similarity
+-- (exact/substring/word overlap + character n-gram TF-IDF); each source field
+-- is then rendered with only its own candidates, by TABLE.COLUMN name (target
+-- descriptions are only sent in the full-schema mode). Candidate sets are
+-- logged to llm_candidate_audit.
+--
+-- Source fields are split into chunks of LLM_CHUNK_SIZE, one prompt each, and
+-- up to LLM_MAX_CONCURRENCY prompts run concurrently; a failed chunk only
+-- loses its own suggestions. Responses are cached in llm_response_cache by
+-- (model, template, SHA-256 of the rendered chunk prompt); only responses
+-- that parse as a JSON array are stored.
+
+DROP PROCEDURE IF EXISTS auto_map_fields_llm(VARCHAR, VARCHAR, VARCHAR, VARCHAR, VARCHAR);
+DROP PROCEDURE IF EXISTS auto_map_fields_llm(VARCHAR, VARCHAR, VARCHAR, VARCHAR, VARCHAR, BOOLEAN, INTEGER);
 
 CREATE OR REPLACE PROCEDURE auto_map_fields_llm(
     source_table VARCHAR DEFAULT 'RAW_DATA_TABLE',
     target_table VARCHAR DEFAULT NULL,
     tpa VARCHAR DEFAULT NULL,
     model_name VARCHAR DEFAULT 'llama3.1-70b',
-    custom_prompt_id VARCHAR DEFAULT 'DEFAULT_FIELD_MAPPING'
+    custom_prompt_id VARCHAR DEFAULT 'DEFAULT_FIELD_MAPPING',
+    use_cache BOOLEAN DEFAULT TRUE,
+    cache_ttl_hours INTEGER DEFAULT 168,
+    candidate_top_k INTEGER DEFAULT NULL
 )
 RETURNS VARCHAR
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.11'
-PACKAGES = ('snowflake-snowpark-python', 'pandas')
+PACKAGES = ('snowflake-snowpark-python', 'pandas', 'numpy', 'scipy', 'scikit-learn')
 HANDLER = 'auto_map_fields_llm'
 AS
 $$
+import hashlib
 import json
 import re
+import uuid
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+MAPPING_COLUMNS = ['SOURCE_FIELD', 'SOURCE_TABLE', 'TARGET_TABLE', 'TARGET_COLUMN', 'TPA',
+                   'MAPPING_METHOD', 'CONFIDENCE_SCORE', 'DESCRIPTION']
+
+LLM_CHUNK_SIZE = 40  # Source fields per prompt
+LLM_MAX_CONCURRENCY = 4  # Cortex COMPLETE calls in flight at once
+
+# Shortlist score: same component weights as auto_map_fields_ml, without the
+# (non-vectorizable) sequence component
+EXACT_WEIGHT = 0.4
+SUBSTRING_WEIGHT = 0.2
+WORD_OVERLAP_WEIGHT = 0.2
+BASIC_WEIGHT = 0.7
+TFIDF_WEIGHT = 0.3
+
+def normalize_field_name(field_name):
+    """Normalize field name for comparison"""
+    if not field_name:
+        return ""
+    # Remove special characters and convert to lowercase
+    normalized = re.sub(r'[^a-zA-Z0-9]', ' ', str(field_name))
+    return normalized.lower().strip()
+
+def score_matrices(source_fields, target_fields):
+    """Similarity components for every source x target pair at once
+    
+    Exact and substring matches are numpy string comparisons over the S x T
+    grid; word overlap (Jaccard) and TF-IDF cosine come from sparse matrix
+    products. Sequence similarity is not vectorizable and is not used for
+    shortlisting.
+    """
+    source_norm = np.array([normalize_field_name(f) for f in source_fields], dtype=str)
+    target_norm = np.array([normalize_field_name(f) for f in target_fields], dtype=str)
+    src = source_norm[:, None]
+    tgt = target_norm[None, :]
+    
+    exact = (src == tgt).astype(np.float64)
+    nonempty = (np.char.str_len(src) > 0) & (np.char.str_len(tgt) > 0)
+    substring = (nonempty & ((np.char.find(tgt, src) >= 0) | (np.char.find(src, tgt) >= 0))).astype(np.float64)
+    
+    # Jaccard of word sets: |A & B| from a binary sparse product, |A | B| = |A| + |B| - |A & B|
+    words = CountVectorizer(tokenizer=str.split, token_pattern=None, lowercase=False, binary=True)
+    words.fit(np.concatenate([source_norm, target_norm]))
+    source_words = words.transform(source_norm)
+    target_words = words.transform(target_norm)
+    intersection = (source_words @ target_words.T).toarray().astype(np.float64)
+    union = np.asarray(source_words.sum(axis=1)) + np.asarray(target_words.sum(axis=1)).T - intersection
+    word_overlap = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+    
+    # TF-IDF over all names; rows are L2-normalized, so the product is the cosine
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(2, 3))
+    tfidf_matrix = vectorizer.fit_transform(np.concatenate([source_norm, target_norm]))
+    n_sources = len(source_norm)
+    tfidf = (tfidf_matrix[:n_sources] @ tfidf_matrix[n_sources:].T).toarray()
+    
+    return {
+        'source_norm': source_norm,
+        'target_norm': target_norm,
+        'exact': exact,
+        'substring': substring,
+        'word_overlap': word_overlap,
+        'tfidf': tfidf
+    }
+
+def top_matches(combined, top_n):
+    """Column indices of the top_n scores per row, best first
+    
+    argpartition selects the top_n in linear time per row; only those are sorted.
+    """
+    k = max(1, min(int(top_n), combined.shape[1]))
+    top = np.argpartition(-combined, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(combined, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+def shortlist_candidates(source_fields, target_fields, top_k):
+    """Indices and scores of the top_k target fields per source field, best first"""
+    scores = score_matrices(source_fields, target_fields)
+    basic = (
+        scores['exact'] * EXACT_WEIGHT +
+        scores['substring'] * SUBSTRING_WEIGHT +
+        scores['word_overlap'] * WORD_OVERLAP_WEIGHT
+    )
+    combined = basic * BASIC_WEIGHT + scores['tfidf'] * TFIDF_WEIGHT
+    top = top_matches(combined, top_k)
+    return top, np.take_along_axis(combined, top, axis=1)
 
-def auto_map_fields_llm(session, source_table, target_table, tpa, model_name, custom_prompt_id):
+def log_candidate_sets(session, run_id, tpa, target_table, model_name, source_fields, target_fields, top, top_scores):
+    """Record each source field's shortlisted target candidates in llm_candidate_audit"""
+    rows = [{
+        'RUN_ID': run_id,
+        'TPA': tpa,
+        'TARGET_TABLE': target_table.upper(),
+        'MODEL_NAME': model_name,
+        'SOURCE_FIELD': source_field,
+        'CANDIDATES': json.dumps([target_fields[j] for j in top[i]]),
+        'CANDIDATE_SCORES': json.dumps([round(float(v), 4) for v in top_scores[i]]),
+        'TARGET_FIELD_COUNT': len(target_fields)
+    } for i, source_field in enumerate(source_fields)]
+    view_name = f"TEMP_LLM_CANDIDATES_{uuid.uuid4().hex.upper()}"
+    session.create_dataframe(rows).create_or_replace_temp_view(view_name)
+    session.sql(f"""
+        INSERT INTO llm_candidate_audit
+            (run_id, tpa, target_table, model_name, source_field, candidates, candidate_scores, target_field_count)
+        SELECT RUN_ID, TPA, TARGET_TABLE, MODEL_NAME, SOURCE_FIELD,
+               PARSE_JSON(CANDIDATES)::ARRAY, PARSE_JSON(CANDIDATE_SCORES)::ARRAY, TARGET_FIELD_COUNT
+        FROM {view_name}
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view_name}").collect()
+
+def build_chunk_prompts(prompt_template, source_fields_desc, target_fields_desc, target_names, top=None):
+    """Render one prompt per chunk of LLM_CHUNK_SIZE source fields
+    
+    Without a shortlist every prompt lists all target fields with their
+    descriptions. With one (top), each source field is followed by its own
+    candidates only, as TABLE.COLUMN names, so prompt size grows with K per
+    field rather than with the target schema.
+    """
+    prompts = []
+    for start in range(0, len(source_fields_desc), LLM_CHUNK_SIZE):
+        end = min(start + LLM_CHUNK_SIZE, len(source_fields_desc))
+        if top is None:
+            source_text = '\n'.join(f"- {f}" for f in source_fields_desc[start:end])
+            target_text = '\n'.join(f"- {t}" for t in target_fields_desc)
+        else:
+            source_text = '\n'.join(
+                f"- {source_fields_desc[i]}\n  candidates: {', '.join(target_names[j] for j in top[i])}"
+                for i in range(start, end)
+            )
+            target_text = "Only the candidates listed under each source field; map a source field to one of its own candidates or leave it out."
+        prompts.append(prompt_template.replace('{source_fields}', source_text).replace('{target_fields}', target_text))
+    return prompts
+
+
+def validate_suggestions(suggestions_df):
+    """Split suggestions into (valid, rejected_count): key fields present and within column
+    length, confidence a number between 0 and 1"""
+    key_columns = ['SOURCE_FIELD', 'SOURCE_TABLE', 'TARGET_TABLE', 'TARGET_COLUMN', 'TPA']
+    valid = suggestions_df[key_columns].apply(
+        lambda col: col.notna() & (col.astype(str).str.strip() != '') & (col.astype(str).str.len() <= 500)
+    ).all(axis=1)
+    confidence = pd.to_numeric(suggestions_df['CONFIDENCE_SCORE'], errors='coerce')
+    valid &= confidence.between(0, 1)
+    return suggestions_df[valid], int((~valid).sum())
+
+def merge_mapping_suggestions(session, suggestions_df):
+    """Write suggestions to field_mappings with one MERGE on (tpa, target_table, target_column, source_field)
+    
+    Returns (inserted, duplicates): suggestions repeated within the batch or
+    already mapped are left untouched and counted as duplicates.
+    """
+    if suggestions_df.empty:
+        return 0, 0
+    
+    view_name = f"MAPPING_SUGGESTIONS_{uuid.uuid4().hex[:8].upper()}"
+    session.create_dataframe(suggestions_df[MAPPING_COLUMNS]).create_or_replace_temp_view(view_name)
+    result = session.sql(f"""
+        MERGE INTO field_mappings t
+        USING (
+            SELECT *
+            FROM {view_name}
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY TPA, TARGET_TABLE, TARGET_COLUMN, SOURCE_FIELD
+                ORDER BY CONFIDENCE_SCORE DESC
+            ) = 1
+        ) s
+        ON t.tpa = s.TPA
+           AND t.target_table = s.TARGET_TABLE
+           AND t.target_column = s.TARGET_COLUMN
+           AND t.source_field = s.SOURCE_FIELD
+        WHEN NOT MATCHED THEN INSERT (
+            source_field, source_table, target_table, target_column, tpa,
+            mapping_method, confidence_score, approved, description
+        )
+        VALUES (
+            s.SOURCE_FIELD, s.SOURCE_TABLE, s.TARGET_TABLE, s.TARGET_COLUMN, s.TPA,
+            s.MAPPING_METHOD, s.CONFIDENCE_SCORE, FALSE, s.DESCRIPTION
+        )
+    """).collect()
+    session.sql(f"DROP VIEW IF EXISTS {view_name}").collect()
+    
+    inserted = int(result[0][0]) if result else 0
+    return inserted, len(suggestions_df) - inserted
+
+def parse_llm_mappings(llm_response):
+    """Extract the JSON array of mapping suggestions from a Cortex response, or None"""
+    # Strategy 1: Try to parse entire response as JSON
+    try:
+        mappings = json.loads(llm_response)
+        if isinstance(mappings, list):
+            return mappings
+    except (TypeError, ValueError):
+        pass
+    
+    # Strategy 2: Extract JSON array from response (handle markdown code blocks)
+    cleaned_response = re.sub(r'```json\s*', '', llm_response)
+    cleaned_response = re.sub(r'```\s*', '', cleaned_response)
+    json_match = re.search(r'\[[\s\S]*\]', cleaned_response)
+    if json_match:
+        try:
+            return json.loads(json_match.group(0))
+        except ValueError:
+            pass
+    
+    # Strategy 3: Try to find JSON objects and build array
+    json_objects = re.findall(r'\{[^{}]*\}', llm_response)
+    if json_objects:
+        try:
+            return [json.loads(obj) for obj in json_objects]
+        except ValueError:
+            pass
+    
+    return None
+
+def sql_literal(text):
+    """Quote text as a Snowflake string literal (async queries are built without binds)"""
+    return "'" + text.replace('\\', '\\\\').replace("'", "''") + "'"
+
+def complete_prompts(session, model_name, template_id, prompts, use_cache, cache_ttl_hours):
+    """Run each prompt through Cortex COMPLETE, at most LLM_MAX_CONCURRENCY at once
+    
+    Cached responses are reused per prompt. Returns one (mappings, from_cache,
+    error) tuple per prompt, in order; a failed prompt only costs its own chunk.
+    """
+    import time
+    
+    results = [None] * len(prompts)
+    pending = []
+    for index, prompt in enumerate(prompts):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        if use_cache is not False:
+            cached = get_cached_response(session, model_name, template_id, prompt_hash, cache_ttl_hours)
+            mappings = parse_llm_mappings(cached) if cached is not None else None
+            if mappings is not None:
+                results[index] = (mappings, True, None)
+                continue
+        pending.append((index, prompt_hash, prompt))
+    
+    running = []
+    while pending or running:
+        while pending and len(running) < LLM_MAX_CONCURRENCY:
+            index, prompt_hash, prompt = pending.pop(0)
+            cortex_query = f"SELECT SNOWFLAKE.CORTEX.COMPLETE({sql_literal(model_name)}, {sql_literal(prompt)}) AS llm_response"
+            try:
+                running.append((index, prompt_hash, session.sql(cortex_query).collect_nowait()))
+            except Exception as e:
+                results[index] = (None, False, str(e))
+        
+        finished = [entry for entry in running if entry[2].is_done()]
+        if not finished:
+            time.sleep(0.5)
+            continue
+        
+        for entry in finished:
+            running.remove(entry)
+            index, prompt_hash, job = entry
+            try:
+                llm_response = job.result()[0]['LLM_RESPONSE']
+            except Exception as e:
+                results[index] = (None, False, str(e))
+                continue
+            
+            mappings = parse_llm_mappings(llm_response)
+            if mappings is None:
+                results[index] = (None, False, f"Could not parse LLM response as JSON array. Response preview: {llm_response[:500]}")
+                continue
+            store_cached_response(session, model_name, template_id, prompt_hash, llm_response)
+            results[index] = (mappings, False, None)
+    
+    return results
+
+def get_cached_response(session, model_name, template_id, prompt_hash, ttl_hours):
+    """Return the cached LLM response for this prompt, or None when missing or expired"""
+    query = """
+        SELECT response
+        FROM llm_response_cache
+        WHERE model_name = ?
+          AND template_id = ?
+          AND prompt_hash = ?
+    """
+    params = [model_name, template_id, prompt_hash]
+    if ttl_hours is not None:
+        query += " AND created_timestamp >= DATEADD('hour', ?, CURRENT_TIMESTAMP())"
+        params.append(-int(ttl_hours))
+    
+    rows = session.sql(query, params=params).collect()
+    if not rows:
+        return None
+    
+    session.sql("""
+        UPDATE llm_response_cache
+        SET hit_count = hit_count + 1,
+            last_hit_timestamp = CURRENT_TIMESTAMP()
+        WHERE model_name = ?
+          AND template_id = ?
+          AND prompt_hash = ?
+    """, params=[model_name, template_id, prompt_hash]).collect()
+    return rows[0]['RESPONSE']
+
+def store_cached_response(session, model_name, template_id, prompt_hash, response):
+    """Insert or refresh the cache entry for this prompt"""
+    session.sql("""
+        MERGE INTO llm_response_cache t
+        USING (SELECT ? AS model_name, ? AS template_id, ? AS prompt_hash, ? AS response) s
+        ON t.model_name = s.model_name
+           AND t.template_id = s.template_id
+           AND t.prompt_hash = s.prompt_hash
+        WHEN MATCHED THEN UPDATE SET
+            response = s.response,
+            created_timestamp = CURRENT_TIMESTAMP(),
+            last_hit_timestamp = NULL,
+            hit_count = 0
+        WHEN NOT MATCHED THEN INSERT (model_name, template_id, prompt_hash, response)
+            VALUES (s.model_name, s.template_id, s.prompt_hash, s.response)
+    """, params=[model_name, template_id, prompt_hash, response]).collect()
+
+def auto_map_fields_llm(session, source_table, target_table, tpa, model_name, custom_prompt_id, use_cache, cache_ttl_hours, candidate_top_k):
     """Main function for LLM-based field mapping"""
     
     if not tpa:
@@ -383,22 +780,34 @@ def auto_map_fields_llm(session, source_table, target_table, tpa, model_name, cu
         # Need to qualify - assume BRONZE schema
         full_source_table = f"{database}.BRONZE.{source_table}"
     
+    # Source fields, with their dominant type, come from the ingestion-time
+    # catalog next to the Bronze table. Cell values are never sent to the LLM:
+    # Bordereau rows carry member PII/PHI.
+    catalog_table = f"{full_source_table.rsplit('.', 1)[0]}.SOURCE_FIELD_CATALOG"
     bronze_query = f"""
-        SELECT DISTINCT 
-            f.key as field_name
-        FROM {full_source_table},
-        LATERAL FLATTEN(input => RAW_DATA) f
-        WHERE RAW_DATA IS NOT NULL
-          AND TPA = '{tpa}'
-        LIMIT 1000
+        SELECT 
+            FIELD_NAME,
+            MODE(INFERRED_TYPE) AS INFERRED_TYPE
+        FROM {catalog_table}
+        WHERE TPA = ?
+        GROUP BY FIELD_NAME
+        ORDER BY FIELD_NAME
     """
     
     try:
-        source_fields_df = session.sql(bronze_query).to_pandas()
+        source_fields_df = session.sql(bronze_query, params=[tpa]).to_pandas()
         source_fields = source_fields_df['FIELD_NAME'].tolist()
     except Exception as e:
         return f"Error extracting source fields: {str(e)}"
     
+    # Build source fields description
+    source_fields_desc = []
+    for _, row in source_fields_df.iterrows():
+        desc = row['FIELD_NAME']
+        if row['INFERRED_TYPE']:
+            desc += f" ({row['INFERRED_TYPE']})"
+        source_fields_desc.append(desc)
+    
     if not source_fields:
         return "No source fields found in Bronze table"
     
@@ -442,65 +851,42 @@ def auto_map_fields_llm(session, source_table, target_table, tpa, model_name, cu
     
     prompt_template = prompt_df['TEMPLATE_TEXT'].iloc[0]
     
-    # Format prompt with actual fields
-    prompt = prompt_template.replace(
-        '{source_fields}',
-        '\n'.join([f"- {f}" for f in source_fields])
-    ).replace(
-        '{target_fields}',
-        '\n'.join([f"- {f}" for f in target_fields_desc])
-    )
+    # Optional retrieval stage: shortlist the top-K target columns per source field
+    top = None
+    candidate_msg = ""
+    if candidate_top_k and 0 < int(candidate_top_k) < len(target_fields_desc):
+        target_names = target_fields_df['COLUMN_NAME'].tolist()
+        top, top_scores = shortlist_candidates(source_fields, target_names, int(candidate_top_k))
+        run_id = f"LLM_{uuid.uuid4().hex[:12].upper()}"
+        try:
+            log_candidate_sets(session, run_id, tpa, target_table or '', model_name, source_fields, target_names, top, top_scores)
+        except Exception:
+            pass
+        candidate_msg = f" (top {int(candidate_top_k)} of {len(target_fields_desc)} target candidates per field, audit run {run_id})"
     
-    # Call Cortex AI
-    cortex_query = f"""
-        SELECT SNOWFLAKE.CORTEX.COMPLETE(
-            '{model_name}',
-            ?
-        ) as llm_response
-    """
+    # One prompt per bounded chunk of source fields
+    qualified_targets = [f"{row['TABLE_NAME']}.{row['COLUMN_NAME']}" for _, row in target_fields_df.iterrows()]
+    prompts = build_chunk_prompts(prompt_template, source_fields_desc, target_fields_desc, qualified_targets, top)
     
     try:
-        # Execute LLM call
-        result = session.sql(cortex_query, params=[prompt]).collect()
-        llm_response = result[0]['LLM_RESPONSE']
-        
-        # Parse JSON response - try multiple strategies
-        mappings = None
-        
-        # Strategy 1: Try to parse entire response as JSON
-        try:
-            mappings = json.loads(llm_response)
-        except:
-            pass
-        
-        # Strategy 2: Extract JSON array from response (handle markdown code blocks)
-        if mappings is None:
-            # Remove markdown code blocks
-            cleaned_response = re.sub(r'```json\s*', '', llm_response)
-            cleaned_response = re.sub(r'```\s*', '', cleaned_response)
-            
-            # Try to find JSON array
-            json_match = re.search(r'\[[\s\S]*\]', cleaned_response)
-            if json_match:
-                try:
-                    mappings = json.loads(json_match.group(0))
-                except:
-                    pass
+        chunk_results = complete_prompts(session, model_name, custom_prompt_id, prompts, use_cache, cache_ttl_hours)
         
-        # Strategy 3: Try to find JSON objects and build array
-        if mappings is None:
-            json_objects = re.findall(r'\{[^{}]*\}', llm_response)
-            if json_objects:
-                try:
-                    mappings = [json.loads(obj) for obj in json_objects]
-                except:
-                    pass
-        
-        if mappings is None:
-            return f"Could not parse LLM response as JSON array. Response preview: {llm_response[:500]}"
+        mappings = []
+        chunk_errors = []
+        chunks_cached = 0
+        for chunk_mappings, from_cache, error in chunk_results:
+            if error:
+                chunk_errors.append(error)
+                continue
+            mappings.extend(chunk_mappings)
+            chunks_cached += 1 if from_cache else 0
         
-        if not isinstance(mappings, list):
-            return "LLM response is not a JSON array"
+        # Every chunk failed: surface the first failure as before
+        if len(chunk_errors) == len(prompts):
+            first_error = chunk_errors[0]
+            if first_error.startswith("Could not parse"):
+                return first_error
+            return f"Error calling Cortex AI: {first_error}"
         
         # Validate target_table was provided
         if not target_table:
@@ -516,76 +902,79 @@ def auto_map_fields_llm(session, source_table, target_table, tpa, model_name, cu
         valid_columns_df = session.sql(valid_columns_query).to_pandas()
         valid_columns = set(valid_columns_df['COLUMN_NAME'].str.upper().tolist())
         
-        # Insert mappings into field_mappings table
-        rows_inserted = 0
-        rows_skipped = 0
+        # Collect valid suggestions; malformed entries and unknown columns are rejected
+        suggestions = []
+        rows_rejected = 0
         skipped_columns = []
         
         for mapping in mappings:
-            if not all(k in mapping for k in ['source_field', 'target_field', 'confidence']):
+            if not isinstance(mapping, dict) or not all(k in mapping for k in ['source_field', 'target_field', 'confidence']):
+                rows_rejected += 1
                 continue
             
             # Parse target_field (format: TABLE.COLUMN)
-            target_parts = mapping['target_field'].split('.')
+            target_parts = str(mapping['target_field']).split('.')
             if len(target_parts) != 2:
+                rows_rejected += 1
                 continue
             
             target_table_name = target_parts[0].upper()
             target_column = target_parts[1].upper()
-            source_field = mapping['source_field'].upper()
-            confidence = float(mapping['confidence'])
-            reasoning = mapping.get('reasoning', '')
             
             # Validate that target column exists in target_schemas
             if target_column not in valid_columns:
-                rows_skipped += 1
+                rows_rejected += 1
                 skipped_columns.append(f"{target_column} (suggested by LLM but not in schema)")
                 continue
             
-            # Escape single quotes for SQL
-            source_field_escaped = source_field.replace("'", "''")
-            source_table_escaped = source_table.replace("'", "''")
-            target_table_escaped = target_table_name.replace("'", "''")
-            target_column_escaped = target_column.replace("'", "''")
-            tpa_escaped = tpa.replace("'", "''")
-            reasoning_escaped = reasoning.replace("'", "''")
-            
-            insert_query = f"""
-                INSERT INTO field_mappings (
-                    source_field, source_table, target_table, target_column, tpa,
-                    mapping_method, confidence_score, approved,
-                    description
-                )
-                VALUES (
-                    '{source_field_escaped}',
-                    '{source_table_escaped}',
-                    '{target_table_escaped}',
-                    '{target_column_escaped}',
-                    '{tpa_escaped}',
-                    'LLM_CORTEX',
-                    {confidence},
-                    FALSE,
-                    'LLM: {model_name} - {reasoning_escaped}'
-                )
-            """
-            
             try:
-                session.sql(insert_query).collect()
-                rows_inserted += 1
-            except Exception as e:
-                # Skip duplicates or errors
-                rows_skipped += 1
+                confidence = float(mapping['confidence'])
+            except (TypeError, ValueError):
+                rows_rejected += 1
                 continue
+            
+            suggestions.append({
+                'SOURCE_FIELD': str(mapping['source_field']).upper(),
+                'SOURCE_TABLE': source_table,
+                'TARGET_TABLE': target_table_name,
+                'TARGET_COLUMN': target_column,
+                'TPA': tpa,
+                'MAPPING_METHOD': 'LLM_CORTEX',
+                'CONFIDENCE_SCORE': confidence,
+                'DESCRIPTION': f"LLM: {model_name} - {mapping.get('reasoning', '')}"[:5000]
+            })
+        
+        # Chunks can suggest the same pair; keep the most confident one
+        suggestions_df = pd.DataFrame(suggestions, columns=MAPPING_COLUMNS)
+        deduped_df = (suggestions_df
+                      .sort_values('CONFIDENCE_SCORE', ascending=False)
+                      .drop_duplicates(['TPA', 'TARGET_TABLE', 'TARGET_COLUMN', 'SOURCE_FIELD']))
+        chunk_duplicates = len(suggestions_df) - len(deduped_df)
+        
+        # Write all suggestions to field_mappings in one MERGE
+        valid_df, invalid_count = validate_suggestions(deduped_df)
+        rows_rejected += invalid_count
+        rows_inserted, rows_duplicate = merge_mapping_suggestions(session, valid_df)
+        rows_duplicate += chunk_duplicates
         
         # Build result message
-        result_msg = f"Successfully generated {rows_inserted} LLM-based field mappings using {model_name}"
+        result_msg = (f"Successfully generated {rows_inserted} LLM-based field mappings using {model_name}: "
+                      f"{rows_inserted} inserted, {rows_duplicate} skipped as duplicate, {rows_rejected} rejected")
+        
+        result_msg += candidate_msg
+        if len(prompts) > 1:
+            result_msg += f" ({len(prompts)} prompt chunks)"
+        if chunks_cached == len(prompts):
+            result_msg += " (LLM response served from cache)"
+        elif chunks_cached:
+            result_msg += f" ({chunks_cached} of {len(prompts)} chunk responses cached)"
+        if chunk_errors:
+            result_msg += f". {len(chunk_errors)} of {len(prompts)} prompt chunk(s) failed: {chunk_errors[0][:200]}"
         
-        if rows_skipped > 0:
-            result_msg += f". Skipped {rows_skipped} invalid mappings (columns not in target schema)"
-            if skipped_columns:
-                result_msg += f": {', '.join(skipped_columns[:5])}"
-                if len(skipped_columns) > 5:
-                    result_msg += f" and {len(skipped_columns) - 5} more"
+        if skipped_columns:
+            result_msg += f". Columns not in target schema: {', '.join(skipped_columns[:5])}"
+            if len(skipped_columns) > 5:
+                result_msg += f" and {len(skipped_columns) - 5} more"
         
         return result_msg
         
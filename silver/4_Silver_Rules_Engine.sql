@@ -23,6 +23,19 @@ USE SCHEMA IDENTIFIER($SILVER_SCHEMA_NAME);
 -- ============================================
 -- PROCEDURE: Apply Transformation Rules
 -- ============================================
+-- Set-based rules engine. Active rules for (TPA, table) are ordered by
+-- priority and fused into as few table passes as possible:
+--   - validate: DATA_QUALITY / REFERENTIAL_INTEGRITY predicates
+--               (one counting scan, one quarantine INSERT, one DELETE)
+--   - update:   STANDARDIZATION / BUSINESS_LOGIC assignments
+--               (one counting scan, one multi-column UPDATE)
+--   - dedupe:   DEDUPLICATION on key columns (always its own pass)
+-- Every pass reads and writes only the rows of the given batch (_BATCH_ID).
+-- A dedupe pass picks the most recently loaded row per key across the whole
+-- table but deletes only the batch's losing rows; rows of earlier batches are
+-- left in place even when the batch re-sends their key.
+-- The compiled plan is cached in transformation_rule_plans per rule-set
+-- version. Rows affected per rule go to data_quality_metrics (RULE_<rule_id>).
 
 CREATE OR REPLACE PROCEDURE apply_transformation_rules(
     target_table VARCHAR,
@@ -30,33 +43,297 @@ CREATE OR REPLACE PROCEDURE apply_transformation_rules(
     batch_id VARCHAR
 )
 RETURNS VARCHAR
-LANGUAGE SQL
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'apply_transformation_rules'
 AS
 $$
-DECLARE
-    rules_applied INTEGER DEFAULT 0;
-    result_msg VARCHAR;
-BEGIN
-    -- Log start
-    INSERT INTO silver_processing_log (batch_id, tpa, target_table, processing_type, status)
-    VALUES (:batch_id, :tpa, :target_table, 'RULES_ENGINE', 'STARTED');
-    
-    -- Apply rules (simplified version - production would iterate through rules)
-    -- This is a placeholder for the full rules engine implementation
-    
-    rules_applied := 0;
-    
-    -- Log completion
-    UPDATE silver_processing_log
-    SET status = 'SUCCESS',
-        end_timestamp = CURRENT_TIMESTAMP(),
-        records_processed = :rules_applied
-    WHERE batch_id = :batch_id
-      AND processing_type = 'RULES_ENGINE';
-    
-    result_msg := 'Applied ' || rules_applied || ' transformation rules';
-    RETURN result_msg;
-END;
+import re
+import json
+import hashlib
+
+VALIDATION_TYPES = ('DATA_QUALITY', 'REFERENTIAL_INTEGRITY')
+UPDATE_TYPES = ('STANDARDIZATION', 'BUSINESS_LOGIC')
+REMOVING_ACTIONS = ('REJECT', 'QUARANTINE')
+
+def referenced_columns(expression, columns):
+    """Return the table columns an expression mentions"""
+    tokens = {t.upper() for t in re.findall(r'[A-Za-z_][A-Za-z0-9_$]*', expression)}
+    return tokens & columns
+
+def build_rule_plan(rules, columns):
+    """Group ordered rules into fused passes
+    
+    Consecutive rules of the same kind share a pass. An update rule starts a
+    new pass when it writes or reads a column an earlier rule in the pass
+    writes, so fused UPDATEs keep sequential semantics. Rules that cannot run
+    (unknown column, unparseable derivation) are returned as skipped.
+    """
+    passes = []
+    skipped = []
+    current = None
+    
+    for rule in rules:
+        rule_type = (rule['RULE_TYPE'] or '').upper()
+        logic = (rule['RULE_LOGIC'] or '').strip()
+        entry = {'rule_id': rule['RULE_ID'], 'rule_name': rule['RULE_NAME']}
+        
+        if rule_type in VALIDATION_TYPES:
+            kind = 'validate'
+            entry['predicate'] = logic
+            entry['action'] = (rule['ERROR_ACTION'] or 'REJECT').upper()
+        elif rule_type in UPDATE_TYPES:
+            kind = 'update'
+            derivation = re.match(r'^(.*\S)\s+AS\s+([A-Za-z_][A-Za-z0-9_$]*)\s*$', logic, re.IGNORECASE | re.DOTALL)
+            if derivation:
+                entry['expression'], column = derivation.group(1), derivation.group(2)
+            else:
+                entry['expression'], column = logic, rule['TARGET_COLUMN']
+            if not column or column.upper() not in columns:
+                skipped.append({'rule_id': rule['RULE_ID'], 'reason': f"target column {column or '(none)'} not in table"})
+                continue
+            entry['column'] = column.upper()
+        elif rule_type == 'DEDUPLICATION':
+            kind = 'dedupe'
+            keys = [k.strip().upper() for k in logic.split(',') if k.strip()]
+            missing = [k for k in keys if k not in columns]
+            if not keys or missing:
+                skipped.append({'rule_id': rule['RULE_ID'], 'reason': f"unknown key column(s) {', '.join(missing) or '(none)'}"})
+                continue
+            entry['keys'] = keys
+        else:
+            skipped.append({'rule_id': rule['RULE_ID'], 'reason': f"unsupported rule type {rule_type}"})
+            continue
+        
+        fuse = current is not None and current['kind'] == kind and kind != 'dedupe'
+        if fuse and kind == 'update':
+            written = {r['column'] for r in current['rules']}
+            if entry['column'] in written or referenced_columns(entry['expression'], columns) & written:
+                fuse = False
+        
+        if not fuse:
+            current = {'kind': kind, 'rules': []}
+            passes.append(current)
+        current['rules'].append(entry)
+    
+    return {'passes': passes, 'skipped': skipped}
+
+def get_rule_plan(session, tpa, target_table, columns):
+    """Load active rules and return the compiled plan, reusing the cached plan for this rule-set version"""
+    rules = session.sql("""
+        SELECT rule_id, rule_name, rule_type, target_column, rule_logic, error_action, priority
+        FROM transformation_rules
+        WHERE tpa = ?
+          AND UPPER(target_table) = ?
+          AND active = TRUE
+        ORDER BY priority, rule_id
+    """, params=[tpa, target_table.upper()]).collect()
+    
+    if not rules:
+        return None, None
+    
+    version_key = json.dumps([[str(r[k]) for k in ('RULE_ID', 'RULE_TYPE', 'TARGET_COLUMN', 'RULE_LOGIC', 'ERROR_ACTION', 'PRIORITY')] for r in rules] + [sorted(columns)])
+    ruleset_hash = hashlib.sha256(version_key.encode('utf-8')).hexdigest()
+    
+    cached = session.sql("""
+        SELECT plan
+        FROM transformation_rule_plans
+        WHERE tpa = ?
+          AND target_table = ?
+          AND ruleset_hash = ?
+    """, params=[tpa, target_table.upper(), ruleset_hash]).collect()
+    if cached:
+        return json.loads(cached[0]['PLAN']), ruleset_hash
+    
+    plan = build_rule_plan(rules, columns)
+    session.sql("""
+        MERGE INTO transformation_rule_plans p
+        USING (SELECT ? AS tpa, ? AS target_table, ? AS ruleset_hash, PARSE_JSON(?) AS plan, ? AS rule_count) s
+        ON p.tpa = s.tpa AND p.target_table = s.target_table
+        WHEN MATCHED THEN UPDATE SET
+            ruleset_hash = s.ruleset_hash,
+            plan = s.plan,
+            rule_count = s.rule_count,
+            compiled_timestamp = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (tpa, target_table, ruleset_hash, plan, rule_count)
+            VALUES (s.tpa, s.target_table, s.ruleset_hash, s.plan, s.rule_count)
+    """, params=[tpa, target_table.upper(), ruleset_hash, json.dumps(plan), len(rules)]).collect()
+    return plan, ruleset_hash
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def run_validate_pass(session, physical_table, target_table, tpa, batch_id, rules):
+    """One counting scan; quarantine and delete failing rows in one statement each"""
+    scope = "_BATCH_ID = ?"
+    failed = [f"NOT ({r['predicate']})" for r in rules]
+    
+    counts_row = session.sql(f"""
+        SELECT {', '.join(f'COUNT_IF({cond}) AS R{i}' for i, cond in enumerate(failed))}
+        FROM {physical_table}
+        WHERE {scope}
+    """, params=[batch_id]).collect()[0]
+    counts = {r['rule_id']: counts_row[f'R{i}'] or 0 for i, r in enumerate(rules)}
+    
+    quarantine = [(r, cond) for r, cond in zip(rules, failed) if r['action'] == 'QUARANTINE' and counts[r['rule_id']]]
+    if quarantine:
+        failure_flags = ', '.join(
+            f"IFF({cond}, OBJECT_CONSTRUCT('rule_id', {sql_literal(r['rule_id'])}, 'rule_name', {sql_literal(r['rule_name'])}), NULL)"
+            for r, cond in quarantine
+        )
+        session.sql(f"""
+            INSERT INTO quarantine_records (batch_id, tpa, source_table, target_table, record_data, rule_id, rule_name, failure_reason)
+            SELECT ?, ?, ?, ?, s.record_data,
+                   f.value:rule_id::VARCHAR, f.value:rule_name::VARCHAR,
+                   'Failed rule: ' || f.value:rule_name::VARCHAR
+            FROM (
+                SELECT OBJECT_CONSTRUCT(*) AS record_data,
+                       ARRAY_CONSTRUCT_COMPACT({failure_flags}) AS failures
+                FROM {physical_table}
+                WHERE {scope}
+                  AND ({' OR '.join(cond for _, cond in quarantine)})
+            ) s,
+            LATERAL FLATTEN(input => s.failures) f
+        """, params=[batch_id, tpa, physical_table, target_table, batch_id]).collect()
+    
+    removing = [cond for r, cond in zip(rules, failed) if r['action'] in REMOVING_ACTIONS and counts[r['rule_id']]]
+    if removing:
+        session.sql(f"""
+            DELETE FROM {physical_table}
+            WHERE {scope}
+              AND ({' OR '.join(removing)})
+        """, params=[batch_id]).collect()
+    
+    return counts
+
+def run_update_pass(session, physical_table, batch_id, rules):
+    """One counting scan; one UPDATE assigning every rule's column, touching only rows that change"""
+    changed = [f"NOT EQUAL_NULL({r['column']}, {r['expression']})" for r in rules]
+    
+    counts_row = session.sql(f"""
+        SELECT {', '.join(f'COUNT_IF({cond}) AS R{i}' for i, cond in enumerate(changed))}
+        FROM {physical_table}
+        WHERE _BATCH_ID = ?
+    """, params=[batch_id]).collect()[0]
+    counts = {r['rule_id']: counts_row[f'R{i}'] or 0 for i, r in enumerate(rules)}
+    
+    if any(counts.values()):
+        session.sql(f"""
+            UPDATE {physical_table}
+            SET {', '.join(f"{r['column']} = {r['expression']}" for r in rules)}
+            WHERE _BATCH_ID = ?
+              AND ({' OR '.join(changed)})
+        """, params=[batch_id]).collect()
+    
+    return counts
+
+def run_dedupe_pass(session, physical_table, batch_id, rule):
+    """Delete the batch's rows that are not the most recently loaded row for their key
+    
+    The winner is chosen across the whole table, but only rows of this batch
+    are deleted: rows loaded by other batches are never touched.
+    """
+    keys = ', '.join(rule['keys'])
+    result = session.sql(f"""
+        DELETE FROM {physical_table}
+        WHERE _BATCH_ID = ?
+          AND _RECORD_ID IN (
+            SELECT _RECORD_ID
+            FROM {physical_table}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY _LOAD_TIMESTAMP DESC, _RECORD_ID DESC) > 1
+        )
+    """, params=[batch_id]).collect()
+    return {rule['rule_id']: (result[0][0] if result else 0) or 0}
+
+def apply_transformation_rules(session, target_table, tpa, batch_id):
+    """Apply active transformation rules to the rows of a Silver batch"""
+    
+    physical_table = f"{tpa.upper()}_{target_table.upper()}"
+    
+    # Log start
+    session.sql("""
+        INSERT INTO silver_processing_log (batch_id, tpa, target_table, processing_type, status)
+        VALUES (?, ?, ?, 'RULES_ENGINE', 'STARTED')
+    """, params=[batch_id, tpa, target_table]).collect()
+    
+    try:
+        columns = {row['COLUMN_NAME'].upper() for row in session.sql("""
+            SELECT column_name
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE table_schema = CURRENT_SCHEMA()
+              AND table_name = ?
+        """, params=[physical_table]).collect()}
+        
+        if not columns:
+            raise Exception(f"Table {physical_table} does not exist")
+        
+        plan, ruleset_hash = get_rule_plan(session, tpa, target_table, columns)
+        
+        rule_counts = {}
+        if plan:
+            for rule_pass in plan['passes']:
+                if rule_pass['kind'] == 'validate':
+                    rule_counts.update(run_validate_pass(session, physical_table, target_table, tpa, batch_id, rule_pass['rules']))
+                elif rule_pass['kind'] == 'update':
+                    rule_counts.update(run_update_pass(session, physical_table, batch_id, rule_pass['rules']))
+                else:
+                    rule_counts.update(run_dedupe_pass(session, physical_table, batch_id, rule_pass['rules'][0]))
+        
+        # Rows affected per rule
+        if rule_counts:
+            metric_rows = []
+            params = []
+            for rule_pass in plan['passes']:
+                for rule in rule_pass['rules']:
+                    metric_rows.append("(?, ?, ?, ?, ?, 0, ?, ?)")
+                    params += [
+                        batch_id, tpa, physical_table, f"RULE_{rule['rule_id']}", rule_counts[rule['rule_id']],
+                        rule_pass['kind'] != 'validate' or rule_counts[rule['rule_id']] == 0,
+                        f"{rule['rule_name']} ({rule_pass['kind']} pass): {rule_counts[rule['rule_id']]} row(s) affected"
+                    ]
+            session.sql(f"""
+                INSERT INTO data_quality_metrics
+                    (batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description)
+                VALUES {', '.join(metric_rows)}
+            """, params=params).collect()
+        
+        rows_affected = sum(rule_counts.values())
+        skipped = plan['skipped'] if plan else []
+        
+        # Log completion
+        session.sql("""
+            UPDATE silver_processing_log
+            SET status = 'SUCCESS',
+                end_timestamp = CURRENT_TIMESTAMP(),
+                records_processed = ?,
+                error_message = ?
+            WHERE batch_id = ?
+              AND processing_type = 'RULES_ENGINE'
+        """, params=[
+            rows_affected,
+            '; '.join(f"{s['rule_id']} skipped: {s['reason']}" for s in skipped)[:5000] or None,
+            batch_id
+        ]).collect()
+        
+        if not plan:
+            return "Applied 0 transformation rules (no active rules)"
+        
+        per_rule = ', '.join(f"{rule_id}={count}" for rule_id, count in rule_counts.items())
+        skipped_msg = f", skipped {len(skipped)}" if skipped else ""
+        return f"Applied {len(rule_counts)} transformation rules in {len(plan['passes'])} pass(es){skipped_msg}; rows affected: {per_rule}"
+        
+    except Exception as e:
+        session.sql("""
+            UPDATE silver_processing_log
+            SET status = 'FAILED',
+                end_timestamp = CURRENT_TIMESTAMP(),
+                error_message = ?
+            WHERE batch_id = ?
+              AND processing_type = 'RULES_ENGINE'
+        """, params=[str(e)[:5000], batch_id]).collect()
+        
+        return f"ERROR: {str(e)}"
 $$;
 
 -- ============================================
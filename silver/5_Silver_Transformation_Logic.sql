@@ -34,8 +34,858 @@ PACKAGES = ('snowflake-snowpark-python')
 HANDLER = 'transform_bronze_to_silver'
 AS
 $$
+def get_watermark(session, source_table, target_table, tpa):
+    """Return (last_processed_id, last_processed_timestamp) for a TPA/table, or (0, None)"""
+    result = session.sql("""
+        SELECT last_processed_id, last_processed_timestamp
+        FROM processing_watermarks
+        WHERE source_table = ?
+          AND target_table = ?
+          AND tpa = ?
+    """, params=[source_table, target_table, tpa]).collect()
+    
+    if result and result[0]['LAST_PROCESSED_ID'] is not None:
+        return result[0]['LAST_PROCESSED_ID'], result[0]['LAST_PROCESSED_TIMESTAMP']
+    return 0, None
+
+def advance_watermark(session, source_table, target_table, tpa, last_id, last_timestamp):
+    """Upsert the high-water mark (call inside the same transaction as the MERGE)
+    
+    The mark never moves backwards: chunks re-read from the overlap below it
+    (see watermark_start) end below the stored values.
+    """
+    session.sql("""
+        MERGE INTO processing_watermarks w
+        USING (
+            SELECT ? AS source_table, ? AS target_table, ? AS tpa,
+                   ? AS last_processed_id, TRY_TO_TIMESTAMP_NTZ(?) AS last_processed_timestamp
+        ) s
+        ON w.source_table = s.source_table
+           AND w.target_table = s.target_table
+           AND w.tpa = s.tpa
+        WHEN MATCHED THEN UPDATE SET
+            last_processed_id = GREATEST(w.last_processed_id, s.last_processed_id),
+            last_processed_timestamp = GREATEST(
+                COALESCE(w.last_processed_timestamp, s.last_processed_timestamp),
+                COALESCE(s.last_processed_timestamp, w.last_processed_timestamp)
+            ),
+            updated_timestamp = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (source_table, target_table, tpa, last_processed_id, last_processed_timestamp)
+            VALUES (s.source_table, s.target_table, s.tpa, s.last_processed_id, s.last_processed_timestamp)
+    """, params=[
+        source_table, target_table, tpa, last_id,
+        str(last_timestamp) if last_timestamp is not None else None
+    ]).collect()
+
+# RECORD_ID is AUTOINCREMENT, which is not commit-ordered: a load that commits
+# late can land IDs below a watermark already advanced by a faster load.
+# Incremental runs therefore re-read every row loaded within this many minutes
+# before the watermark's LOAD_TIMESTAMP; the MERGE skips rows whose _ROW_HASH
+# is unchanged, so the overlap is idempotent.
+WATERMARK_LAG_MINUTES = 60
+
+def watermark_start(session, source_ref, tpa, last_id, last_timestamp):
+    """Return the RECORD_ID an incremental run starts after
+    
+    This is the watermark minus the overlap: just below the lowest RECORD_ID
+    at or under the watermark loaded within WATERMARK_LAG_MINUTES of the
+    watermark's LOAD_TIMESTAMP.
+    """
+    if not last_id or last_timestamp is None:
+        return last_id or 0
+    result = session.sql(f"""
+        SELECT MIN(RECORD_ID) AS min_id
+        FROM {source_ref}
+        WHERE TPA = ?
+          AND RAW_DATA IS NOT NULL
+          AND RECORD_ID <= ?
+          AND LOAD_TIMESTAMP >= DATEADD(minute, ?, TRY_TO_TIMESTAMP_NTZ(?))
+    """, params=[tpa, last_id, -WATERMARK_LAG_MINUTES, str(last_timestamp)]).collect()
+    min_id = result[0]['MIN_ID'] if result else None
+    return min(last_id, min_id - 1) if min_id is not None else last_id
+
+# An unfinished run whose checkpoint has not moved for this long is treated
+# as dead and may be resumed; a younger one may still be merging chunks
+RESUME_STALE_MINUTES = 60
+
+def get_resume_checkpoint(session, tpa, target_table, current_batch_id, run_mode, plan_hash):
+    """Claim the checkpoint of the latest unfinished run of this mode for this TPA/table
+    
+    Returns (batch_id, last_record_id), or None if there is nothing to resume.
+    Only runs of the same run_mode and plan_hash are considered: an
+    incremental run's checkpoint sits above the watermark, and rows below a
+    checkpoint taken with another plan were merged with other expressions.
+    A FAILED run is resumable; an IN_PROGRESS one only once its heartbeat is
+    older than RESUME_STALE_MINUTES, so a live run is never taken over. The
+    claim (status -> RESUMED) is conditional on the status read here, so two
+    concurrent runs cannot both resume the same checkpoint.
+    """
+    result = session.sql("""
+        SELECT batch_id, status, last_record_id, plan_hash,
+               COALESCE(heartbeat_timestamp, start_timestamp) < DATEADD('minute', ?, CURRENT_TIMESTAMP()) AS stale
+        FROM silver_processing_log
+        WHERE tpa = ?
+          AND UPPER(target_table) = ?
+          AND processing_type = 'TRANSFORMATION'
+          AND run_mode = ?
+          AND batch_id <> ?
+        ORDER BY start_timestamp DESC
+        LIMIT 1
+    """, params=[-RESUME_STALE_MINUTES, tpa, target_table.upper(), run_mode, current_batch_id]).collect()
+    
+    if not result or (result[0]['LAST_RECORD_ID'] or 0) <= 0 or result[0]['PLAN_HASH'] != plan_hash:
+        return None
+    run = result[0]
+    if not (run['STATUS'] == 'FAILED' or (run['STATUS'] == 'IN_PROGRESS' and run['STALE'])):
+        return None
+    
+    claimed = session.sql("""
+        UPDATE silver_processing_log
+        SET status = 'RESUMED',
+            end_timestamp = CURRENT_TIMESTAMP(),
+            error_message = ?
+        WHERE batch_id = ?
+          AND processing_type = 'TRANSFORMATION'
+          AND status = ?
+    """, params=[f"Resumed by {current_batch_id}", run['BATCH_ID'], run['STATUS']]).collect()
+    if not claimed or not claimed[0][0]:
+        return None
+    return run['BATCH_ID'], run['LAST_RECORD_ID']
+
+def update_progress(session, batch_id, status, records_total, last_record_id, chunks_completed, counts):
+    """Checkpoint chunk progress on the run's silver_processing_log row
+    
+    counts holds cumulative 'inserted', 'updated' and 'unchanged' row counts.
+    """
+    session.sql(f"""
+        UPDATE silver_processing_log
+        SET status = '{status}',
+            records_total = {records_total},
+            last_record_id = {last_record_id},
+            chunks_completed = {chunks_completed},
+            records_processed = {counts['inserted'] + counts['updated']},
+            records_inserted = {counts['inserted']},
+            records_updated = {counts['updated']},
+            records_unchanged = {counts['unchanged']},
+            heartbeat_timestamp = CURRENT_TIMESTAMP()
+        WHERE batch_id = '{batch_id}'
+          AND processing_type = 'TRANSFORMATION'
+    """).collect()
+
+def merge_counts(merge_result):
+    """Return (rows_inserted, rows_updated) from a MERGE result"""
+    if not merge_result:
+        return 0, 0
+    result_row = merge_result[0].as_dict()
+    counts = {k.lower(): v for k, v in result_row.items()}
+    return counts.get('number of rows inserted', 0) or 0, counts.get('number of rows updated', 0) or 0
+
+# Bump when compile_transformation_logic accepts or emits something different,
+# so fragments in mapping_expression_cache are recompiled
+LOGIC_COMPILER_VERSION = 2
+
+class TransformationLogicError(Exception):
+    """Raised when field_mappings.transformation_logic cannot be compiled"""
+    pass
+
+# Whitelisted transformation functions: name -> (min_args, max_args, result_type)
+# max_args None = variadic. Result type 'arg' = type of the first argument.
+LOGIC_FUNCTIONS = {
+    'TRIM': (1, 2, 'text'), 'LTRIM': (1, 2, 'text'), 'RTRIM': (1, 2, 'text'),
+    'UPPER': (1, 1, 'text'), 'LOWER': (1, 1, 'text'), 'INITCAP': (1, 1, 'text'),
+    'SUBSTR': (2, 3, 'text'), 'SUBSTRING': (2, 3, 'text'),
+    'REPLACE': (2, 3, 'text'), 'LPAD': (2, 3, 'text'), 'RPAD': (2, 3, 'text'),
+    'CONCAT': (1, None, 'text'),
+    'REGEXP_REPLACE': (2, 3, 'text'), 'REGEX_REPLACE': (2, 3, 'text'),
+    'REGEXP_SUBSTR': (2, 2, 'text'), 'REGEX_EXTRACT': (2, 2, 'text'),
+    'LOOKUP': (3, None, 'text'),
+    'COALESCE': (1, None, 'arg'), 'NULLIF': (2, 2, 'arg'),
+    'TO_DATE': (1, 2, 'date'), 'DATE_PARSE': (1, 2, 'date'), 'PARSE_DATE': (1, 2, 'date'),
+    'TO_TIMESTAMP': (1, 2, 'timestamp'),
+    'TO_NUMBER': (1, 3, 'number'), 'TO_DECIMAL': (1, 3, 'number'),
+    'ROUND': (1, 2, 'number'), 'ABS': (1, 1, 'number'),
+}
+
+def tokenize_logic(logic):
+    """Split transformation logic into (kind, value) tokens"""
+    tokens = []
+    i = 0
+    while i < len(logic):
+        ch = logic[i]
+        if ch.isspace():
+            i += 1
+        elif ch == "'":
+            j = i + 1
+            value = ''
+            while True:
+                if j >= len(logic):
+                    raise TransformationLogicError(f"Unterminated string literal at position {i}")
+                if logic[j] == "'":
+                    if j + 1 < len(logic) and logic[j + 1] == "'":
+                        value += "'"
+                        j += 2
+                        continue
+                    break
+                value += logic[j]
+                j += 1
+            tokens.append(('string', value))
+            i = j + 1
+        elif ch == '"':
+            j = logic.find('"', i + 1)
+            if j == -1:
+                raise TransformationLogicError(f"Unterminated quoted field name at position {i}")
+            tokens.append(('field', logic[i + 1:j]))
+            i = j + 1
+        elif ch.isdigit() or (ch == '.' and i + 1 < len(logic) and logic[i + 1].isdigit()):
+            j = i
+            while j < len(logic) and (logic[j].isdigit() or logic[j] == '.'):
+                j += 1
+            number = logic[i:j]
+            if number.count('.') > 1:
+                raise TransformationLogicError(f"Invalid number '{number}'")
+            tokens.append(('number', number))
+            i = j
+        elif ch.isalpha() or ch == '_':
+            j = i
+            while j < len(logic) and (logic[j].isalnum() or logic[j] in '_$'):
+                j += 1
+            tokens.append(('name', logic[i:j]))
+            i = j
+        elif logic.startswith('||', i):
+            tokens.append(('op', '||'))
+            i += 2
+        elif ch in '+-*/(),':
+            tokens.append(('op', ch))
+            i += 1
+        else:
+            raise TransformationLogicError(f"Unexpected character '{ch}' at position {i}")
+    return tokens
+
+def compile_transformation_logic(logic, date_formats):
+    """Compile transformation logic into a Snowflake column expression
+    
+    Grammar: field names (bare or "quoted"), 'string' and numeric literals,
+    + - * / and || operators, parentheses, and the LOGIC_FUNCTIONS whitelist.
+    Field names refer to keys of RAW_DATA. Conversions compile to TRY_*
+    functions so one bad value never fails the MERGE.
+    
+    Returns {'sql', 'type', 'check'} where type is text/number/date/timestamp and
+    check is the text input whose non-blank value should yield a non-NULL result.
+    """
+    tokens = tokenize_logic(logic)
+    pos = [0]
+    
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else (None, None)
+    
+    def at_op(*ops):
+        return peek()[0] == 'op' and peek()[1] in ops
+    
+    def take(expected=None):
+        token = peek()
+        if token[0] is None or (expected and token != ('op', expected)):
+            raise TransformationLogicError(f"Expected '{expected}'" if expected else "Unexpected end of expression")
+        pos[0] += 1
+        return token
+    
+    def as_text(node):
+        return node['sql'] if node['type'] == 'text' else f"({node['sql']})::VARCHAR"
+    
+    def as_number(node):
+        if node['type'] == 'number':
+            return node['sql']
+        if node['type'] == 'text':
+            return f"TRY_TO_DOUBLE({node['sql']})"
+        raise TransformationLogicError(f"Arithmetic is not supported on {node['type']} values")
+    
+    def literal_string(node, what):
+        if not node.get('literal'):
+            raise TransformationLogicError(f"{what} must be a string literal")
+        return node['sql']
+    
+    def literal_integer(node, what, minimum=None, maximum=None):
+        # Snowflake only accepts constants here; an expression would compile
+        # but fail when the MERGE runs
+        if not (node.get('literal') and node['type'] == 'number' and node['sql'].lstrip('-').isdigit()):
+            raise TransformationLogicError(f"{what} must be an integer literal")
+        value = int(node['sql'])
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise TransformationLogicError(f"{what} must be between {minimum} and {maximum}, got {value}")
+        return str(value)
+    
+    def parse_expression():
+        node = parse_term()
+        while at_op('+', '-', '||'):
+            op = take()[1]
+            right = parse_term()
+            if op == '||':
+                node = {'sql': f"{as_text(node)} || {as_text(right)}", 'type': 'text'}
+            else:
+                node = {'sql': f"{as_number(node)} {op} {as_number(right)}", 'type': 'number'}
+        return node
+    
+    def parse_term():
+        node = parse_unary()
+        while at_op('*', '/'):
+            op = take()[1]
+            right = parse_unary()
+            node = {'sql': f"{as_number(node)} {op} {as_number(right)}", 'type': 'number'}
+        return node
+    
+    def parse_unary():
+        if at_op('-'):
+            take()
+            operand = parse_unary()
+            if operand.get('literal') and operand['type'] == 'number':
+                return {'sql': f"-{operand['sql']}", 'type': 'number', 'literal': True}
+            return {'sql': f"-{as_number(operand)}", 'type': 'number'}
+        return parse_primary()
+    
+    def parse_primary():
+        kind, value = take()
+        if kind == 'op' and value == '(':
+            node = parse_expression()
+            take(')')
+            return {'sql': f"({node['sql']})", 'type': node['type'], 'check': node.get('check')}
+        if kind == 'string':
+            escaped = value.replace("'", "''")
+            return {'sql': f"'{escaped}'", 'type': 'text', 'literal': True}
+        if kind == 'number':
+            return {'sql': value, 'type': 'number', 'literal': True}
+        if kind == 'field':
+            return {'sql': f'RAW_DATA:"{value}"::VARCHAR', 'type': 'text'}
+        if kind == 'name':
+            if at_op('('):
+                return parse_call(value.upper())
+            if value.upper() == 'NULL':
+                return {'sql': 'NULL', 'type': 'text'}
+            return {'sql': f"RAW_DATA:{value}::VARCHAR", 'type': 'text'}
+        raise TransformationLogicError(f"Unexpected '{value}'")
+    
+    def parse_call(name):
+        if name not in LOGIC_FUNCTIONS:
+            raise TransformationLogicError(f"Unsupported function {name}()")
+        take('(')
+        args = []
+        if not at_op(')'):
+            args.append(parse_expression())
+            while at_op(','):
+                take()
+                args.append(parse_expression())
+        take(')')
+        
+        min_args, max_args, result_type = LOGIC_FUNCTIONS[name]
+        if len(args) < min_args or (max_args is not None and len(args) > max_args):
+            raise TransformationLogicError(f"{name}() takes {min_args}{'+' if max_args is None else '' if max_args == min_args else f'-{max_args}'} argument(s), got {len(args)}")
+        
+        if name in ('TO_DATE', 'DATE_PARSE', 'PARSE_DATE', 'TO_TIMESTAMP'):
+            func = 'TRY_TO_DATE' if result_type == 'date' else 'TRY_TO_TIMESTAMP_NTZ'
+            text = as_text(args[0])
+            formats = [literal_string(args[1], f"{name}() format")] if len(args) == 2 else [f"'{fmt}'" for fmt in date_formats]
+            attempts = [f"{func}({text}, {fmt})" for fmt in formats]
+            if len(args) == 1:
+                attempts.append(f"{func}({text})")
+            sql = attempts[0] if len(attempts) == 1 else f"COALESCE({', '.join(attempts)})"
+            return {'sql': sql, 'type': result_type, 'check': text}
+        if name in ('TO_NUMBER', 'TO_DECIMAL'):
+            if len(args) == 2:
+                raise TransformationLogicError(f"{name}() takes a value, or a value with precision and scale")
+            text = as_text(args[0])
+            extra = ''
+            if len(args) == 3:
+                precision = literal_integer(args[1], f"{name}() precision", 1, 38)
+                extra = f", {precision}, {literal_integer(args[2], f'{name}() scale', 0, int(precision))}"
+            return {'sql': f"TRY_TO_NUMBER({text}{extra})", 'type': 'number', 'check': text}
+        if name == 'ROUND':
+            scale = ''.join(f", {literal_integer(arg, 'ROUND() scale', -38, 38)}" for arg in args[1:])
+            return {'sql': f"ROUND({as_number(args[0])}{scale})", 'type': 'number'}
+        if name == 'ABS':
+            return {'sql': f"ABS({as_number(args[0])})", 'type': 'number'}
+        if name == 'LOOKUP':
+            if len(args) % 2 == 0:
+                pairs, default = args[1:-1], args[-1]
+            else:
+                pairs, default = args[1:], None
+            for arg in pairs:
+                if not arg.get('literal'):
+                    raise TransformationLogicError("LOOKUP() keys and values must be literals")
+            parts = [as_text(args[0])] + [as_text(arg) for arg in pairs]
+            if default is not None:
+                parts.append(as_text(default))
+            return {'sql': f"DECODE({', '.join(parts)})", 'type': 'text'}
+        if name in ('REGEXP_REPLACE', 'REGEX_REPLACE', 'REGEXP_SUBSTR', 'REGEX_EXTRACT'):
+            func = 'REGEXP_REPLACE' if 'REPLACE' in name else 'REGEXP_SUBSTR'
+            pattern = literal_string(args[1], f"{name}() pattern")
+            rest = ''.join(f", {as_text(arg)}" for arg in args[2:])
+            return {'sql': f"{func}({as_text(args[0])}, {pattern}{rest})", 'type': 'text'}
+        if name in ('SUBSTR', 'SUBSTRING'):
+            rest = f", {literal_integer(args[1], f'{name}() position')}"
+            rest += ''.join(f", {literal_integer(arg, f'{name}() length', 0)}" for arg in args[2:])
+            return {'sql': f"{name}({as_text(args[0])}{rest})", 'type': 'text'}
+        if name in ('LPAD', 'RPAD'):
+            rest = f", {literal_integer(args[1], f'{name}() length', 0)}"
+            rest += ''.join(f", {as_text(arg)}" for arg in args[2:])
+            return {'sql': f"{name}({as_text(args[0])}{rest})", 'type': 'text'}
+        if result_type == 'arg':
+            types = {arg['type'] for arg in args if arg['sql'] != 'NULL'}
+            if len(types) <= 1:
+                arg_type = types.pop() if types else 'text'
+                return {'sql': f"{name}({', '.join(arg['sql'] for arg in args)})", 'type': arg_type}
+            return {'sql': f"{name}({', '.join(as_text(arg) for arg in args)})", 'type': 'text'}
+        return {'sql': f"{name}({', '.join(as_text(arg) for arg in args)})", 'type': 'text'}
+    
+    if not tokens:
+        raise TransformationLogicError("Empty transformation logic")
+    node = parse_expression()
+    if pos[0] != len(tokens):
+        raise TransformationLogicError(f"Unexpected '{tokens[pos[0]][1]}' after expression")
+    return {'sql': node['sql'], 'type': node['type'], 'check': node.get('check')}
+
+def compile_mappings(session, mappings, date_formats):
+    """Compile each mapping's transformation_logic, reusing mapping_expression_cache
+    
+    Fragments are cached per mapping version: (mapping_id, logic_hash), where the
+    hash covers the source field, the logic and the date formats it was compiled
+    with. Raises TransformationLogicError listing every mapping that fails.
+    """
+    import hashlib
+    
+    logic_mappings = [row for row in mappings if row['TRANSFORMATION_LOGIC'] and row['TRANSFORMATION_LOGIC'].strip()]
+    if not logic_mappings:
+        return {}
+    
+    def logic_hash(row):
+        key = '|'.join([str(LOGIC_COMPILER_VERSION), row['SOURCE_FIELD'], row['TRANSFORMATION_LOGIC'].strip()] + date_formats)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    mapping_ids = [row['MAPPING_ID'] for row in logic_mappings]
+    cached = {}
+    for row in session.sql(f"""
+        SELECT mapping_id, logic_hash, compiled_expression, result_type, check_expression
+        FROM mapping_expression_cache
+        WHERE mapping_id IN ({', '.join(['?'] * len(mapping_ids))})
+          AND compile_error IS NULL
+    """, params=mapping_ids).collect():
+        cached[row['MAPPING_ID']] = row
+    
+    compiled = {}
+    new_entries = []
+    errors = []
+    for row in logic_mappings:
+        mapping_id = row['MAPPING_ID']
+        version = logic_hash(row)
+        hit = cached.get(mapping_id)
+        if hit and hit['LOGIC_HASH'] == version:
+            compiled[mapping_id] = {'sql': hit['COMPILED_EXPRESSION'], 'type': hit['RESULT_TYPE'], 'check': hit['CHECK_EXPRESSION']}
+            continue
+        try:
+            node = compile_transformation_logic(row['TRANSFORMATION_LOGIC'].strip(), date_formats)
+            compiled[mapping_id] = node
+            new_entries.append([mapping_id, version, node['sql'], node['type'], node['check'], None])
+        except TransformationLogicError as e:
+            errors.append(f"mapping {mapping_id} ({row['SOURCE_FIELD']} -> {row['TARGET_COLUMN']}): {e}")
+            new_entries.append([mapping_id, version, None, None, None, str(e)[:5000]])
+    
+    if new_entries:
+        session.sql(f"""
+            MERGE INTO mapping_expression_cache c
+            USING (
+                SELECT column1 AS mapping_id, column2 AS logic_hash, column3 AS compiled_expression,
+                       column4 AS result_type, column5 AS check_expression, column6 AS compile_error
+                FROM VALUES {', '.join(['(?, ?, ?, ?, ?, ?)'] * len(new_entries))}
+            ) s
+            ON c.mapping_id = s.mapping_id
+            WHEN MATCHED THEN UPDATE SET
+                logic_hash = s.logic_hash,
+                compiled_expression = s.compiled_expression,
+                result_type = s.result_type,
+                check_expression = s.check_expression,
+                compile_error = s.compile_error,
+                compiled_timestamp = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (mapping_id, logic_hash, compiled_expression, result_type, check_expression, compile_error)
+                VALUES (s.mapping_id, s.logic_hash, s.compiled_expression, s.result_type, s.check_expression, s.compile_error)
+        """, params=[value for entry in new_entries for value in entry]).collect()
+    
+    if errors:
+        raise TransformationLogicError("Invalid transformation_logic: " + "; ".join(errors))
+    return compiled
+
+def get_date_formats(session, tpa):
+    """Return the TPA's date formats in priority order, falling back to the DEFAULT set"""
+    result = session.sql("""
+        SELECT tpa, date_format
+        FROM tpa_date_formats
+        WHERE tpa IN (?, 'DEFAULT')
+          AND active = TRUE
+        ORDER BY priority, date_format
+    """, params=[tpa]).collect()
+    
+    tpa_formats = [row['DATE_FORMAT'] for row in result if row['TPA'] == tpa]
+    return tpa_formats or [row['DATE_FORMAT'] for row in result if row['TPA'] == 'DEFAULT']
+
+def get_column_types(session, target_table):
+    """Return ({COLUMN_NAME: DATA_TYPE}, [required COLUMN_NAMEs]) from target_schemas for a target table"""
+    result = session.sql("""
+        SELECT column_name, data_type, nullable
+        FROM target_schemas
+        WHERE UPPER(table_name) = ?
+          AND active = TRUE
+    """, params=[target_table.upper()]).collect()
+    column_types = {row['COLUMN_NAME'].upper(): row['DATA_TYPE'].upper() for row in result}
+    required_columns = sorted(row['COLUMN_NAME'].upper() for row in result if row['NULLABLE'] is False)
+    return column_types, required_columns
+
+def typed_extract(raw_expr, data_type, date_formats):
+    """Build a typed, non-failing extraction of a VARCHAR expression for a target data type
+    
+    Returns raw_expr unchanged for character types (no cast can fail).
+    """
+    if not data_type:
+        return raw_expr
+    
+    base_type = data_type.split('(')[0].strip()
+    
+    if base_type in ('VARCHAR', 'STRING', 'TEXT', 'CHAR', 'CHARACTER', 'NCHAR', 'NVARCHAR'):
+        return raw_expr
+    if base_type in ('NUMBER', 'NUMERIC', 'DECIMAL'):
+        if '(' in data_type:
+            precision_scale = data_type[data_type.index('(') + 1:data_type.rindex(')')]
+            return f"TRY_TO_NUMBER({raw_expr}, {precision_scale})"
+        return f"TRY_TO_NUMBER({raw_expr})"
+    if base_type in ('INT', 'INTEGER', 'BIGINT', 'SMALLINT', 'TINYINT', 'BYTEINT'):
+        return f"TRY_TO_NUMBER({raw_expr})"
+    if base_type in ('FLOAT', 'FLOAT4', 'FLOAT8', 'DOUBLE', 'REAL') or base_type.startswith('DOUBLE'):
+        return f"TRY_TO_DOUBLE({raw_expr})"
+    if base_type == 'BOOLEAN':
+        return f"TRY_TO_BOOLEAN({raw_expr})"
+    if base_type == 'DATE':
+        attempts = [f"TRY_TO_DATE({raw_expr}, '{fmt}')" for fmt in date_formats]
+        attempts.append(f"TRY_TO_DATE({raw_expr})")
+        return f"COALESCE({', '.join(attempts)})" if len(attempts) > 1 else attempts[0]
+    if base_type.startswith('TIMESTAMP') or base_type == 'DATETIME':
+        ts_func = 'TRY_TO_TIMESTAMP_TZ' if base_type == 'TIMESTAMP_TZ' else 'TRY_TO_TIMESTAMP_LTZ' if base_type == 'TIMESTAMP_LTZ' else 'TRY_TO_TIMESTAMP_NTZ'
+        attempts = [f"{ts_func}({raw_expr}, '{fmt}')" for fmt in date_formats]
+        attempts.append(f"{ts_func}({raw_expr})")
+        return f"COALESCE({', '.join(attempts)})"
+    return f"TRY_CAST({raw_expr} AS {data_type})"
+
+# Bump when the SQL generated by build_transformation_plan changes shape,
+# so cached plans are regenerated on the next run
+PLAN_GENERATOR_VERSION = 5
+
+def build_transformation_plan(session, mappings, tpa, full_target_table, column_types, required_columns, date_formats):
+    """Generate the chunk stage SELECT, quarantine INSERT and MERGE SQL for a mapping set
+    
+    The stage flags, per row, columns that failed conversion (_CAST_FAILURES)
+    and required columns left NULL (_MISSING_REQUIRED). Flagged rows go to
+    quarantine_records; the MERGE only loads clean rows.
+    
+    Per-run values are left as tokens: __STAGE_TABLE__, __SOURCE_TABLE__,
+    __BATCH_ID__, __LOW_ID__ and __HIGH_ID__.
+    """
+    # Compile transformation logic (validated up front, cached per mapping version)
+    compiled_logic = compile_mappings(session, mappings, date_formats)
+    
+    # Build SELECT statement with field mappings
+    select_parts = []
+    cast_checks = []
+    required_checks = []
+    for row in mappings:
+        source_field = row['SOURCE_FIELD']
+        target_column = row['TARGET_COLUMN']
+        
+        # If transformation logic exists, use its compiled expression; otherwise, direct mapping
+        node = compiled_logic.get(row['MAPPING_ID'])
+        if node is None:
+            node = {'sql': f"RAW_DATA:{source_field}::VARCHAR", 'type': 'text', 'check': None}
+        
+        # Text results are converted to the target type here; typed results
+        # already went through TRY_* conversions inside the compiled expression
+        if node['type'] == 'text':
+            typed_expr = typed_extract(node['sql'], column_types.get(target_column.upper()), date_formats)
+            check_expr = node['sql'] if typed_expr != node['sql'] else None
+        else:
+            typed_expr = node['sql']
+            check_expr = node['check']
+        select_parts.append(f"{typed_expr} AS {target_column}")
+        
+        # A conversion failed when a non-blank value produced NULL
+        if check_expr:
+            cast_checks.append(
+                f"IFF(NULLIF(TRIM({check_expr}), '') IS NOT NULL AND {typed_expr} IS NULL, '{target_column}', NULL)"
+            )
+        
+        # Character values longer than the column would fail the whole MERGE
+        data_type = column_types.get(target_column.upper(), '')
+        if node['type'] == 'text' and '(' in data_type and data_type.split('(')[0].strip() in ('VARCHAR', 'STRING', 'TEXT', 'CHAR', 'CHARACTER', 'NCHAR', 'NVARCHAR'):
+            max_length = data_type[data_type.index('(') + 1:data_type.rindex(')')].strip()
+            if max_length.isdigit():
+                cast_checks.append(f"IFF(LENGTH({typed_expr}) > {max_length}, '{target_column}', NULL)")
+        
+        if target_column.upper() in required_columns:
+            required_checks.append(f"IFF({typed_expr} IS NULL, '{target_column}', NULL)")
+    
+    select_str = ',\n            '.join(select_parts)
+    cast_failures_str = f"ARRAY_CONSTRUCT_COMPACT({', '.join(cast_checks)})" if cast_checks else "ARRAY_CONSTRUCT()"
+    missing_required_str = f"ARRAY_CONSTRUCT_COMPACT({', '.join(required_checks)})" if required_checks else "ARRAY_CONSTRUCT()"
+    
+    # Build column list strings for MERGE statement
+    target_columns = [m['TARGET_COLUMN'] for m in mappings]
+    update_set_parts = [f"{col} = source.{col}" for col in target_columns]
+    update_set_str = ',\n                '.join(update_set_parts)
+    insert_columns_str = ', '.join(['_RECORD_ID', '_FILE_NAME', '_FILE_ROW_NUMBER'] + target_columns + ['_TPA', '_BATCH_ID', '_LOAD_TIMESTAMP', '_LOADED_BY', '_ROW_HASH'])
+    insert_values_str = ', '.join(['source._RECORD_ID', 'source._FILE_NAME', 'source._FILE_ROW_NUMBER'] + [f'source.{col}' for col in target_columns] + ['source._TPA', 'source._BATCH_ID', 'source._LOAD_TIMESTAMP', 'source._LOADED_BY', 'source._ROW_HASH'])
+    row_hash_str = f"HASH({', '.join(f's.{col}' for col in target_columns)})"
+    tpa_literal = tpa.replace("'", "''")
+    
+    stage_sql = f"""
+        CREATE OR REPLACE TEMPORARY TABLE __STAGE_TABLE__ AS
+        SELECT 
+            RECORD_ID AS _RECORD_ID,
+            FILE_NAME AS _FILE_NAME,
+            FILE_ROW_NUMBER AS _FILE_ROW_NUMBER,
+            {select_str},
+            '{tpa_literal}' AS _TPA,
+            '__BATCH_ID__' AS _BATCH_ID,
+            CURRENT_TIMESTAMP() AS _LOAD_TIMESTAMP,
+            CURRENT_USER() AS _LOADED_BY,
+            {cast_failures_str} AS _CAST_FAILURES,
+            {missing_required_str} AS _MISSING_REQUIRED,
+            RAW_DATA AS _RAW_DATA
+        FROM __SOURCE_TABLE__
+        WHERE TPA = '{tpa_literal}'
+          AND RAW_DATA IS NOT NULL
+          AND RECORD_ID > __LOW_ID__
+          AND RECORD_ID <= __HIGH_ID__
+    """
+    
+    # Rows failing conversion or required-field checks, with reasons and the Bronze record.
+    # A Bronze record already quarantined for this table with the same reason (and
+    # not yet reprocessed) is skipped, so re-running a batch range adds no duplicates.
+    # The check reads only the chunk's source_record_id range.
+    quarantine_sql = f"""
+        INSERT INTO quarantine_records
+            (batch_id, tpa, source_table, target_table, source_record_id, record_data, rule_id, rule_name, failure_reason)
+        SELECT 
+            f._BATCH_ID,
+            f._TPA,
+            '__SOURCE_TABLE__',
+            '{full_target_table}',
+            f._RECORD_ID,
+            f.record_data,
+            f.rule_id,
+            f.rule_name,
+            f.failure_reason
+        FROM (
+            SELECT
+                s._BATCH_ID,
+                s._TPA,
+                s._RECORD_ID,
+                OBJECT_CONSTRUCT('RECORD_ID', s._RECORD_ID, 'FILE_NAME', s._FILE_NAME,
+                                 'FILE_ROW_NUMBER', s._FILE_ROW_NUMBER, 'RAW_DATA', s._RAW_DATA) AS record_data,
+                IFF(ARRAY_SIZE(s._CAST_FAILURES) > 0, 'CAST_FAILURE', 'REQUIRED_FIELD') AS rule_id,
+                IFF(ARRAY_SIZE(s._CAST_FAILURES) > 0, 'Type conversion', 'Required field') AS rule_name,
+                TRIM(
+                    IFF(ARRAY_SIZE(s._CAST_FAILURES) > 0,
+                        'Type conversion failed: ' || ARRAY_TO_STRING(s._CAST_FAILURES, ', ') || '. ', '') ||
+                    IFF(ARRAY_SIZE(s._MISSING_REQUIRED) > 0,
+                        'Missing required value: ' || ARRAY_TO_STRING(s._MISSING_REQUIRED, ', ') || '.', '')
+                ) AS failure_reason
+            FROM __STAGE_TABLE__ s
+            WHERE ARRAY_SIZE(s._CAST_FAILURES) > 0
+               OR ARRAY_SIZE(s._MISSING_REQUIRED) > 0
+        ) f
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM quarantine_records q
+            WHERE q.tpa = '{tpa_literal}'
+              AND q.target_table = '{full_target_table}'
+              AND q.source_record_id > __LOW_ID__
+              AND q.source_record_id <= __HIGH_ID__
+              AND q.source_record_id = f._RECORD_ID
+              AND q.failure_reason = f.failure_reason
+              AND NOT COALESCE(q.reprocessed, FALSE)
+        )
+    """
+    
+    # Matched rows are only rewritten when the mapped values changed (_ROW_HASH)
+    merge_sql = f"""
+        MERGE INTO {full_target_table} AS target
+        USING (
+            SELECT s.*, {row_hash_str} AS _ROW_HASH
+            FROM __STAGE_TABLE__ s
+            WHERE ARRAY_SIZE(s._CAST_FAILURES) = 0
+              AND ARRAY_SIZE(s._MISSING_REQUIRED) = 0
+        ) AS source
+        ON target._RECORD_ID = source._RECORD_ID
+        WHEN MATCHED AND target._ROW_HASH IS DISTINCT FROM source._ROW_HASH THEN
+            UPDATE SET
+            {update_set_str},
+            _FILE_NAME = source._FILE_NAME,
+            _FILE_ROW_NUMBER = source._FILE_ROW_NUMBER,
+            _BATCH_ID = source._BATCH_ID,
+            _LOAD_TIMESTAMP = source._LOAD_TIMESTAMP,
+            _LOADED_BY = source._LOADED_BY,
+            _ROW_HASH = source._ROW_HASH
+        WHEN NOT MATCHED THEN
+            INSERT ({insert_columns_str})
+            VALUES ({insert_values_str})
+    """
+    
+    return {
+        'stage_sql': stage_sql,
+        'quarantine_sql': quarantine_sql,
+        'merge_sql': merge_sql,
+        'target_columns': target_columns,
+        'column_types': column_types,
+        'has_row_checks': bool(cast_checks or required_checks)
+    }
+
+def get_transformation_plan(session, mappings, target_table, tpa):
+    """Return (plan, plan_hash), generating and storing a new plan version only when inputs changed"""
+    import json
+    import hashlib
+    
+    column_types, required_columns = get_column_types(session, target_table)
+    date_formats = get_date_formats(session, tpa)
+    full_target_table = f"{tpa.upper()}_{target_table.upper()}"
+    
+    version_key = json.dumps({
+        'generator': PLAN_GENERATOR_VERSION,
+        'target': full_target_table,
+        'mappings': sorted([row['MAPPING_ID'], row['SOURCE_FIELD'], row['TARGET_COLUMN'], row['TRANSFORMATION_LOGIC']] for row in mappings),
+        'columns': sorted(column_types.items()),
+        'required': required_columns,
+        'date_formats': date_formats
+    })
+    plan_hash = hashlib.sha256(version_key.encode('utf-8')).hexdigest()
+    
+    # last_used_timestamp is refreshed at most once a day per plan, so cache
+    # hits stay read-only
+    cached = session.sql("""
+        SELECT plan,
+               last_used_timestamp < DATEADD('day', -1, CURRENT_TIMESTAMP()) AS last_used_stale
+        FROM transformation_plans
+        WHERE tpa = ?
+          AND target_table = ?
+          AND plan_hash = ?
+    """, params=[tpa, target_table.upper(), plan_hash]).collect()
+    
+    if cached:
+        if cached[0]['LAST_USED_STALE']:
+            session.sql("""
+                UPDATE transformation_plans
+                SET last_used_timestamp = CURRENT_TIMESTAMP()
+                WHERE tpa = ?
+                  AND target_table = ?
+                  AND plan_hash = ?
+            """, params=[tpa, target_table.upper(), plan_hash]).collect()
+        return json.loads(cached[0]['PLAN']), plan_hash
+    
+    # Keyed on plan_hash, so a concurrent run that stored the same plan first
+    # leaves its version in place instead of adding a duplicate
+    plan = build_transformation_plan(session, mappings, tpa, full_target_table, column_types, required_columns, date_formats)
+    session.sql("""
+        MERGE INTO transformation_plans t
+        USING (
+            SELECT ? AS tpa, ? AS target_table, ? AS plan_hash,
+                   (SELECT COALESCE(MAX(plan_version), 0) + 1
+                    FROM transformation_plans
+                    WHERE tpa = ?
+                      AND target_table = ?) AS plan_version,
+                   ? AS mapping_count, ? AS stage_sql, ? AS merge_sql, PARSE_JSON(?) AS plan
+        ) s
+        ON t.tpa = s.tpa
+           AND t.target_table = s.target_table
+           AND t.plan_hash = s.plan_hash
+        WHEN NOT MATCHED THEN INSERT
+            (tpa, target_table, plan_hash, plan_version, mapping_count, stage_sql, merge_sql, plan)
+        VALUES (
+            s.tpa, s.target_table, s.plan_hash, s.plan_version,
+            s.mapping_count, s.stage_sql, s.merge_sql, s.plan
+        )
+    """, params=[
+        tpa, target_table.upper(), plan_hash, tpa, target_table.upper(),
+        len(mappings), plan['stage_sql'], plan['merge_sql'], json.dumps(plan)
+    ]).collect()
+    return plan, plan_hash
+
+def validate_layouts(session, source_schema, tpa, target_table, mappings, plan_hash):
+    """Check the mapping set against file layouts it has not been validated for yet
+    
+    Layouts come from the Bronze SCHEMA_FINGERPRINTS table. A (fingerprint,
+    plan_hash) pair is validated once and recorded in layout_mapping_sets, so
+    files with a known layout skip this work. Returns {fingerprint: missing
+    source fields} for newly validated layouts that lack mapped fields.
+    """
+    import json
+    
+    pending = session.sql(f"""
+        SELECT f.FINGERPRINT, f.FIELD_NAMES
+        FROM {source_schema}.SCHEMA_FINGERPRINTS f
+        LEFT JOIN layout_mapping_sets l
+          ON l.tpa = f.TPA
+         AND l.target_table = ?
+         AND l.fingerprint = f.FINGERPRINT
+         AND l.plan_hash = ?
+        WHERE f.TPA = ?
+          AND l.fingerprint IS NULL
+    """, params=[target_table.upper(), plan_hash, tpa]).collect()
+    
+    if not pending:
+        return {}
+    
+    mapped_fields = sorted({row['SOURCE_FIELD'].upper() for row in mappings})
+    selects = []
+    params = []
+    incomplete = {}
+    for row in pending:
+        header = {str(name).upper() for name in json.loads(row['FIELD_NAMES'] or '[]')}
+        missing = [field for field in mapped_fields if field not in header]
+        if missing:
+            incomplete[row['FINGERPRINT']] = missing
+        selects.append("SELECT ?, ?, ?, ?, ?, PARSE_JSON(?)::ARRAY, ?")
+        params.extend([
+            tpa, target_table.upper(), row['FINGERPRINT'], plan_hash,
+            'INCOMPLETE' if missing else 'VALID', json.dumps(missing), len(mapped_fields) - len(missing)
+        ])
+    
+    session.sql(f"""
+        INSERT INTO layout_mapping_sets
+            (tpa, target_table, fingerprint, plan_hash, status, missing_source_fields, mapped_field_count)
+        {' UNION ALL '.join(selects)}
+    """, params=params).collect()
+    return incomplete
+
 def transform_bronze_to_silver(session, target_table, tpa, source_table, source_schema, batch_size, apply_rules, incremental):
-    """Main transformation procedure from Bronze to Silver"""
+    """Main transformation procedure from Bronze to Silver
+    
+    The source is walked in chunks of batch_size rows by RECORD_ID range; each
+    chunk is committed separately and checkpointed to silver_processing_log so
+    an interrupted full run resumes from its last completed chunk (see
+    get_resume_checkpoint: failed or stalled runs with the same plan only).
+    
+    When incremental is TRUE, only source rows with RECORD_ID above the
+    (source_table, target_table, tpa) watermark are merged, and the watermark
+    is advanced in the same transaction as each chunk's MERGE. Because
+    AUTOINCREMENT IDs are not commit-ordered, each incremental run also
+    re-reads rows loaded up to WATERMARK_LAG_MINUTES before the watermark
+    (see watermark_start). A row is guaranteed to be picked up as long as its
+    load commits within that lag of the rows the watermark was taken from;
+    rows re-read from the overlap are unchanged and are not rewritten.
+    
+    Fields are extracted with TRY_* conversions for the target_schemas data
+    type (dates via the TPA's tpa_date_formats). Each chunk is staged once;
+    rows failing conversion or required-field checks are written to
+    quarantine_records from the stage and the remaining rows are merged.
+    
+    transformation_logic is compiled into the same SELECT (see
+    compile_transformation_logic), so all cleanup happens in one scan.
+    
+    The generated stage/MERGE SQL is cached in transformation_plans, keyed by a
+    hash of the approved mappings, target columns and date formats. Each plan
+    is validated once per Bronze file layout (layout_mapping_sets).
+    """
     
     import uuid
     from datetime import datetime
@@ -43,17 +893,18 @@ def transform_bronze_to_silver(session, target_table, tpa, source_table, source_
     
     # Generate batch ID
     batch_id = f"BATCH_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
+    run_mode = 'INCREMENTAL' if incremental else 'FULL'
     
     # Log start
     session.sql(f"""
-        INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status)
-        VALUES ('{batch_id}', '{tpa}', '{source_table}', '{target_table}', 'TRANSFORMATION', 'STARTED')
+        INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, run_mode)
+        VALUES ('{batch_id}', '{tpa}', '{source_table}', '{target_table}', 'TRANSFORMATION', 'STARTED', '{run_mode}')
     """).collect()
     
     try:
         # Get approved mappings
         mappings = session.sql(f"""
-            SELECT source_field, target_column, transformation_logic
+            SELECT mapping_id, source_field, target_column, transformation_logic
             FROM field_mappings
             WHERE target_table = '{target_table.upper()}'
               AND tpa = '{tpa}'
@@ -73,103 +924,215 @@ def transform_bronze_to_silver(session, target_table, tpa, source_table, source_
             """).collect()
             return f"ERROR: No approved mappings found for {target_table} and TPA {tpa}"
         
-        # Build mapping dictionary
-        mapping_dict = {}
-        for row in mappings:
-            mapping_dict[row['SOURCE_FIELD']] = {
-                'target_column': row['TARGET_COLUMN'],
-                'transformation_logic': row['TRANSFORMATION_LOGIC']
-            }
-        
         # Build full target table name (TPA_TABLENAME format)
         full_target_table = f"{tpa.upper()}_{target_table.upper()}"
         
-        # Build column list for MERGE
-        target_columns = [m['TARGET_COLUMN'] for m in mappings]
+        # Generated SQL for this mapping set (cached in transformation_plans);
+        # the run's checkpoint is only resumable under the same plan
+        plan, plan_hash = get_transformation_plan(session, mappings, target_table, tpa)
+        session.sql("""
+            UPDATE silver_processing_log
+            SET plan_hash = ?
+            WHERE batch_id = ?
+              AND processing_type = 'TRANSFORMATION'
+        """, params=[plan_hash, batch_id]).collect()
+        column_types = plan['column_types']
         
-        # Build SELECT statement with field mappings
-        select_parts = []
-        for row in mappings:
-            source_field = row['SOURCE_FIELD']
-            transformation = row['TRANSFORMATION_LOGIC']
-            
-            # If transformation logic exists, use it; otherwise, direct mapping
-            if transformation and transformation.strip():
-                # For now, just use direct mapping - transformation logic can be enhanced later
-                select_parts.append(f"RAW_DATA:{source_field}::VARCHAR AS {row['TARGET_COLUMN']}")
-            else:
-                select_parts.append(f"RAW_DATA:{source_field}::VARCHAR AS {row['TARGET_COLUMN']}")
+        # Validate the mapping set only against file layouts it has not seen
+        incomplete_layouts = validate_layouts(session, source_schema, tpa, target_table, mappings, plan_hash)
+        source_ref = f"{source_schema}.{source_table}"
+        stage_table = f"TRANSFORM_STAGE_{batch_id}"
+        merge_query = plan['merge_sql'].replace('__STAGE_TABLE__', stage_table)
+        quarantine_query = plan['quarantine_sql'].replace('__STAGE_TABLE__', stage_table).replace('__SOURCE_TABLE__', source_ref)
         
-        select_str = ',\n            '.join(select_parts)
+        # Tables created before _ROW_HASH existed get the column on first use.
+        # The DDL would commit any open transaction, so it only runs when the
+        # column is actually missing.
+        has_row_hash = session.sql("""
+            SELECT COUNT(*) AS cnt
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = CURRENT_SCHEMA()
+              AND TABLE_NAME = ?
+              AND COLUMN_NAME = '_ROW_HASH'
+        """, params=[full_target_table]).collect()[0]['CNT']
+        if not has_row_hash:
+            session.sql(f"ALTER TABLE {full_target_table} ADD COLUMN IF NOT EXISTS _ROW_HASH NUMBER(19,0)").collect()
         
-        # Build column list strings for MERGE statement
-        columns_str = ', '.join(target_columns)
-        update_set_parts = [f"{col} = source.{col}" for col in target_columns]
-        update_set_str = ',\n                '.join(update_set_parts)
-        insert_columns_str = ', '.join(['_RECORD_ID', '_FILE_NAME', '_FILE_ROW_NUMBER'] + target_columns + ['_TPA', '_BATCH_ID', '_LOAD_TIMESTAMP', '_LOADED_BY'])
-        insert_values_str = ', '.join(['source._RECORD_ID', 'source._FILE_NAME', 'source._FILE_ROW_NUMBER'] + [f'source.{col}' for col in target_columns] + ['source._TPA', 'source._BATCH_ID', 'source._LOAD_TIMESTAMP', 'source._LOADED_BY'])
+        # Starting point: incremental runs start at the watermark less the
+        # late-commit overlap; full runs resume after the last committed chunk
+        # of an unfinished previous run.
+        watermark_source = f"{source_schema}.{source_table}".upper()
+        watermark_target = target_table.upper()
+        low_id = 0
+        watermark_id = 0
+        resumed_batch_id = None
+        if incremental:
+            watermark_id, watermark_ts = get_watermark(session, watermark_source, watermark_target, tpa)
+            low_id = watermark_start(session, source_ref, tpa, watermark_id, watermark_ts)
+        else:
+            checkpoint = get_resume_checkpoint(session, tpa, target_table, batch_id, run_mode, plan_hash)
+            if checkpoint:
+                resumed_batch_id, low_id = checkpoint
         
-        # Build and execute MERGE statement
-        merge_query = f"""
-            MERGE INTO {full_target_table} AS target
-            USING (
-                SELECT 
-                    RECORD_ID AS _RECORD_ID,
-                    FILE_NAME AS _FILE_NAME,
-                    FILE_ROW_NUMBER AS _FILE_ROW_NUMBER,
-                    {select_str},
-                    '{tpa}' AS _TPA,
-                    '{batch_id}' AS _BATCH_ID,
-                    CURRENT_TIMESTAMP() AS _LOAD_TIMESTAMP,
-                    CURRENT_USER() AS _LOADED_BY
-                FROM {source_schema}.{source_table}
-                WHERE TPA = '{tpa}'
-                  AND RAW_DATA IS NOT NULL
-                LIMIT {batch_size}
-            ) AS source
-            ON target._RECORD_ID = source._RECORD_ID
-            WHEN MATCHED THEN
-                UPDATE SET
-                {update_set_str},
-                _FILE_NAME = source._FILE_NAME,
-                _FILE_ROW_NUMBER = source._FILE_ROW_NUMBER,
-                _BATCH_ID = source._BATCH_ID,
-                _LOAD_TIMESTAMP = source._LOAD_TIMESTAMP,
-                _LOADED_BY = source._LOADED_BY
-            WHEN NOT MATCHED THEN
-                INSERT ({insert_columns_str})
-                VALUES ({insert_values_str})
-        """
-        
-        # Execute transformation
-        merge_result = session.sql(merge_query).collect()
-        
-        # Get the number of rows affected from the merge result
-        # MERGE returns a Row object with columns like 'number of rows inserted', 'number of rows updated'
-        records_processed = 0
-        if merge_result and len(merge_result) > 0:
-            result_row = merge_result[0]
-            # Try to access as dictionary keys (case-insensitive)
+        # Total rows to cover, for percent-complete reporting
+        records_total = session.sql(f"""
+            SELECT COUNT(*) AS cnt
+            FROM {source_schema}.{source_table}
+            WHERE TPA = '{tpa}'
+              AND RAW_DATA IS NOT NULL
+              AND RECORD_ID > {low_id}
+        """).collect()[0]['CNT']
+        
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        update_progress(session, batch_id, 'IN_PROGRESS', records_total, low_id, 0, counts)
+        
+        # Walk the source in bounded RECORD_ID chunks. Each chunk is merged and
+        # checkpointed (progress row + watermark) in its own transaction.
+        chunks_completed = 0
+        rows_quarantined = 0
+        row_failures = {}
+        while True:
+            window = session.sql(f"""
+                SELECT MAX(RECORD_ID) AS high_id, MAX(LOAD_TIMESTAMP) AS high_ts, COUNT(*) AS chunk_rows
+                FROM (
+                    SELECT RECORD_ID, LOAD_TIMESTAMP
+                    FROM {source_schema}.{source_table}
+                    WHERE TPA = '{tpa}'
+                      AND RAW_DATA IS NOT NULL
+                      AND RECORD_ID > {low_id}
+                    ORDER BY RECORD_ID
+                    LIMIT {batch_size}
+                )
+            """).collect()[0]
+            high_id = window['HIGH_ID']
+            high_ts = window['HIGH_TS']
+            
+            if high_id is None:
+                break
+            
+            # Stage the chunk once: typed values plus the columns that failed checks
+            session.sql(
+                plan['stage_sql']
+                .replace('__STAGE_TABLE__', stage_table)
+                .replace('__SOURCE_TABLE__', source_ref)
+                .replace('__BATCH_ID__', batch_id)
+                .replace('__LOW_ID__', str(low_id))
+                .replace('__HIGH_ID__', str(high_id))
+            ).collect()
+            
+            if plan['has_row_checks']:
+                for failure in session.sql(f"""
+                    SELECT 'CAST_FAILURES' AS failure_type, f.value::VARCHAR AS column_name, COUNT(*) AS failures
+                    FROM {stage_table} s, LATERAL FLATTEN(input => s._CAST_FAILURES) f
+                    GROUP BY 1, 2
+                    UNION ALL
+                    SELECT 'MISSING_REQUIRED', f.value::VARCHAR, COUNT(*)
+                    FROM {stage_table} s, LATERAL FLATTEN(input => s._MISSING_REQUIRED) f
+                    GROUP BY 1, 2
+                """).collect():
+                    key = (failure['FAILURE_TYPE'], failure['COLUMN_NAME'])
+                    row_failures[key] = row_failures.get(key, 0) + failure['FAILURES']
+            
+            # Quarantine and MERGE commit together with the chunk checkpoint
+            session.sql("BEGIN").collect()
             try:
-                rows_inserted = result_row['number of rows inserted'] if 'number of rows inserted' in result_row else (result_row['NUMBER OF ROWS INSERTED'] if 'NUMBER OF ROWS INSERTED' in result_row else 0)
-                rows_updated = result_row['number of rows updated'] if 'number of rows updated' in result_row else (result_row['NUMBER OF ROWS UPDATED'] if 'NUMBER OF ROWS UPDATED' in result_row else 0)
-                records_processed = rows_inserted + rows_updated
-            except (KeyError, TypeError):
-                # If we can't get the counts, just set to 0
-                records_processed = 0
-        
-        # Log success
+                chunk_quarantined = 0
+                if plan['has_row_checks']:
+                    chunk_quarantined = merge_counts(session.sql(
+                        quarantine_query
+                        .replace('__LOW_ID__', str(low_id))
+                        .replace('__HIGH_ID__', str(high_id))
+                    ).collect())[0]
+                    rows_quarantined += chunk_quarantined
+                merge_result = session.sql(merge_query).collect()
+                rows_inserted, rows_updated = merge_counts(merge_result)
+                counts['inserted'] += rows_inserted
+                counts['updated'] += rows_updated
+                counts['unchanged'] += max(window['CHUNK_ROWS'] - chunk_quarantined - rows_inserted - rows_updated, 0)
+                chunks_completed += 1
+                if incremental:
+                    advance_watermark(session, watermark_source, watermark_target, tpa, high_id, high_ts)
+                update_progress(session, batch_id, 'IN_PROGRESS', records_total, high_id, chunks_completed, counts)
+                session.sql("COMMIT").collect()
+            except Exception:
+                session.sql("ROLLBACK").collect()
+                raise
+            
+            low_id = high_id
+        
+        session.sql(f"DROP TABLE IF EXISTS {stage_table}").collect()
+        
+        # Flag newly seen layouts that lack mapped source fields
+        if incomplete_layouts:
+            layout_values = []
+            for fingerprint, missing in sorted(incomplete_layouts.items()):
+                missing_list = ', '.join(missing)[:4000].replace("'", "''")
+                layout_values.append(
+                    f"('{batch_id}', '{tpa}', '{full_target_table}', 'LAYOUT_MISSING_FIELDS_{fingerprint[:12]}', {len(missing)}, 0, FALSE, "
+                    f"'File layout {fingerprint[:12]} lacks mapped source fields: {missing_list}')"
+                )
+            layout_rows = ', '.join(layout_values)
+            session.sql(f"""
+                INSERT INTO data_quality_metrics
+                    (batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description)
+                VALUES {layout_rows}
+            """).collect()
+        
+        # Record per-column failures behind quarantined rows
+        if row_failures:
+            metric_rows = ', '.join(
+                f"('{batch_id}', '{tpa}', '{full_target_table}', '{failure_type}_{column}', {count}, 0, FALSE, "
+                + (f"'Values in {column} that could not be converted to {column_types.get(column.upper(), 'the target type')}')"
+                   if failure_type == 'CAST_FAILURES' else f"'Rows missing required column {column}')")
+                for (failure_type, column), count in sorted(row_failures.items())
+            )
+            session.sql(f"""
+                INSERT INTO data_quality_metrics
+                    (batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description)
+                VALUES {metric_rows}
+            """).collect()
+        
+        # Apply transformation rules to the rows merged by this batch
+        # (the merged rows stay committed if the rules fail; the run is then PARTIAL)
+        rules_msg = ""
+        rules_error = None
+        if apply_rules and chunks_completed > 0:
+            rules_result = session.sql(
+                "CALL apply_transformation_rules(?, ?, ?)", params=[target_table, tpa, batch_id]
+            ).collect()
+            rules_output = str(rules_result[0][0]) if rules_result else ""
+            rules_msg = f" Rules: {rules_output}" if rules_output else ""
+            if rules_output.startswith('ERROR'):
+                rules_error = rules_output
+        
+        # Log success (or partial success when the rules failed)
+        run_status = 'PARTIAL' if rules_error else 'SUCCESS'
+        rules_error_sql = "'" + rules_error.replace("'", "''")[:5000] + "'" if rules_error else 'NULL'
+        records_processed = counts['inserted'] + counts['updated']
+        records_loaded = records_processed + counts['unchanged']
         session.sql(f"""
             UPDATE silver_processing_log
-            SET status = 'SUCCESS',
+            SET status = '{run_status}',
                 end_timestamp = CURRENT_TIMESTAMP(),
                 records_processed = {records_processed},
-                records_success = {records_processed}
+                records_inserted = {counts['inserted']},
+                records_updated = {counts['updated']},
+                records_unchanged = {counts['unchanged']},
+                records_success = {records_loaded},
+                records_failed = {rows_quarantined},
+                error_message = {rules_error_sql}
             WHERE batch_id = '{batch_id}'
               AND processing_type = 'TRANSFORMATION'
         """).collect()
         
-        return f"SUCCESS: Merged {records_processed} records from {source_table} to {full_target_table} (inserted/updated)"
+        if chunks_completed == 0:
+            return f"SUCCESS: No new records in {source_table} for {full_target_table} (starting after RECORD_ID {low_id})"
+        
+        resume_msg = f", resumed from {resumed_batch_id}" if resumed_batch_id else ""
+        watermark_msg = f", watermark advanced to RECORD_ID {max(low_id, watermark_id)}" if incremental else ""
+        cast_msg = f", {rows_quarantined} record(s) quarantined" if rows_quarantined else ""
+        layout_msg = f", {len(incomplete_layouts)} new layout(s) missing mapped fields" if incomplete_layouts else ""
+        return f"{run_status}: Merged {records_processed} records from {source_table} to {full_target_table} ({counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged) in {chunks_completed} chunk(s){resume_msg}{watermark_msg}{cast_msg}{layout_msg}. Batch ID: {batch_id}, plan {plan_hash[:12]}.{rules_msg}"
         
     except Exception as e:
         # Log error
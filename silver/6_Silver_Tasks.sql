@@ -3,11 +3,19 @@
 -- ============================================
 -- Purpose: Task orchestration for automated transformation
 -- 
--- This script creates 1 task:
+-- This script creates 2 tasks:
 --   1. auto_transform_mappings_task - Run all approved mappings (every 24 hours)
+--   2. cdc_transform_task - Optional CDC mode: transform newly inserted Bronze
+--      rows as soon as raw_data_cdc_stream has data (triggered, no schedule)
 --
 -- Task Dependencies:
 --   auto_transform_mappings_task (root, scheduled daily)
+--   cdc_transform_task (root, triggered by raw_data_cdc_stream)
+--
+-- run_all_approved_mappings runs its transforms concurrently through
+-- short-lived PARALLEL_CALL_* worker tasks (start_parallel_calls), which the
+-- role needs CREATE TASK and EXECUTE TASK for; without them it falls back to
+-- running the transforms one after another.
 -- ============================================
 
 -- ============================================
@@ -29,12 +37,249 @@ USE SCHEMA IDENTIFIER($SILVER_SCHEMA_NAME);
 -- ============================================
 
 ALTER TASK IF EXISTS auto_transform_mappings_task SUSPEND;
+ALTER TASK IF EXISTS cdc_transform_task SUSPEND;
+
+-- ============================================
+-- PROCEDURES: Concurrent CALLs in Separate Sessions
+-- ============================================
+-- Snowflake transactions are scoped to the session, and CALLs started with
+-- collect_nowait all share the caller's session, so child procedures that
+-- BEGIN/COMMIT their own transactions could interleave or commit each
+-- other's work. Callers instead queue their CALL statements in
+-- parallel_call_queue and hand them to worker tasks: every task run has its
+-- own session and runs its items one after another.
+--
+--   start_parallel_calls(run_id, max_workers) - assign items round-robin and
+--       EXECUTE TASK one short-lived worker task per worker. With one worker,
+--       or if the worker tasks cannot be created or executed (e.g. EXECUTE
+--       TASK is not granted), the items run inline, one after another, in the
+--       caller's session before it returns.
+--   poll_parallel_calls(run_id) - finished items as a JSON array; items of a
+--       worker task that ended without finishing them are marked FAILED.
+--   stop_parallel_calls(run_id) - drop the worker tasks.
+
+CREATE OR REPLACE PROCEDURE run_parallel_call_worker(p_run_id VARCHAR, p_worker_id INTEGER)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run_parallel_call_worker'
+AS
+$$
+def run_parallel_call_worker(session, p_run_id, p_worker_id):
+    """Run one worker's queued CALLs one after another in the current session"""
+    items = session.sql("""
+        SELECT item_id, call_sql
+        FROM parallel_call_queue
+        WHERE run_id = ?
+          AND worker_id = ?
+          AND status = 'QUEUED'
+        ORDER BY item_id
+    """, params=[p_run_id, p_worker_id]).collect()
+    
+    for item in items:
+        session.sql("""
+            UPDATE parallel_call_queue
+            SET status = 'RUNNING', started_timestamp = CURRENT_TIMESTAMP()
+            WHERE run_id = ? AND item_id = ?
+        """, params=[p_run_id, item['ITEM_ID']]).collect()
+        
+        try:
+            if not item['CALL_SQL'].lstrip().upper().startswith('CALL '):
+                raise Exception("Only CALL statements can be queued")
+            result = session.sql(item['CALL_SQL']).collect()
+            status = 'DONE'
+            output = str(result[0][0]) if result and result[0] else 'No result returned'
+        except Exception as e:
+            status = 'FAILED'
+            output = str(e)
+        
+        session.sql("""
+            UPDATE parallel_call_queue
+            SET status = ?, result = ?, completed_timestamp = CURRENT_TIMESTAMP()
+            WHERE run_id = ? AND item_id = ?
+        """, params=[status, output[:16000], p_run_id, item['ITEM_ID']]).collect()
+    
+    return f"Worker {p_worker_id} of {p_run_id}: {len(items)} call(s)"
+$$;
+
+CREATE OR REPLACE PROCEDURE start_parallel_calls(p_run_id VARCHAR, p_max_workers INTEGER DEFAULT 4)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'start_parallel_calls'
+AS
+$$
+import uuid
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def run_inline(session, p_run_id, reason):
+    session.sql("""
+        UPDATE parallel_call_queue
+        SET worker_id = 0, worker_task = NULL
+        WHERE run_id = ? AND status = 'QUEUED'
+    """, params=[p_run_id]).collect()
+    session.sql("CALL run_parallel_call_worker(?, 0)", params=[p_run_id]).collect()
+    return f"INLINE: {reason}"
+
+def start_parallel_calls(session, p_run_id, p_max_workers):
+    """Start worker tasks for a run's queued items; returns 'TASKS: ...' or 'INLINE: ...'"""
+    # Keep a week of finished runs for troubleshooting
+    session.sql("""
+        DELETE FROM parallel_call_queue
+        WHERE created_timestamp < DATEADD('day', -7, CURRENT_TIMESTAMP())
+    """).collect()
+    
+    item_count = session.sql("""
+        SELECT COUNT(*) AS cnt
+        FROM parallel_call_queue
+        WHERE run_id = ? AND status = 'QUEUED'
+    """, params=[p_run_id]).collect()[0]['CNT']
+    workers = max(1, min(int(p_max_workers or 1), item_count))
+    
+    if item_count == 0:
+        return "INLINE: no queued calls"
+    if workers == 1:
+        return run_inline(session, p_run_id, f"{item_count} call(s) run one after another")
+    
+    # Task names are unique per start, so task history never matches an earlier run
+    task_prefix = f"PARALLEL_CALL_{uuid.uuid4().hex[:16].upper()}"
+    session.sql("""
+        UPDATE parallel_call_queue
+        SET worker_id = MOD(item_id, ?),
+            worker_task = ? || '_' || MOD(item_id, ?)
+        WHERE run_id = ? AND status = 'QUEUED'
+    """, params=[workers, task_prefix, workers, p_run_id]).collect()
+    
+    warehouse = session.sql("SELECT CURRENT_WAREHOUSE() AS wh").collect()[0]['WH']
+    compute = f'WAREHOUSE = "{warehouse}"' if warehouse else "USER_TASK_MANAGED_INITIAL_WAREHOUSE_SIZE = 'XSMALL'"
+    
+    created = []
+    try:
+        for worker_id in range(workers):
+            task_name = f"{task_prefix}_{worker_id}"
+            session.sql(f"""
+                CREATE OR REPLACE TASK {task_name}
+                    {compute}
+                    COMMENT = {sql_literal(f'Worker {worker_id} of parallel run {p_run_id}')}
+                AS
+                CALL run_parallel_call_worker({sql_literal(p_run_id)}, {worker_id})
+            """).collect()
+            created.append(task_name)
+        session.sql(f"EXECUTE TASK {created[0]}").collect()
+    except Exception as e:
+        for task_name in created:
+            session.sql(f"DROP TASK IF EXISTS {task_name}").collect()
+        return run_inline(session, p_run_id, f"worker tasks unavailable ({str(e)[:200]}); {item_count} call(s) run one after another")
+    
+    for worker_id, task_name in enumerate(created[1:], start=1):
+        try:
+            session.sql(f"EXECUTE TASK {task_name}").collect()
+        except Exception as e:
+            session.sql("""
+                UPDATE parallel_call_queue
+                SET status = 'FAILED', result = ?, completed_timestamp = CURRENT_TIMESTAMP()
+                WHERE run_id = ? AND worker_id = ? AND status = 'QUEUED'
+            """, params=[f"Worker task could not start: {str(e)}"[:16000], p_run_id, worker_id]).collect()
+    
+    return f"TASKS: {workers} worker task(s) for {item_count} call(s)"
+$$;
+
+CREATE OR REPLACE PROCEDURE poll_parallel_calls(p_run_id VARCHAR)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'poll_parallel_calls'
+AS
+$$
+import json
+
+def poll_parallel_calls(session, p_run_id):
+    """Finished items of a run as a JSON array of {item_id, item_key, status, result}"""
+    open_tasks = [row['WORKER_TASK'] for row in session.sql("""
+        SELECT DISTINCT worker_task
+        FROM parallel_call_queue
+        WHERE run_id = ?
+          AND status IN ('QUEUED', 'RUNNING')
+          AND worker_task IS NOT NULL
+    """, params=[p_run_id]).collect()]
+    
+    # A worker task run that ended (failed, cancelled, or finished without
+    # reaching its items) will not complete them any more
+    if open_tasks:
+        ended = session.sql(f"""
+            SELECT name, state, error_message
+            FROM TABLE(INFORMATION_SCHEMA.TASK_HISTORY(
+                SCHEDULED_TIME_RANGE_START => DATEADD('day', -1, CURRENT_TIMESTAMP()),
+                RESULT_LIMIT => 10000
+            ))
+            WHERE name IN ({', '.join('?' for _ in open_tasks)})
+              AND state NOT IN ('SCHEDULED', 'EXECUTING')
+        """, params=open_tasks).collect()
+        for run in ended:
+            session.sql("""
+                UPDATE parallel_call_queue
+                SET status = 'FAILED', result = ?, completed_timestamp = CURRENT_TIMESTAMP()
+                WHERE run_id = ? AND worker_task = ? AND status IN ('QUEUED', 'RUNNING')
+            """, params=[
+                f"Worker task {run['NAME']} ended with state {run['STATE']}: {run['ERROR_MESSAGE'] or 'call did not finish'}"[:16000],
+                p_run_id, run['NAME']
+            ]).collect()
+    
+    finished = session.sql("""
+        SELECT item_id, item_key, status, result
+        FROM parallel_call_queue
+        WHERE run_id = ?
+          AND status IN ('DONE', 'FAILED')
+        ORDER BY item_id
+    """, params=[p_run_id]).collect()
+    return json.dumps([{
+        'item_id': row['ITEM_ID'],
+        'item_key': row['ITEM_KEY'],
+        'status': row['STATUS'],
+        'result': row['RESULT']
+    } for row in finished])
+$$;
+
+CREATE OR REPLACE PROCEDURE stop_parallel_calls(p_run_id VARCHAR)
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'stop_parallel_calls'
+AS
+$$
+def stop_parallel_calls(session, p_run_id):
+    """Drop a run's worker tasks; items still open are marked FAILED"""
+    tasks = [row['WORKER_TASK'] for row in session.sql("""
+        SELECT DISTINCT worker_task
+        FROM parallel_call_queue
+        WHERE run_id = ? AND worker_task IS NOT NULL
+    """, params=[p_run_id]).collect()]
+    for task_name in tasks:
+        session.sql(f"DROP TASK IF EXISTS {task_name}").collect()
+    
+    session.sql("""
+        UPDATE parallel_call_queue
+        SET status = 'FAILED', result = 'Run stopped before the call finished', completed_timestamp = CURRENT_TIMESTAMP()
+        WHERE run_id = ? AND status IN ('QUEUED', 'RUNNING')
+    """, params=[p_run_id]).collect()
+    return f"Stopped {len(tasks)} worker task(s) of {p_run_id}"
+$$;
 
 -- ============================================
 -- PROCEDURE: Run All Approved Mappings
 -- ============================================
 
-CREATE OR REPLACE PROCEDURE run_all_approved_mappings()
+-- Replaced the zero-argument signature; drop it so CALL run_all_approved_mappings()
+-- resolves unambiguously to the version with a defaulted max_concurrency
+DROP PROCEDURE IF EXISTS run_all_approved_mappings();
+
+CREATE OR REPLACE PROCEDURE run_all_approved_mappings(max_concurrency INTEGER DEFAULT 4)
 RETURNS VARCHAR
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.11'
@@ -42,17 +287,26 @@ PACKAGES = ('snowflake-snowpark-python')
 HANDLER = 'run_all_approved_mappings'
 AS
 $$
-def run_all_approved_mappings(session):
+def run_all_approved_mappings(session, max_concurrency):
     """
     Iterate through all approved mappings and run transformations
     Groups by TPA and target_table to run each unique combination
+    
+    Combinations are independent (own target table and watermark), so up to
+    max_concurrency transform_bronze_to_silver calls run at once, each in
+    the session of its own worker task (see start_parallel_calls): the
+    transform manages its own transactions, which are scoped to a session.
+    max_concurrency = 1 runs them one after another in this session.
     """
     
+    import json
     import uuid
+    import time
     from datetime import datetime
     
     # Generate run ID
     run_id = f"AUTO_TRANSFORM_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
+    max_concurrency = max(1, int(max_concurrency or 1))
     
     results = {
         'run_id': run_id,
@@ -62,6 +316,19 @@ def run_all_approved_mappings(session):
         'details': []
     }
     
+    def record_result(combo, status, message):
+        if status == 'SUCCESS':
+            results['successful'] += 1
+        else:
+            results['failed'] += 1
+        results['details'].append({
+            'tpa': combo['TPA'],
+            'target_table': combo['TARGET_TABLE'],
+            'mapping_count': combo['MAPPING_COUNT'],
+            'status': status,
+            'message': message[:500]  # Limit message length
+        })
+    
     try:
         # Get all unique TPA + target_table combinations that have approved mappings
         query = """
@@ -83,63 +350,73 @@ def run_all_approved_mappings(session):
         
         results['total_transformations'] = len(combinations)
         
-        # Iterate through each combination and run transformation
-        for combo in combinations:
-            tpa = combo['TPA']
-            target_table = combo['TARGET_TABLE']
-            mapping_count = combo['MAPPING_COUNT']
-            
-            try:
-                # Call the transformation procedure
-                transform_query = f"""
-                    CALL transform_bronze_to_silver(
-                        '{target_table}',
-                        '{tpa}',
+        def sql_literal(value):
+            return "'" + str(value).replace("'", "''") + "'"
+        
+        # Queue one transform call per combination for the worker tasks
+        combos_by_item = {}
+        queue_rows = []
+        queue_params = []
+        for item_id, combo in enumerate(combinations):
+            combos_by_item[item_id] = combo
+            queue_rows.append("(?, ?, ?, ?)")
+            queue_params.extend([
+                run_id,
+                item_id,
+                f"{combo['TPA']}.{combo['TARGET_TABLE']}",
+                f"""CALL transform_bronze_to_silver(
+                        {sql_literal(combo['TARGET_TABLE'])},
+                        {sql_literal(combo['TPA'])},
                         'RAW_DATA_TABLE',
                         'BRONZE',
                         10000,
                         TRUE,
-                        FALSE
-                    )
-                """
-                
-                result = session.sql(transform_query).collect()
-                
-                # Extract result message
-                if result and len(result) > 0:
-                    result_msg = result[0][0] if result[0] else 'Unknown result'
-                else:
-                    result_msg = 'No result returned'
-                
-                results['successful'] += 1
-                results['details'].append({
-                    'tpa': tpa,
-                    'target_table': target_table,
-                    'mapping_count': mapping_count,
-                    'status': 'SUCCESS',
-                    'message': result_msg
-                })
+                        TRUE
+                    )"""
+            ])
+        session.sql(f"""
+            INSERT INTO parallel_call_queue (run_id, item_id, item_key, call_sql)
+            VALUES {', '.join(queue_rows)}
+        """, params=queue_params).collect()
+        
+        seen = set()
+        try:
+            session.sql("CALL start_parallel_calls(?, ?)", params=[run_id, max_concurrency]).collect()
+            
+            while len(seen) < len(combinations):
+                finished = json.loads(session.sql("CALL poll_parallel_calls(?)", params=[run_id]).collect()[0][0])
+                new_items = [item for item in finished if item['item_id'] not in seen]
+                if not new_items:
+                    time.sleep(2)
+                    continue
                 
-            except Exception as e:
-                results['failed'] += 1
-                error_msg = str(e)[:500]  # Limit error message length
-                results['details'].append({
-                    'tpa': tpa,
-                    'target_table': target_table,
-                    'mapping_count': mapping_count,
-                    'status': 'FAILED',
-                    'message': error_msg
-                })
+                for item in new_items:
+                    seen.add(item['item_id'])
+                    result_msg = item['result'] or 'No result returned'
+                    failed = item['status'] == 'FAILED' or result_msg.startswith(('ERROR', 'PARTIAL'))
+                    record_result(combos_by_item[item['item_id']], 'FAILED' if failed else 'SUCCESS', result_msg)
+        finally:
+            session.sql("CALL stop_parallel_calls(?)", params=[run_id]).collect()
         
-        # Log summary to processing log
-        summary = f"Run ID: {run_id} | Total: {results['total_transformations']} | Success: {results['successful']} | Failed: {results['failed']}"
+        # Log summary to processing log (failed combinations in error_message)
+        summary = f"Run ID: {run_id} | Total: {results['total_transformations']} | Success: {results['successful']} | Failed: {results['failed']} | Max concurrency: {max_concurrency}"
+        failures = '; '.join(
+            f"{d['tpa']}.{d['target_table']}: {d['message']}"
+            for d in sorted(results['details'], key=lambda d: (d['tpa'], d['target_table']))
+            if d['status'] == 'FAILED'
+        )
         
-        session.sql(f"""
-            INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, records_processed)
-            VALUES ('{run_id}', 'ALL', 'AUTO_TRANSFORM', 'ALL_TABLES', 'AUTO_TRANSFORMATION', 
-                    CASE WHEN {results['failed']} = 0 THEN 'SUCCESS' ELSE 'PARTIAL' END,
-                    {results['successful']})
-        """).collect()
+        session.sql("""
+            INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, records_processed, records_success, records_failed, error_message)
+            VALUES (?, 'ALL', 'AUTO_TRANSFORM', 'ALL_TABLES', 'AUTO_TRANSFORMATION', ?, ?, ?, ?, ?)
+        """, params=[
+            run_id,
+            'SUCCESS' if results['failed'] == 0 else 'PARTIAL',
+            results['successful'],
+            results['successful'],
+            results['failed'],
+            failures[:5000] or None
+        ]).collect()
         
         return summary
         
@@ -166,6 +443,155 @@ CREATE OR REPLACE TASK auto_transform_mappings_task
 AS
 CALL run_all_approved_mappings();
 
+-- ============================================
+-- CDC: Stream on Bronze RAW_DATA_TABLE
+-- ============================================
+-- Append-only: only inserted rows are captured. IF NOT EXISTS keeps the
+-- stream offset across redeployments.
+
+SET RAW_DATA_TABLE_NAME = $DATABASE_NAME || '.' || $BRONZE_SCHEMA_NAME || '.RAW_DATA_TABLE';
+
+CREATE STREAM IF NOT EXISTS raw_data_cdc_stream
+    ON TABLE IDENTIFIER($RAW_DATA_TABLE_NAME)
+    APPEND_ONLY = TRUE
+    COMMENT = 'Inserted RAW_DATA_TABLE rows for CDC-mode Silver transformations';
+
+-- ============================================
+-- PROCEDURE: Run CDC Transformations
+-- ============================================
+
+CREATE OR REPLACE PROCEDURE run_cdc_transformations()
+RETURNS VARCHAR
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run_cdc_transformations'
+AS
+$$
+def run_cdc_transformations(session):
+    """
+    Consume raw_data_cdc_stream into cdc_pending_records, then transform the
+    pending rows of each TPA into every target table with approved mappings.
+    
+    Transformations run in incremental mode, so each (TPA, target table) only
+    merges rows above its watermark, i.e. the newly inserted rows. Pending rows
+    are released once all of a TPA's tables succeed; on failure they stay
+    queued and are retried on the next trigger.
+    """
+    
+    import uuid
+    from datetime import datetime
+    
+    run_id = f"CDC_TRANSFORM_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
+    
+    successful = 0
+    failed = 0
+    
+    try:
+        # Consuming the stream in a DML transaction advances its offset
+        session.sql("BEGIN").collect()
+        try:
+            session.sql("""
+                INSERT INTO cdc_pending_records (record_id, tpa)
+                SELECT RECORD_ID, TPA
+                FROM raw_data_cdc_stream
+                WHERE METADATA$ACTION = 'INSERT'
+                  AND RAW_DATA IS NOT NULL
+            """).collect()
+            session.sql("COMMIT").collect()
+        except Exception:
+            session.sql("ROLLBACK").collect()
+            raise
+        
+        pending = session.sql("""
+            SELECT tpa, MAX(record_id) AS max_record_id, COUNT(*) AS record_count
+            FROM cdc_pending_records
+            GROUP BY tpa
+            ORDER BY tpa
+        """).collect()
+        
+        if not pending:
+            return f"No pending CDC records. Run ID: {run_id}"
+        
+        # Route each TPA's new rows to the tables it has approved mappings for
+        routes = {}
+        for row in session.sql("""
+            SELECT DISTINCT tpa, target_table
+            FROM field_mappings
+            WHERE approved = TRUE
+              AND active = TRUE
+        """).collect():
+            routes.setdefault(row['TPA'], []).append(row['TARGET_TABLE'])
+        
+        for tpa_row in pending:
+            tpa = tpa_row['TPA']
+            max_record_id = tpa_row['MAX_RECORD_ID']
+            tpa_ok = True
+            
+            # TPAs without approved mappings are released; their first
+            # transformation starts from the watermark and picks these rows up.
+            for target_table in routes.get(tpa, []):
+                try:
+                    result = session.sql(f"""
+                        CALL transform_bronze_to_silver(
+                            '{target_table}',
+                            '{tpa}',
+                            'RAW_DATA_TABLE',
+                            'BRONZE',
+                            10000,
+                            TRUE,
+                            TRUE
+                        )
+                    """).collect()
+                    result_msg = result[0][0] if result and result[0] else ''
+                    if str(result_msg).startswith(('ERROR', 'PARTIAL')):
+                        raise Exception(result_msg)
+                    successful += 1
+                except Exception:
+                    tpa_ok = False
+                    failed += 1
+            
+            if tpa_ok:
+                session.sql("""
+                    DELETE FROM cdc_pending_records
+                    WHERE tpa = ?
+                      AND record_id <= ?
+                """, params=[tpa, max_record_id]).collect()
+        
+        records_captured = sum(row['RECORD_COUNT'] for row in pending)
+        session.sql(f"""
+            INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, records_processed)
+            VALUES ('{run_id}', 'ALL', 'RAW_DATA_CDC_STREAM', 'ALL_TABLES', 'CDC_TRANSFORMATION', 
+                    CASE WHEN {failed} = 0 THEN 'SUCCESS' ELSE 'PARTIAL' END,
+                    {records_captured})
+        """).collect()
+        
+        return f"Run ID: {run_id} | TPAs: {len(pending)} | Records: {records_captured} | Success: {successful} | Failed: {failed}"
+        
+    except Exception as e:
+        error_msg = str(e).replace("'", "''")[:5000]
+        
+        session.sql(f"""
+            INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, error_message)
+            VALUES ('{run_id}', 'ALL', 'RAW_DATA_CDC_STREAM', 'ALL_TABLES', 'CDC_TRANSFORMATION', 'FAILED', '{error_msg}')
+        """).collect()
+        
+        return f"ERROR: {str(e)}"
+$$;
+
+-- ============================================
+-- TASK 2: CDC Transform (Triggered Task, optional)
+-- ============================================
+-- No SCHEDULE: runs whenever the stream has new rows. Left SUSPENDED unless
+-- SILVER_CDC_ENABLED="true" at deploy time (see deployment/resume_silver_cdc_task.sql).
+
+CREATE OR REPLACE TASK cdc_transform_task
+    WAREHOUSE = IDENTIFIER($WAREHOUSE_NAME)
+    COMMENT = 'CDC mode: transform newly inserted Bronze rows via approved mappings as soon as raw_data_cdc_stream has data.'
+    WHEN SYSTEM$STREAM_HAS_DATA('RAW_DATA_CDC_STREAM')
+AS
+CALL run_cdc_transformations();
+
 -- ============================================
 -- VERIFICATION PROCEDURE
 -- ============================================
@@ -293,6 +719,7 @@ $$;
 --
 -- To manually resume tasks, run:
 --   ALTER TASK auto_transform_mappings_task RESUME;
+--   ALTER TASK cdc_transform_task RESUME;   -- optional CDC mode
 
 -- ============================================
 -- VERIFICATION
@@ -318,6 +745,9 @@ SELECT 'Silver tasks created successfully' AS status,
 
 -- Example 2: Manually run all transformations
 -- CALL run_all_approved_mappings();
+--
+-- Example 2b: Run all transformations with up to 8 in parallel (1 = sequential)
+-- CALL run_all_approved_mappings(8);
 
 -- Example 3: Manually run transformations for specific TPA
 -- CALL run_transformations_manual('provider_a', 'ALL');
@@ -328,7 +758,13 @@ SELECT 'Silver tasks created successfully' AS status,
 -- Example 5: Manually run transformations for specific TPA and table
 -- CALL run_transformations_manual('provider_a', 'CLAIMS');
 
--- Example 6: View recent transformation logs
+-- Example 6: Enable CDC mode (transform new Bronze rows within minutes)
+-- ALTER TASK cdc_transform_task RESUME;
+
+-- Example 7: Run CDC transformations on demand
+-- CALL run_cdc_transformations();
+
+-- Example 8: View recent transformation logs
 -- SELECT * FROM silver_processing_log 
 -- WHERE processing_type = 'AUTO_TRANSFORMATION' 
 -- ORDER BY end_timestamp DESC 
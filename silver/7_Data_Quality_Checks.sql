@@ -5,8 +5,8 @@
 --
 -- Quality Checks:
 --   1. Row Count Validation
---   2. Null Value Analysis
---   3. Data Freshness Check
+--   2. Data Freshness Check
+--   3. Column Profiling (null rate, distinct count, min/max, pattern violations)
 -- ============================================
 
 SET DATABASE_NAME = '$DATABASE_NAME';
@@ -18,157 +18,546 @@ USE DATABASE IDENTIFIER($DATABASE_NAME);
 USE SCHEMA IDENTIFIER($SILVER_SCHEMA_NAME);
 
 -- ============================================
--- PROCEDURE: Run Basic Data Quality Checks
+-- PROCEDURE: Run Data Quality Checks
 -- ============================================
--- Runs basic data quality checks on a Silver table
+-- Runs data quality checks on a Silver table in a single aggregate scan.
+-- Always: ROW_COUNT and DATA_FRESHNESS_HOURS.
+-- Profiling (p_profile, default TRUE), per business column:
+--   NULL_RATE_<col>           percent NULL (fails when the column is required)
+--   DISTINCT_COUNT_<col>      approximate distinct count (HLL)
+--   MIN_<col> / MAX_<col>     numeric and date/timestamp columns
+--   PATTERN_VIOLATIONS_<col>  values not matching column_quality_patterns
+-- All metrics are written with one multi-row INSERT into data_quality_metrics.
+--
+-- Profiled statistics are kept per table in column_profile_aggregates
+-- (counts, min/max and an exported HLL sketch per column). With
+-- p_source_batch_id (a Silver _BATCH_ID, or 'LATEST' for every transformed
+-- batch not yet profiled) only those rows are scanned and merged into the
+-- aggregates; table-level metrics are then read back from them. A full scan
+-- rebuilds the aggregates instead when there is no baseline, the columns or
+-- patterns changed, or a batch rewrote or deduplicated existing rows.
 -- Returns: Summary of quality metrics
 
+DROP PROCEDURE IF EXISTS run_data_quality_checks(VARCHAR, VARCHAR, VARCHAR);
+DROP PROCEDURE IF EXISTS run_data_quality_checks(VARCHAR, VARCHAR, VARCHAR, BOOLEAN);
+
 CREATE OR REPLACE PROCEDURE run_data_quality_checks(
     p_table_name VARCHAR,
     p_tpa VARCHAR,
-    p_batch_id VARCHAR DEFAULT NULL
+    p_batch_id VARCHAR DEFAULT NULL,
+    p_profile BOOLEAN DEFAULT TRUE,
+    p_source_batch_id VARCHAR DEFAULT NULL
 )
 RETURNS VARCHAR
-LANGUAGE SQL
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run_data_quality_checks'
 AS
 $$
-DECLARE
-    v_batch_id VARCHAR;
-    v_full_table_name VARCHAR;
-    v_result_msg VARCHAR;
-BEGIN
-    -- Generate batch ID if not provided
-    v_batch_id := COALESCE(:p_batch_id, 'DQ_' || TO_VARCHAR(CURRENT_TIMESTAMP(), 'YYYYMMDD_HH24MISS'));
+import json
+from datetime import datetime
+from decimal import Decimal
+
+NUMERIC_TYPES = ('NUMBER', 'DECIMAL', 'NUMERIC', 'INT', 'INTEGER', 'BIGINT', 'SMALLINT', 'TINYINT', 'FLOAT', 'DOUBLE', 'REAL')
+TEMPORAL_TYPES = ('DATE', 'DATETIME', 'TIMESTAMP', 'TIMESTAMP_NTZ', 'TIMESTAMP_LTZ', 'TIMESTAMP_TZ')
+UNPROFILED_TYPES = ('VARIANT', 'OBJECT', 'ARRAY', 'GEOGRAPHY', 'GEOMETRY', 'BINARY', 'VARBINARY')
+FRESHNESS_THRESHOLD_HOURS = 24.0
+QUALITY_SCORE_THRESHOLD = 80.0
+TABLE_ENTRY = '*'
+
+def sql_literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float, Decimal)):
+        return repr(float(value))
+    return "'" + str(value).replace("'", "''") + "'"
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def get_patterns(session, table_name):
+    """Return {COLUMN_NAME: pattern}; table-specific patterns override DEFAULT ones"""
+    result = session.sql("""
+        SELECT UPPER(column_name) AS column_name, pattern
+        FROM column_quality_patterns
+        WHERE UPPER(table_name) IN (?, 'DEFAULT')
+          AND active = TRUE
+        ORDER BY IFF(UPPER(table_name) = 'DEFAULT', 1, 0) DESC
+    """, params=[table_name.upper()]).collect()
+    return {row['COLUMN_NAME']: row['PATTERN'] for row in result}
+
+def profiled_columns(columns):
+    """Business columns that get per-column statistics"""
+    return {c: t for c, t in columns.items() if not c.startswith('_') and t not in UNPROFILED_TYPES}
+
+def build_scan_query(full_table_name, columns, patterns, profile, source_batches=None):
+    """One aggregate SELECT returning an ARRAY of partial statistics
     
-    -- Construct full table name
-    v_full_table_name := UPPER(:p_tpa) || '_' || UPPER(:p_table_name);
+    The '*' entry holds table-level values (and the _BATCH_IDs seen); each
+    profiled column gets an entry with its counts, min/max and exported HLL
+    sketch. With source_batches the scan is limited to those _BATCH_IDs.
+    """
+    table_parts = [f"'column_name', '{TABLE_ENTRY}'", "'row_count', COUNT(*)"]
+    if '_LOAD_TIMESTAMP' in columns:
+        table_parts.append("'max_load_timestamp', MAX(_LOAD_TIMESTAMP)")
+        table_parts.append("'freshness_hours', DATEDIFF(hour, MAX(_LOAD_TIMESTAMP), CURRENT_TIMESTAMP())")
+    if '_BATCH_ID' in columns:
+        table_parts.append("'batch_ids', ARRAY_UNIQUE_AGG(_BATCH_ID)")
+    entries = [f"OBJECT_CONSTRUCT({', '.join(table_parts)})"]
     
-    -- Check if table exists
-    LET table_exists INTEGER := (
-        SELECT COUNT(*) 
-        FROM INFORMATION_SCHEMA.TABLES 
-        WHERE TABLE_SCHEMA = $SILVER_SCHEMA_NAME
-          AND TABLE_NAME = :v_full_table_name
-    );
+    if profile:
+        for column, base_type in profiled_columns(columns).items():
+            col = quote_identifier(column)
+            parts = [
+                f"'column_name', {sql_literal(column)}",
+                "'row_count', COUNT(*)",
+                f"'null_count', COUNT_IF({col} IS NULL)",
+                f"'hll_state', HLL_EXPORT(HLL_ACCUMULATE({col}))"
+            ]
+            if base_type in NUMERIC_TYPES:
+                parts.append(f"'min_numeric', MIN({col})::FLOAT, 'max_numeric', MAX({col})::FLOAT")
+            elif base_type in TEMPORAL_TYPES:
+                parts.append(f"'min_text', MIN({col})::VARCHAR, 'max_text', MAX({col})::VARCHAR")
+            if column in patterns:
+                parts.append(f"'pattern', {sql_literal(patterns[column])}")
+                parts.append(f"'pattern_violations', COUNT_IF({col} IS NOT NULL AND NOT REGEXP_LIKE({col}::VARCHAR, {sql_literal(patterns[column])}))")
+            entries.append(f"OBJECT_CONSTRUCT({', '.join(parts)})")
     
-    IF (table_exists = 0) THEN
-        RETURN 'ERROR: Table ' || :v_full_table_name || ' does not exist';
-    END IF;
+    where = ""
+    if source_batches:
+        where = f"\n        WHERE _BATCH_ID IN ({', '.join(sql_literal(b) for b in source_batches)})"
+    return f"""
+        SELECT ARRAY_CONSTRUCT(
+            {(','+chr(10)+'            ').join(entries)}
+        ) AS stats
+        FROM {full_table_name}{where}"""
+
+# Values shared by the rebuild INSERT and the batch MERGE (s.v = one scan entry)
+AGGREGATE_VALUES = """
+    s.v:row_count::NUMBER, COALESCE(s.v:null_count::NUMBER, 0), s.hll_state,
+    s.v:min_numeric::FLOAT, s.v:max_numeric::FLOAT, s.v:min_text::VARCHAR, s.v:max_text::VARCHAR,
+    s.v:pattern::VARCHAR, COALESCE(s.v:pattern_violations::NUMBER, 0), s.v:max_load_timestamp::TIMESTAMP_NTZ"""
+
+AGGREGATE_COLUMNS = """
+    (tpa, target_table, column_name, row_count, null_count, hll_state,
+     min_numeric, max_numeric, min_text, max_text, pattern, pattern_violations,
+     max_load_timestamp, profiled_batch_ids)"""
+
+def rebuild_aggregates(session, tpa, full_table_name, scan_query):
+    """Replace the table's aggregates with statistics from a full scan"""
+    session.sql("BEGIN").collect()
+    try:
+        session.sql("""
+            DELETE FROM column_profile_aggregates
+            WHERE tpa = ? AND target_table = ?
+        """, params=[tpa, full_table_name]).collect()
+        session.sql(f"""
+            INSERT INTO column_profile_aggregates {AGGREGATE_COLUMNS}
+            SELECT ?, ?, s.v:column_name::VARCHAR, {AGGREGATE_VALUES},
+                   COALESCE(s.v:batch_ids::ARRAY, ARRAY_CONSTRUCT())
+            FROM (
+                SELECT f.value AS v, f.value:hll_state AS hll_state
+                FROM ({scan_query}) scan,
+                     LATERAL FLATTEN(input => scan.stats) f
+            ) s
+        """, params=[tpa, full_table_name]).collect()
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+
+def merge_batch_aggregates(session, tpa, full_table_name, scan_query, source_batches):
+    """Scan the given batches and fold their statistics into the table's aggregates
     
-    -- Insert row count metric
-    INSERT INTO data_quality_metrics (
-        batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description
-    )
-    SELECT
-        :v_batch_id,
-        :p_tpa,
-        :v_full_table_name,
-        'ROW_COUNT',
-        COUNT(*),
-        0,
-        COUNT(*) > 0,
-        'Total number of rows in table'
-    FROM IDENTIFIER(:v_full_table_name);
+    Counts add, min/max combine, and HLL sketches are merged with HLL_COMBINE,
+    so distinct counts stay table-level without rescanning earlier batches.
+    """
+    batches_json = json.dumps(source_batches)
+    session.sql(f"""
+        MERGE INTO column_profile_aggregates t
+        USING (
+            WITH batch AS (
+                SELECT f.value:column_name::VARCHAR AS column_name, f.value AS v
+                FROM ({scan_query}) scan,
+                     LATERAL FLATTEN(input => scan.stats) f
+            ),
+            sketches AS (
+                SELECT column_name, v:hll_state AS hll_state FROM batch WHERE v:hll_state IS NOT NULL
+                UNION ALL
+                SELECT column_name, hll_state
+                FROM column_profile_aggregates
+                WHERE tpa = ? AND target_table = ? AND hll_state IS NOT NULL
+            ),
+            combined AS (
+                SELECT column_name, HLL_EXPORT(HLL_COMBINE(HLL_IMPORT(hll_state))) AS hll_state
+                FROM sketches
+                GROUP BY column_name
+            )
+            SELECT b.column_name, b.v, c.hll_state
+            FROM batch b
+            LEFT JOIN combined c ON c.column_name = b.column_name
+        ) s
+        ON t.tpa = ? AND t.target_table = ? AND t.column_name = s.column_name
+        WHEN MATCHED THEN UPDATE SET
+            row_count = t.row_count + s.v:row_count::NUMBER,
+            null_count = t.null_count + COALESCE(s.v:null_count::NUMBER, 0),
+            hll_state = s.hll_state,
+            min_numeric = LEAST_IGNORE_NULLS(t.min_numeric, s.v:min_numeric::FLOAT),
+            max_numeric = GREATEST_IGNORE_NULLS(t.max_numeric, s.v:max_numeric::FLOAT),
+            min_text = LEAST_IGNORE_NULLS(t.min_text, s.v:min_text::VARCHAR),
+            max_text = GREATEST_IGNORE_NULLS(t.max_text, s.v:max_text::VARCHAR),
+            pattern_violations = t.pattern_violations + COALESCE(s.v:pattern_violations::NUMBER, 0),
+            max_load_timestamp = GREATEST_IGNORE_NULLS(t.max_load_timestamp, s.v:max_load_timestamp::TIMESTAMP_NTZ),
+            profiled_batch_ids = ARRAY_CAT(t.profiled_batch_ids, PARSE_JSON(?)::ARRAY),
+            updated_timestamp = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT {AGGREGATE_COLUMNS}
+            VALUES (?, ?, s.column_name, {AGGREGATE_VALUES}, PARSE_JSON(?)::ARRAY)
+    """, params=[
+        tpa, full_table_name,
+        tpa, full_table_name,
+        batches_json,
+        tpa, full_table_name, batches_json
+    ]).collect()
+
+def load_aggregates(session, tpa, full_table_name):
+    """Return {COLUMN_NAME: stats} from column_profile_aggregates ('*' = table-level)"""
+    result = session.sql("""
+        SELECT column_name, row_count, null_count,
+               HLL_ESTIMATE(HLL_IMPORT(hll_state)) AS distinct_count,
+               min_numeric, max_numeric, min_text, max_text,
+               pattern, pattern_violations,
+               DATEDIFF(hour, max_load_timestamp, CURRENT_TIMESTAMP()) AS freshness_hours,
+               profiled_batch_ids
+        FROM column_profile_aggregates
+        WHERE tpa = ? AND target_table = ?
+    """, params=[tpa, full_table_name]).collect()
+    return {row['COLUMN_NAME']: {k.lower(): v for k, v in row.as_dict().items()} for row in result}
+
+def baseline_matches(aggregates, columns, patterns):
+    """Aggregates can take a batch merge only if they cover exactly the current columns and patterns"""
+    expected = profiled_columns(columns)
+    if TABLE_ENTRY not in aggregates or set(aggregates) - {TABLE_ENTRY} != set(expected):
+        return False
+    return all(aggregates[c]['pattern'] == patterns.get(c) for c in expected)
+
+def unprofiled_batches(session, tpa, table_name, profiled):
+    """Silver batches that loaded rows into this table and are not in the aggregates yet"""
+    result = session.sql("""
+        SELECT batch_id
+        FROM silver_processing_log
+        WHERE tpa = ?
+          AND UPPER(target_table) = ?
+          AND processing_type = 'TRANSFORMATION'
+          AND status NOT IN ('STARTED', 'IN_PROGRESS')
+          AND (COALESCE(records_inserted, 0) + COALESCE(records_updated, 0)) > 0
+        ORDER BY start_timestamp
+    """, params=[tpa, table_name.upper()]).collect()
+    return [row['BATCH_ID'] for row in result if row['BATCH_ID'] not in profiled]
+
+def batches_are_append_only(session, tpa, source_batches):
+    """False if any batch rewrote existing rows or its rules engine deduplicated the table"""
+    batch_list = ', '.join(sql_literal(b) for b in source_batches)
+    updated = session.sql(f"""
+        SELECT COALESCE(SUM(records_updated), 0) AS records_updated
+        FROM silver_processing_log
+        WHERE batch_id IN ({batch_list})
+          AND processing_type = 'TRANSFORMATION'
+    """).collect()[0]['RECORDS_UPDATED']
+    if updated:
+        return False
+    deduplicated = session.sql(f"""
+        SELECT COALESCE(SUM(m.metric_value), 0) AS rows_removed
+        FROM data_quality_metrics m
+        JOIN transformation_rules r
+          ON m.metric_name = 'RULE_' || r.rule_id
+         AND r.tpa = m.tpa
+        WHERE m.batch_id IN ({batch_list})
+          AND m.tpa = ?
+          AND r.rule_type = 'DEDUPLICATION'
+    """, params=[tpa]).collect()[0]['ROWS_REMOVED']
+    return not deduplicated
+
+def build_metrics(stats, columns, required, patterns, profile):
+    """Turn statistics into (metric_name, metric_value, metric_threshold, passed, description) tuples"""
+    table_stats = stats[TABLE_ENTRY]
+    row_count = table_stats['row_count'] or 0
+    metrics = [('ROW_COUNT', row_count, 0, row_count > 0, 'Total number of rows in table')]
     
-    -- Insert freshness metric if _LOAD_TIMESTAMP exists
-    INSERT INTO data_quality_metrics (
-        batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description
-    )
-    SELECT
-        :v_batch_id,
-        :p_tpa,
-        :v_full_table_name,
-        'DATA_FRESHNESS_HOURS',
-        DATEDIFF(hour, MAX(_LOAD_TIMESTAMP), CURRENT_TIMESTAMP()),
-        24.0,
-        DATEDIFF(hour, MAX(_LOAD_TIMESTAMP), CURRENT_TIMESTAMP()) <= 24.0,
-        'Hours since last data load'
-    FROM IDENTIFIER(:v_full_table_name)
-    WHERE EXISTS (
-        SELECT 1 
-        FROM INFORMATION_SCHEMA.COLUMNS 
-        WHERE TABLE_SCHEMA = $SILVER_SCHEMA_NAME
-          AND TABLE_NAME = :v_full_table_name
-          AND COLUMN_NAME = '_LOAD_TIMESTAMP'
-    );
+    if '_LOAD_TIMESTAMP' in columns:
+        hours = table_stats.get('freshness_hours')
+        metrics.append((
+            'DATA_FRESHNESS_HOURS', hours, FRESHNESS_THRESHOLD_HOURS,
+            None if hours is None else hours <= FRESHNESS_THRESHOLD_HOURS,
+            'Hours since last data load'
+        ))
     
-    -- Calculate and insert overall quality score
-    INSERT INTO data_quality_metrics (
-        batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description
-    )
-    SELECT
-        :v_batch_id,
-        :p_tpa,
-        :v_full_table_name,
-        'OVERALL_QUALITY_SCORE',
-        (SUM(CASE WHEN passed THEN 1 ELSE 0 END)::FLOAT / COUNT(*)::FLOAT) * 100,
-        80.0,
-        (SUM(CASE WHEN passed THEN 1 ELSE 0 END)::FLOAT / COUNT(*)::FLOAT) * 100 >= 80.0,
-        'Overall data quality score: ' || SUM(CASE WHEN passed THEN 1 ELSE 0 END) || ' of ' || COUNT(*) || ' checks passed'
-    FROM data_quality_metrics
-    WHERE batch_id = :v_batch_id
-      AND target_table = :v_full_table_name;
+    if not profile:
+        return metrics
+    
+    for column, base_type in profiled_columns(columns).items():
+        column_stats = stats.get(column)
+        if column_stats is None:
+            continue
+        nulls = column_stats['null_count'] or 0
+        null_rate = round(nulls * 100.0 / row_count, 4) if row_count else 0.0
+        if column in required:
+            metrics.append((f'NULL_RATE_{column}', null_rate, 0, nulls == 0, f'Percent of rows with NULL {column} (required column)'))
+        else:
+            metrics.append((f'NULL_RATE_{column}', null_rate, None, None, f'Percent of rows with NULL {column}'))
+        metrics.append((f'DISTINCT_COUNT_{column}', column_stats['distinct_count'], None, None, f'Approximate distinct values in {column} (HLL)'))
+        for bound, label in (('min', 'Minimum'), ('max', 'Maximum')):
+            if base_type in NUMERIC_TYPES:
+                metrics.append((f'{bound.upper()}_{column}', column_stats.get(f'{bound}_numeric'), None, None, f'{label} value of {column}'))
+            elif base_type in TEMPORAL_TYPES:
+                metrics.append((f'{bound.upper()}_{column}', None, None, None, f"{label} value of {column}: {column_stats.get(f'{bound}_text')}"))
+        if column in patterns:
+            violations = column_stats.get('pattern_violations') or 0
+            metrics.append((
+                f'PATTERN_VIOLATIONS_{column}', violations, 0, violations == 0,
+                f'Values in {column} not matching {patterns[column]}'
+            ))
+    
+    return metrics
+
+def run_data_quality_checks(session, p_table_name, p_tpa, p_batch_id, p_profile, p_source_batch_id):
+    # Generate batch ID if not provided
+    batch_id = p_batch_id or f"DQ_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    profile = p_profile is not False
+    
+    # Construct full table name
+    full_table_name = f"{p_tpa.upper()}_{p_table_name.upper()}"
+    
+    # Column names, types and nullability (metadata only, no table scan)
+    try:
+        described = session.sql(f"DESCRIBE TABLE {full_table_name}").collect()
+    except Exception:
+        return f"ERROR: Table {full_table_name} does not exist"
+    columns = {row['name'].upper(): row['type'].split('(')[0].strip().upper() for row in described}
+    required = {row['name'].upper() for row in described if row['null?'] == 'N'}
+    patterns = get_patterns(session, p_table_name) if profile else {}
     
-    -- Return summary
-    LET v_quality_score FLOAT := (
-        SELECT metric_value 
-        FROM data_quality_metrics 
-        WHERE batch_id = :v_batch_id 
-          AND metric_name = 'OVERALL_QUALITY_SCORE'
-        LIMIT 1
-    );
+    if not profile:
+        # Table-level checks only: one scan, nothing persisted
+        scan = session.sql(build_scan_query(full_table_name, columns, patterns, False)).collect()[0]
+        stats = {TABLE_ENTRY: json.loads(scan['STATS'])[0]}
+        scope_msg = "full scan"
+    else:
+        aggregates = load_aggregates(session, p_tpa, full_table_name)
+        profiled = set(json.loads(aggregates[TABLE_ENTRY]['profiled_batch_ids'] or '[]')) if TABLE_ENTRY in aggregates else set()
+        
+        # None = full scan; otherwise the Silver batches still to merge
+        if not p_source_batch_id:
+            source_batches = None
+        elif p_source_batch_id.upper() == 'LATEST':
+            source_batches = unprofiled_batches(session, p_tpa, p_table_name, profiled)
+        else:
+            source_batches = [] if p_source_batch_id in profiled else [p_source_batch_id]
+        
+        if source_batches is not None and not baseline_matches(aggregates, columns, patterns):
+            source_batches = None
+        elif source_batches and not batches_are_append_only(session, p_tpa, source_batches):
+            source_batches = None
+        
+        if source_batches is None:
+            rebuild_aggregates(session, p_tpa, full_table_name,
+                               build_scan_query(full_table_name, columns, patterns, True))
+            scope_msg = "full scan"
+        elif source_batches:
+            merge_batch_aggregates(session, p_tpa, full_table_name,
+                                   build_scan_query(full_table_name, columns, patterns, True, source_batches),
+                                   source_batches)
+            scope_msg = f"{len(source_batches)} batch(es) merged"
+        else:
+            scope_msg = "no new batches"
+        stats = load_aggregates(session, p_tpa, full_table_name)
     
-    v_result_msg := 'Data Quality Check Complete for ' || :v_full_table_name || 
-                    '. Score: ' || ROUND(:v_quality_score, 2) || '%. Batch ID: ' || :v_batch_id;
+    metrics = build_metrics(stats, columns, required, patterns, profile)
+    
+    # Overall score over pass/fail checks (profile statistics are informational)
+    checks = [m for m in metrics if m[3] is not None]
+    passed = sum(1 for m in checks if m[3])
+    quality_score = passed * 100.0 / len(checks) if checks else 0.0
+    metrics.append((
+        'OVERALL_QUALITY_SCORE', quality_score, QUALITY_SCORE_THRESHOLD, quality_score >= QUALITY_SCORE_THRESHOLD,
+        f'Overall data quality score: {passed} of {len(checks)} checks passed'
+    ))
+    
+    values = ',\n            '.join(
+        f"({sql_literal(batch_id)}, {sql_literal(p_tpa)}, {sql_literal(full_table_name)}, {', '.join(sql_literal(v) for v in metric)})"
+        for metric in metrics
+    )
+    session.sql(f"""
+        INSERT INTO data_quality_metrics (
+            batch_id, tpa, target_table, metric_name, metric_value, metric_threshold, passed, description
+        )
+        VALUES
+            {values}
+    """).collect()
     
-    RETURN v_result_msg;
-END;
+    return (f"Data Quality Check Complete for {full_table_name} ({scope_msg}). Score: {round(quality_score, 2)}%. "
+            f"{len(metrics)} metrics recorded. Batch ID: {batch_id}")
 $$;
 
 -- ============================================
 -- PROCEDURE: Run Data Quality Checks for All Tables
 -- ============================================
--- Runs data quality checks on all Silver tables for a TPA
+-- Runs data quality checks on all Silver tables for a TPA (NULL or 'ALL' =
+-- every TPA). Tables are independent, so up to p_max_concurrency
+-- run_data_quality_checks calls run at once, each in the session of its own
+-- worker task (start_parallel_calls in 6_Silver_Tasks.sql): the checks commit
+-- their own transactions, which are scoped to a session.
+-- p_source_batch_id is passed to each table ('LATEST' = only batches not yet profiled).
+-- Progress and the roll-up are logged to silver_processing_log
+-- (processing_type DATA_QUALITY, batch_id = the DQ batch ID).
+
+DROP PROCEDURE IF EXISTS run_data_quality_checks_all(VARCHAR, VARCHAR);
+DROP PROCEDURE IF EXISTS run_data_quality_checks_all(VARCHAR, VARCHAR, VARCHAR);
 
 CREATE OR REPLACE PROCEDURE run_data_quality_checks_all(
     p_tpa VARCHAR,
-    p_batch_id VARCHAR DEFAULT NULL
+    p_batch_id VARCHAR DEFAULT NULL,
+    p_source_batch_id VARCHAR DEFAULT NULL,
+    p_max_concurrency INTEGER DEFAULT 4
 )
 RETURNS VARCHAR
-LANGUAGE SQL
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'run_data_quality_checks_all'
 AS
 $$
-DECLARE
-    v_batch_id VARCHAR;
-    v_tables_checked INTEGER DEFAULT 0;
-    v_result_msg VARCHAR;
-BEGIN
-    -- Generate batch ID if not provided
-    v_batch_id := COALESCE(:p_batch_id, :p_tpa || '_DQ_' || TO_VARCHAR(CURRENT_TIMESTAMP(), 'YYYYMMDD_HH24MISS'));
+import json
+import time
+import uuid
+from datetime import datetime
+
+def sql_literal(value):
+    if value is None:
+        return 'NULL'
+    return "'" + str(value).replace("'", "''") + "'"
+
+def run_data_quality_checks_all(session, p_tpa, p_batch_id, p_source_batch_id, p_max_concurrency):
+    all_tpas = not p_tpa or p_tpa.upper() == 'ALL'
+    tpa_label = 'ALL' if all_tpas else p_tpa
     
-    -- Get all tables for this TPA
-    LET tables_cursor CURSOR FOR
-        SELECT DISTINCT physical_table_name, schema_table_name
+    # Generate batch ID if not provided
+    batch_id = p_batch_id or f"{tpa_label}_DQ_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    max_concurrency = max(1, int(p_max_concurrency or 1))
+    
+    # Get all tables for this TPA
+    tables = session.sql(f"""
+        SELECT DISTINCT tpa, schema_table_name
         FROM created_tables
-        WHERE tpa = :p_tpa
-          AND active = TRUE
-        ORDER BY physical_table_name;
+        WHERE active = TRUE
+          {'' if all_tpas else 'AND tpa = ?'}
+        ORDER BY tpa, schema_table_name
+    """, params=[] if all_tpas else [p_tpa]).collect()
+    
+    session.sql("""
+        INSERT INTO silver_processing_log (batch_id, tpa, source_table, target_table, processing_type, status, records_total, records_processed, records_success, records_failed)
+        VALUES (?, ?, 'SILVER_TABLES', 'ALL_TABLES', 'DATA_QUALITY', 'IN_PROGRESS', ?, 0, 0, 0)
+    """, params=[batch_id, tpa_label, len(tables)]).collect()
     
-    FOR table_record IN tables_cursor DO
-        LET table_name VARCHAR := table_record.schema_table_name;
-        LET check_result VARCHAR;
+    succeeded = 0
+    failures = []
+    
+    def record_progress():
+        session.sql("""
+            UPDATE silver_processing_log
+            SET records_processed = ?, records_success = ?, records_failed = ?
+            WHERE batch_id = ? AND processing_type = 'DATA_QUALITY'
+        """, params=[succeeded + len(failures), succeeded, len(failures), batch_id]).collect()
+    
+    try:
+        # Queue one check call per table for the worker tasks
+        run_id = f"{batch_id}_{uuid.uuid4().hex[:8]}"
+        tables_by_item = dict(enumerate(tables))
+        queue_params = []
+        for item_id, table in tables_by_item.items():
+            queue_params.extend([
+                run_id,
+                item_id,
+                f"{table['TPA']}.{table['SCHEMA_TABLE_NAME']}",
+                f"CALL run_data_quality_checks({sql_literal(table['SCHEMA_TABLE_NAME'])}, {sql_literal(table['TPA'])}, "
+                f"{sql_literal(batch_id)}, TRUE, {sql_literal(p_source_batch_id)})"
+            ])
+        if tables:
+            session.sql(f"""
+                INSERT INTO parallel_call_queue (run_id, item_id, item_key, call_sql)
+                VALUES {', '.join('(?, ?, ?, ?)' for _ in tables)}
+            """, params=queue_params).collect()
         
-        -- Run quality checks on this table
-        CALL run_data_quality_checks(:table_name, :p_tpa, :v_batch_id);
+        seen = set()
+        try:
+            if tables:
+                session.sql("CALL start_parallel_calls(?, ?)", params=[run_id, max_concurrency]).collect()
+            
+            while len(seen) < len(tables):
+                finished = json.loads(session.sql("CALL poll_parallel_calls(?)", params=[run_id]).collect()[0][0])
+                new_items = [item for item in finished if item['item_id'] not in seen]
+                if not new_items:
+                    time.sleep(2)
+                    continue
+                
+                for item in new_items:
+                    seen.add(item['item_id'])
+                    result_msg = item['result'] or 'No result returned'
+                    if item['status'] == 'FAILED' or result_msg.startswith('ERROR'):
+                        failures.append(f"{item['item_key']}: {result_msg[:200]}")
+                    else:
+                        succeeded += 1
+                record_progress()
+        finally:
+            if tables:
+                session.sql("CALL stop_parallel_calls(?)", params=[run_id]).collect()
         
-        v_tables_checked := v_tables_checked + 1;
-    END FOR;
-    
-    v_result_msg := 'Data Quality Checks Complete. Checked ' || :v_tables_checked ||
-                    ' tables for TPA: ' || :p_tpa || '. Batch ID: ' || :v_batch_id;
+        # Roll-up of the per-table scores written under this batch
+        rollup = session.sql("""
+            SELECT COUNT(*) AS tables_scored,
+                   AVG(metric_value) AS avg_score,
+                   MIN(metric_value) AS min_score,
+                   COUNT_IF(NOT passed) AS tables_below_threshold
+            FROM data_quality_metrics
+            WHERE batch_id = ?
+              AND metric_name = 'OVERALL_QUALITY_SCORE'
+        """, params=[batch_id]).collect()[0]
+        
+        session.sql("""
+            UPDATE silver_processing_log
+            SET status = ?,
+                records_processed = ?,
+                records_success = ?,
+                records_failed = ?,
+                end_timestamp = CURRENT_TIMESTAMP(),
+                duration_seconds = DATEDIFF(second, start_timestamp, CURRENT_TIMESTAMP()),
+                error_message = ?
+            WHERE batch_id = ? AND processing_type = 'DATA_QUALITY'
+        """, params=[
+            'SUCCESS' if not failures else 'PARTIAL',
+            succeeded + len(failures), succeeded, len(failures),
+            '; '.join(sorted(failures))[:5000] or None,
+            batch_id
+        ]).collect()
+        
+        avg_score = rollup['AVG_SCORE']
+        score_msg = (f" Average score: {round(avg_score, 2)}%, lowest: {round(rollup['MIN_SCORE'], 2)}%,"
+                     f" {rollup['TABLES_BELOW_THRESHOLD']} table(s) below threshold.") if avg_score is not None else ""
+        return (f"Data Quality Checks Complete. Checked {succeeded + len(failures)} tables for TPA: {tpa_label}"
+                f" ({len(failures)} failed).{score_msg} Batch ID: {batch_id}")
     
-    RETURN v_result_msg;
-END;
+    except Exception as e:
+        session.sql("""
+            UPDATE silver_processing_log
+            SET status = 'FAILED',
+                end_timestamp = CURRENT_TIMESTAMP(),
+                duration_seconds = DATEDIFF(second, start_timestamp, CURRENT_TIMESTAMP()),
+                error_message = ?
+            WHERE batch_id = ? AND processing_type = 'DATA_QUALITY'
+        """, params=[str(e)[:5000], batch_id]).collect()
+        return f"ERROR: {str(e)}"
 $$;
 
 -- ============================================
@@ -202,7 +591,7 @@ SELECT
     MAX(CASE WHEN metric_name = 'ROW_COUNT' THEN metric_value END) as row_count,
     MAX(CASE WHEN metric_name = 'DATA_FRESHNESS_HOURS' THEN metric_value END) as hours_since_load,
     SUM(CASE WHEN passed = TRUE THEN 1 ELSE 0 END) as checks_passed,
-    COUNT(*) as total_checks,
+    COUNT(passed) as total_checks,
     MAX(measured_timestamp) as last_check_timestamp
 FROM latest_metrics
 GROUP BY tpa, target_table, batch_id
@@ -257,8 +646,8 @@ COMMENT ON VIEW v_data_quality_trends IS 'Quality score trends over time. Shows
 
 -- Note: Grants will be handled by the main deployment script
 -- These are commented out to avoid syntax errors with IDENTIFIER in GRANT statements
--- GRANT USAGE ON PROCEDURE run_data_quality_checks(VARCHAR, VARCHAR, VARCHAR) TO ROLE BORDEREAU_PROCESSING_PIPELINE_READWRITE;
--- GRANT USAGE ON PROCEDURE run_data_quality_checks_all(VARCHAR, VARCHAR) TO ROLE BORDEREAU_PROCESSING_PIPELINE_READWRITE;
+-- GRANT USAGE ON PROCEDURE run_data_quality_checks(VARCHAR, VARCHAR, VARCHAR, BOOLEAN, VARCHAR) TO ROLE BORDEREAU_PROCESSING_PIPELINE_READWRITE;
+-- GRANT USAGE ON PROCEDURE run_data_quality_checks_all(VARCHAR, VARCHAR, VARCHAR, NUMBER) TO ROLE BORDEREAU_PROCESSING_PIPELINE_READWRITE;
 -- GRANT SELECT ON VIEW v_data_quality_summary TO ROLE BORDEREAU_PROCESSING_PIPELINE_READONLY;
 -- GRANT SELECT ON VIEW v_data_quality_failures TO ROLE BORDEREAU_PROCESSING_PIPELINE_READONLY;
 -- GRANT SELECT ON VIEW v_data_quality_trends TO ROLE BORDEREAU_PROCESSING_PIPELINE_READONLY;
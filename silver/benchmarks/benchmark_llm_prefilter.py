@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark candidate pre-filtering for auto_map_fields_llm
+Renders the chunked prompts with the procedure's own build_chunk_prompts and
+the DEFAULT_FIELD_MAPPING template, with and without the top-K shortlist,
+and compares their total size. Also reports how often each source field's
+true target survives the shortlist (recall@K), on synthetic field names.
+
+Source fields are derived from target fields with the abbreviations,
+casing and separators seen in TPA files, so the true target is known.
+
+Requires: numpy, scipy, pandas, scikit-learn
+Usage: python silver/benchmarks/benchmark_llm_prefilter.py [--sources 300] [--targets 400] [--top-k 10]
+"""
+
+import argparse
+import random
+import re
+import time
+from pathlib import Path
+
+PROCEDURE_FILE = Path(__file__).resolve().parent.parent / '3_Silver_Mapping_Procedures.sql'
+SETUP_FILE = Path(__file__).resolve().parent.parent / '1_Silver_Schema_Setup.sql'
+
+WORDS = [
+    'claim', 'member', 'provider', 'patient', 'service', 'billed', 'allowed', 'paid', 'amount',
+    'date', 'id', 'number', 'code', 'procedure', 'diagnosis', 'status', 'type', 'plan', 'group',
+    'name', 'first', 'last', 'address', 'city', 'state', 'zip', 'phone', 'email', 'npi', 'tax',
+    'drug', 'ndc', 'quantity', 'days', 'supply', 'pharmacy', 'dentist', 'tooth', 'surface',
+    'effective', 'termination', 'copay', 'coinsurance', 'deductible', 'line', 'revenue', 'units'
+]
+ABBREVIATIONS = {'number': 'num', 'amount': 'amt', 'date': 'dt', 'member': 'mbr', 'provider': 'prov', 'service': 'svc'}
+
+
+def load_mapper():
+    """Execute the auto_map_fields_llm procedure body and return its namespace"""
+    sql = PROCEDURE_FILE.read_text()
+    start = sql.index("HANDLER = 'auto_map_fields_llm'")
+    body_start = sql.index('$$', start) + 2
+    body_end = sql.index('$$', body_start)
+    namespace = {}
+    exec(sql[body_start:body_end], namespace)
+    return namespace
+
+
+def load_default_template():
+    """DEFAULT_FIELD_MAPPING template text as seeded by 1_Silver_Schema_Setup.sql"""
+    match = re.search(r"'DEFAULT_FIELD_MAPPING' AS template_id,.*?AS template_name,\s*'(.*?)' AS template_text",
+                      SETUP_FILE.read_text(), re.DOTALL)
+    return match.group(1).replace("''", "'")
+
+
+def make_targets(count, rng):
+    """Synthetic target column names with a short description each"""
+    targets = set()
+    while len(targets) < count:
+        targets.add('_'.join(rng.sample(WORDS, rng.randint(2, 4))).upper())
+    return sorted(targets)
+
+
+def to_source(target, rng):
+    """Rewrite a target column the way a TPA header might spell it"""
+    parts = [ABBREVIATIONS.get(p, p) if rng.random() < 0.4 else p for p in target.lower().split('_')]
+    separator = rng.choice(['_', ' ', '', '-'])
+    name = separator.join(p.capitalize() if separator == '' else p for p in parts)
+    return name.upper() if rng.random() < 0.5 else name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', type=int, default=300)
+    parser.add_argument('--targets', type=int, default=400)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mapper = load_mapper()
+    template = load_default_template()
+    chunk_size = mapper['LLM_CHUNK_SIZE']
+    target_fields = make_targets(args.targets, rng)
+    target_names = [f"CLAIMS.{t}" for t in target_fields]
+    target_desc = [f"CLAIMS.{t} ({t.replace('_', ' ').lower()} of the claim)" for t in target_fields]
+    truth = rng.sample(range(len(target_fields)), min(args.sources, len(target_fields)))
+    source_fields = [to_source(target_fields[j], rng) for j in truth]
+    print(f"Fields: {len(source_fields)} source x {len(target_fields)} target, chunks of {chunk_size}")
+
+    started = time.perf_counter()
+    top, _ = mapper['shortlist_candidates'](source_fields, target_fields, args.top_k)
+    shortlist_seconds = time.perf_counter() - started
+
+    build = mapper['build_chunk_prompts']
+    full_prompts = build(template, source_fields, target_desc, target_names)
+    shortlist_prompts = build(template, source_fields, target_desc, target_names, top)
+    full_chars = sum(len(p) for p in full_prompts)
+    shortlist_chars = sum(len(p) for p in shortlist_prompts)
+
+    recall = sum(truth[i] in top[i] for i in range(len(source_fields))) / len(source_fields)
+    print(f"Shortlist:   {shortlist_seconds:8.2f}s for top-{args.top_k}")
+    print(f"Prompts:     {full_chars:10,d} chars in {len(full_prompts)} prompt(s) without shortlist "
+          f"(largest {max(len(p) for p in full_prompts):,d})")
+    print(f"             {shortlist_chars:10,d} chars in {len(shortlist_prompts)} prompt(s) with shortlist "
+          f"(largest {max(len(p) for p in shortlist_prompts):,d}, {full_chars / max(shortlist_chars, 1):.1f}x smaller)")
+    print(f"Recall@{args.top_k}:   {recall:8.1%} of source fields keep their true target")
+
+
+if __name__ == '__main__':
+    main()
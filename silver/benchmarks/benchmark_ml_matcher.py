@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark the auto_map_fields_ml matcher
+Compares the vectorized scorer in 3_Silver_Mapping_Procedures.sql with the
+previous per-pair loop on synthetic field names (default 2,000 x 2,000).
+
+The per-pair loop is far too slow to run over the full grid, so it is timed
+on a sample of source fields and extrapolated; the sampled rows are also
+checked to produce the same top-N matches as the vectorized scorer.
+
+Requires: numpy, scipy, pandas, scikit-learn
+Usage: python silver/benchmarks/benchmark_ml_matcher.py [--sources 2000] [--targets 2000]
+"""
+
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from sklearn.metrics.pairwise import cosine_similarity
+
+PROCEDURE_FILE = Path(__file__).resolve().parent.parent / '3_Silver_Mapping_Procedures.sql'
+
+WORDS = [
+    'claim', 'member', 'provider', 'patient', 'service', 'billed', 'allowed', 'paid', 'amount',
+    'date', 'id', 'number', 'code', 'procedure', 'diagnosis', 'status', 'type', 'plan', 'group',
+    'name', 'first', 'last', 'address', 'city', 'state', 'zip', 'phone', 'email', 'npi', 'tax',
+    'drug', 'ndc', 'quantity', 'days', 'supply', 'pharmacy', 'dentist', 'tooth', 'surface',
+    'effective', 'termination', 'copay', 'coinsurance', 'deductible', 'line', 'revenue', 'units'
+]
+ABBREVIATIONS = {'number': 'num', 'amount': 'amt', 'date': 'dt', 'member': 'mbr', 'provider': 'prov', 'service': 'svc'}
+
+
+def load_matcher():
+    """Execute the auto_map_fields_ml procedure body and return its namespace"""
+    sql = PROCEDURE_FILE.read_text()
+    start = sql.index("HANDLER = 'auto_map_fields_ml'")
+    body_start = sql.index('$$', start) + 2
+    body_end = sql.index('$$', body_start)
+    namespace = {}
+    exec(sql[body_start:body_end], namespace)
+    return namespace
+
+
+def make_fields(count, rng, style):
+    """Synthetic field names; source style adds abbreviations, casing and separators"""
+    fields = set()
+    while len(fields) < count:
+        parts = rng.sample(WORDS, rng.randint(1, 4))
+        if style == 'source':
+            parts = [ABBREVIATIONS.get(p, p) if rng.random() < 0.3 else p for p in parts]
+            separator = rng.choice(['_', ' ', '', '-'])
+            name = separator.join(p.capitalize() if separator == '' else p for p in parts)
+            fields.add(name.upper() if rng.random() < 0.5 else name)
+        else:
+            fields.add('_'.join(parts).upper())
+    return sorted(fields)
+
+
+def legacy_scores(source_fields, target_fields, sources_to_score, tfidf_matrix, all_fields, normalize):
+    """Previous implementation: four Python similarities and a 1x1 cosine per pair"""
+    def exact(s, t):
+        return 1.0 if normalize(s) == normalize(t) else 0.0
+
+    def substring(s, t):
+        s, t = normalize(s), normalize(t)
+        if not s or not t:
+            return 0.0
+        return 1.0 if s in t or t in s else 0.0
+
+    def sequence(s, t):
+        s, t = normalize(s), normalize(t)
+        if not s or not t:
+            return 0.0
+        return SequenceMatcher(None, s, t).ratio()
+
+    def word_overlap(s, t):
+        a, b = set(normalize(s).split()), set(normalize(t).split())
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    combined = {}
+    for source_field in sources_to_score:
+        source_idx = all_fields.index(source_field)
+        row = []
+        for target_field in target_fields:
+            target_idx = all_fields.index(target_field)
+            tfidf = cosine_similarity(tfidf_matrix[source_idx:source_idx + 1], tfidf_matrix[target_idx:target_idx + 1])[0][0]
+            basic = (exact(source_field, target_field) * 0.4 + substring(source_field, target_field) * 0.2 +
+                     sequence(source_field, target_field) * 0.2 + word_overlap(source_field, target_field) * 0.2)
+            row.append(basic * 0.7 + tfidf * 0.3)
+        combined[source_field] = row
+    return combined
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', type=int, default=2000)
+    parser.add_argument('--targets', type=int, default=2000)
+    parser.add_argument('--top-n', type=int, default=3)
+    parser.add_argument('--min-confidence', type=float, default=0.6)
+    parser.add_argument('--legacy-sample', type=int, default=20, help='source fields timed with the per-pair loop')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    matcher = load_matcher()
+    source_fields = make_fields(args.sources, rng, 'source')
+    target_fields = make_fields(args.targets, rng, 'target')
+    print(f"Fields: {len(source_fields)} source x {len(target_fields)} target")
+
+    # Vectorized scorer (as run by the procedure)
+    started = time.perf_counter()
+    scores = matcher['score_matrices'](source_fields, target_fields)
+    combined, _ = matcher['combine_scores'](scores, args.min_confidence)
+    top = matcher['top_matches'](combined, args.top_n)
+    vectorized_seconds = time.perf_counter() - started
+    print(f"Vectorized:  {vectorized_seconds:8.2f}s for the full grid")
+
+    # Per-pair loop on a sample, extrapolated to the full grid
+    sample = rng.sample(source_fields, min(args.legacy_sample, len(source_fields)))
+    normalize = matcher['normalize_field_name']
+    all_fields = source_fields + target_fields
+    vectorizer = matcher['TfidfVectorizer'](analyzer='char', ngram_range=(2, 3))
+    tfidf_matrix = vectorizer.fit_transform([normalize(f) for f in all_fields])
+    started = time.perf_counter()
+    legacy = legacy_scores(source_fields, target_fields, sample, tfidf_matrix, all_fields, normalize)
+    legacy_seconds = (time.perf_counter() - started) * len(source_fields) / len(sample)
+    print(f"Per-pair:    {legacy_seconds:8.2f}s estimated ({len(sample)} source rows timed)")
+    print(f"Speedup:     {legacy_seconds / vectorized_seconds:8.1f}x")
+
+    # Same top-N on the sampled rows
+    mismatches = 0
+    for source_field in sample:
+        i = source_fields.index(source_field)
+        expected = sorted(
+            (j for j, score in enumerate(legacy[source_field]) if score >= args.min_confidence),
+            key=lambda j: -legacy[source_field][j]
+        )[:args.top_n]
+        actual = [j for j in top[i] if combined[i, j] != float('-inf')]
+        if [round(legacy[source_field][j], 6) for j in expected] != [round(float(combined[i, j]), 6) for j in actual]:
+            mismatches += 1
+    print(f"Top-{args.top_n} check: {len(sample) - mismatches}/{len(sample)} sampled source fields match")
+
+
+if __name__ == '__main__':
+    main()
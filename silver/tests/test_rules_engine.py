@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Local harness for the apply_transformation_rules procedure
+Loads the procedure body from 4_Silver_Rules_Engine.sql, checks how
+build_rule_plan fuses a few rule sets into passes, and runs the generated
+validate, update and dedupe pass SQL against SQLite standing in for
+Snowflake. The Snowflake-only constructs the passes use (COUNT_IF,
+EQUAL_NULL, IFF, OBJECT_CONSTRUCT, ARRAY_CONSTRUCT_COMPACT, LATERAL FLATTEN,
+QUALIFY) are registered as SQLite functions or rewritten before execution.
+
+Requires: Python 3.8+ (standard library only); runs under pytest or directly
+Usage: python silver/tests/test_rules_engine.py
+"""
+
+import json
+import re
+import sqlite3
+from pathlib import Path
+
+PROCEDURE_FILE = Path(__file__).resolve().parent.parent / '4_Silver_Rules_Engine.sql'
+
+TABLE_COLUMNS = ['_RECORD_ID', '_BATCH_ID', '_LOAD_TIMESTAMP', 'CLAIM_ID', 'MEMBER_ID', 'STATE', 'REGION', 'AMOUNT']
+
+
+def load_rules_engine():
+    """Execute the apply_transformation_rules procedure body and return its namespace"""
+    sql = PROCEDURE_FILE.read_text()
+    start = sql.index("HANDLER = 'apply_transformation_rules'")
+    body_start = sql.index('$$', start) + 2
+    body_end = sql.index('$$', body_start)
+    namespace = {}
+    exec(sql[body_start:body_end], namespace)
+    return namespace
+
+
+class CountIf:
+    def __init__(self):
+        self.count = 0
+
+    def step(self, condition):
+        if condition:
+            self.count += 1
+
+    def finalize(self):
+        return self.count
+
+
+def translate(query, connection):
+    """Rewrite the Snowflake constructs used by the rule passes into SQLite"""
+    def object_construct_star(match):
+        table = re.search(r'FROM\s+(\w+)', query[match.end():]).group(1)
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        return "json_object(" + ', '.join(f"'{c}', {c}" for c in columns) + ")"
+
+    query = re.sub(r'OBJECT_CONSTRUCT\(\*\)', object_construct_star, query)
+    query = re.sub(r'LATERAL FLATTEN\(input => ([\w.]+)\) (\w+)', r'json_each(\1) \2', query)
+    query = re.sub(r'(\w+)\.value:(\w+)::VARCHAR', r"json_extract(\1.value, '$.\2')", query)
+    query = re.sub(
+        r'SELECT (\w+)\s+FROM (\w+)\s+QUALIFY (ROW_NUMBER\(\) OVER \([^)]*\)) > 1',
+        r'SELECT \1 FROM (SELECT \1, \3 AS _RN FROM \2) WHERE _RN > 1',
+        query
+    )
+    return query
+
+
+class SqliteStatement:
+    def __init__(self, connection, query, params):
+        self.connection = connection
+        self.query = query
+        self.params = params
+
+    def collect(self):
+        cursor = self.connection.execute(translate(self.query, self.connection), self.params)
+        if cursor.description is None:
+            # DML returns the number of rows affected, as Snowflake does
+            return [(cursor.rowcount,)]
+        return cursor.fetchall()
+
+
+class SqliteSession:
+    """Minimal stand-in for a Snowpark session: session.sql(query, params).collect()"""
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_aggregate('COUNT_IF', 1, CountIf)
+        self.connection.create_function('EQUAL_NULL', 2, lambda a, b: a == b)
+        self.connection.create_function('IFF', 3, lambda condition, a, b: a if condition else b)
+        self.connection.create_function(
+            'OBJECT_CONSTRUCT', -1,
+            lambda *args: json.dumps(dict(zip(args[::2], args[1::2])))
+        )
+        self.connection.create_function(
+            'ARRAY_CONSTRUCT_COMPACT', -1,
+            lambda *args: json.dumps([json.loads(a) for a in args if a is not None])
+        )
+
+    def sql(self, query, params=None):
+        return SqliteStatement(self.connection, query, params or [])
+
+    def query(self, query, params=()):
+        return self.connection.execute(query, params).fetchall()
+
+
+def rule(rule_id, rule_type, logic, target_column=None, error_action=None):
+    return {
+        'RULE_ID': rule_id, 'RULE_NAME': f"Rule {rule_id}", 'RULE_TYPE': rule_type,
+        'TARGET_COLUMN': target_column, 'RULE_LOGIC': logic, 'ERROR_ACTION': error_action
+    }
+
+
+def pass_shape(plan):
+    return [(p['kind'], [r['rule_id'] for r in p['rules']]) for p in plan['passes']]
+
+
+def make_session():
+    session = SqliteSession()
+    session.connection.executescript(f"""
+        CREATE TABLE ABC_CLAIMS ({', '.join(TABLE_COLUMNS)});
+        CREATE TABLE quarantine_records (
+            batch_id, tpa, source_table, target_table, record_data, rule_id, rule_name, failure_reason
+        );
+    """)
+    session.connection.executemany(
+        f"INSERT INTO ABC_CLAIMS VALUES ({', '.join('?' for _ in TABLE_COLUMNS)})",
+        [
+            (1, 'B1', '2024-01-01', 'C1', 'M1', 'ca', None, 100.4),
+            (2, 'B1', '2024-01-01', 'C2', None, 'ny', None, 50),
+            (3, 'B1', '2024-01-01', 'C3', 'M3', 'CA', None, -5),
+            (4, 'B1', '2024-01-02', 'C1', 'M1', 'ca', None, 120),
+            (5, 'B1', '2024-01-01', 'C5', 'M5', 'tx', None, 10),
+            (6, 'B0', '2023-12-01', 'C6', None, 'wa', None, -1),
+            (7, 'B0', '2023-12-01', 'C5', 'M7', 'or', None, 3),
+        ]
+    )
+    return session
+
+
+def run_plan(engine, session, plan, batch_id):
+    """Dispatch each pass the way apply_transformation_rules does"""
+    rule_counts = {}
+    for rule_pass in plan['passes']:
+        if rule_pass['kind'] == 'validate':
+            rule_counts.update(engine['run_validate_pass'](session, 'ABC_CLAIMS', 'CLAIMS', 'ABC', batch_id, rule_pass['rules']))
+        elif rule_pass['kind'] == 'update':
+            rule_counts.update(engine['run_update_pass'](session, 'ABC_CLAIMS', batch_id, rule_pass['rules']))
+        else:
+            rule_counts.update(engine['run_dedupe_pass'](session, 'ABC_CLAIMS', batch_id, rule_pass['rules'][0]))
+    return rule_counts
+
+
+def test_plan_fusion():
+    engine = load_rules_engine()
+    build = engine['build_rule_plan']
+    columns = set(TABLE_COLUMNS)
+
+    # Consecutive rules of one kind share a pass; a kind change starts a new one
+    plan = build([
+        rule('V1', 'DATA_QUALITY', 'MEMBER_ID IS NOT NULL'),
+        rule('V2', 'REFERENTIAL_INTEGRITY', 'AMOUNT >= 0'),
+        rule('U1', 'STANDARDIZATION', 'UPPER(STATE)', 'STATE'),
+        rule('V3', 'DATA_QUALITY', 'CLAIM_ID IS NOT NULL'),
+    ], columns)
+    assert pass_shape(plan) == [('validate', ['V1', 'V2']), ('update', ['U1']), ('validate', ['V3'])]
+
+    # Independent assignments fuse into one UPDATE
+    plan = build([
+        rule('U1', 'STANDARDIZATION', 'UPPER(STATE)', 'STATE'),
+        rule('U2', 'STANDARDIZATION', 'TRIM(MEMBER_ID)', 'MEMBER_ID'),
+        rule('U3', 'BUSINESS_LOGIC', 'ROUND(AMOUNT, 2) AS AMOUNT'),
+    ], columns)
+    assert pass_shape(plan) == [('update', ['U1', 'U2', 'U3'])]
+
+    # Writing or reading a column written earlier in the pass splits it
+    plan = build([
+        rule('U1', 'STANDARDIZATION', 'UPPER(STATE)', 'STATE'),
+        rule('U2', 'STANDARDIZATION', 'TRIM(STATE)', 'STATE'),
+        rule('U3', 'BUSINESS_LOGIC', "CASE WHEN STATE = 'CA' THEN 'WEST' END AS REGION"),
+    ], columns)
+    assert pass_shape(plan) == [('update', ['U1']), ('update', ['U2']), ('update', ['U3'])]
+
+    # Deduplication is never fused; unrunnable rules are skipped
+    plan = build([
+        rule('D1', 'DEDUPLICATION', 'CLAIM_ID'),
+        rule('D2', 'DEDUPLICATION', 'CLAIM_ID, MEMBER_ID'),
+        rule('D3', 'DEDUPLICATION', 'NO_SUCH_COLUMN'),
+        rule('U1', 'STANDARDIZATION', 'TRIM(NOTES)', 'NOTES'),
+        rule('X1', 'LOOKUP', 'anything'),
+    ], columns)
+    assert pass_shape(plan) == [('dedupe', ['D1']), ('dedupe', ['D2'])]
+    assert [s['rule_id'] for s in plan['skipped']] == ['D3', 'U1', 'X1']
+
+
+def test_passes_against_sqlite():
+    engine = load_rules_engine()
+    session = make_session()
+    rules = [
+        rule('R1', 'DATA_QUALITY', 'MEMBER_ID IS NOT NULL', error_action='QUARANTINE'),
+        rule('R2', 'DATA_QUALITY', 'AMOUNT >= 0', error_action='REJECT'),
+        rule('R3', 'STANDARDIZATION', 'UPPER(STATE)', 'STATE'),
+        rule('R4', 'BUSINESS_LOGIC', "CASE WHEN STATE = 'CA' THEN 'WEST' ELSE 'OTHER' END AS REGION"),
+        rule('R5', 'STANDARDIZATION', 'ROUND(AMOUNT, 0)', 'AMOUNT'),
+        rule('R6', 'DEDUPLICATION', 'CLAIM_ID'),
+        rule('R7', 'STANDARDIZATION', 'TRIM(NOTES)', 'NOTES'),
+    ]
+    plan = engine['build_rule_plan'](rules, set(TABLE_COLUMNS))
+
+    # 6 runnable rules fused into 4 passes
+    assert pass_shape(plan) == [
+        ('validate', ['R1', 'R2']),
+        ('update', ['R3']),
+        ('update', ['R4', 'R5']),
+        ('dedupe', ['R6']),
+    ]
+    assert [s['rule_id'] for s in plan['skipped']] == ['R7']
+
+    counts = run_plan(engine, session, plan, 'B1')
+    assert counts == {'R1': 1, 'R2': 1, 'R3': 3, 'R4': 3, 'R5': 1, 'R6': 1}
+
+    remaining = session.query("SELECT _RECORD_ID, _BATCH_ID, CLAIM_ID, STATE, REGION, AMOUNT FROM ABC_CLAIMS ORDER BY _RECORD_ID")
+    assert [tuple(r) for r in remaining] == [
+        (4, 'B1', 'C1', 'CA', 'WEST', 120),
+        (5, 'B1', 'C5', 'TX', 'OTHER', 10),
+        # Other batches are not validated, updated or deduplicated
+        (6, 'B0', 'C6', 'wa', None, -1),
+        (7, 'B0', 'C5', 'or', None, 3),
+    ]
+
+    quarantined = session.query("SELECT batch_id, rule_id, failure_reason, record_data FROM quarantine_records")
+    assert len(quarantined) == 1
+    assert tuple(quarantined[0])[:3] == ('B1', 'R1', 'Failed rule: Rule R1')
+    assert json.loads(quarantined[0]['record_data'])['CLAIM_ID'] == 'C2'
+
+    # A second run over the same batch changes nothing
+    counts = run_plan(engine, session, plan, 'B1')
+    assert counts == {'R1': 0, 'R2': 0, 'R3': 0, 'R4': 0, 'R5': 0, 'R6': 0}
+
+
+if __name__ == '__main__':
+    test_plan_fusion()
+    test_passes_against_sqlite()
+    print('Rules engine harness: all checks passed')